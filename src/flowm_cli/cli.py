@@ -8,6 +8,7 @@ from .install import register_install_commands
 from .projects import projects_app
 from .changes import changes_app
 from .research import research_app
+from .search import register_search_commands
 from .quality import quality_app
 from .timeline import timeline_app
 from .specs import specs_app
@@ -24,6 +25,7 @@ app.add_typer(timeline_app, name="timeline")
 from . import __version__  # noqa: E402  (import after app creation)
 
 register_install_commands(app, __version__)
+register_search_commands(app)
 
 
 def main() -> None:
@@ -0,0 +1,223 @@
+"""Exact and near-duplicate requirement detection over canonical specs.
+
+Exact duplicates share the hash of their normalized body and scenarios.
+Near-duplicates are found with MinHash signatures over word shingles and
+locality-sensitive hashing: signatures are cut into bands and only
+requirements that collide in some band are compared, so the corpus is never
+compared pairwise.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+import struct
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from .state import (
+    REQUIREMENT_HEADER,
+    SpecDocument,
+    canonical_capabilities,
+    canonical_spec_path,
+    canonical_spec_sha256,
+    dedupe_index_path,
+    read_canonical_spec,
+)
+
+DEDUPE_INDEX_VERSION = 1
+SHINGLE_SIZE = 3
+NUM_PERM = 64
+BANDS = 16
+DEFAULT_THRESHOLD = 0.8
+
+_ROWS = NUM_PERM // BANDS
+_MAX_HASH = (1 << 32) - 1
+# One SHAKE-256 digest per shingle yields NUM_PERM independent 32-bit hashes.
+_UNPACK = struct.Struct(f"<{NUM_PERM}I").unpack
+
+_TOKEN_RE = re.compile(r"[^\W_]+", re.UNICODE)
+_ID_LINE_RE = re.compile(r"^\s*requirement-id\s*:", re.IGNORECASE)
+
+
+def normalize_body(body: str) -> List[str]:
+    """Tokens of a requirement's body and scenarios, ignoring its title, markup and ``Requirement-ID`` lines."""
+
+    kept = [
+        line
+        for line in body.splitlines()
+        if not line.startswith(REQUIREMENT_HEADER) and not _ID_LINE_RE.match(line)
+    ]
+    return [token.lower() for token in _TOKEN_RE.findall("\n".join(kept))]
+
+
+def shingles(tokens: Sequence[str]) -> Set[str]:
+    if len(tokens) <= SHINGLE_SIZE:
+        return {" ".join(tokens)} if tokens else set()
+    return {" ".join(tokens[i : i + SHINGLE_SIZE]) for i in range(len(tokens) - SHINGLE_SIZE + 1)}
+
+
+def _hashes(item: str) -> Tuple[int, ...]:
+    return _UNPACK(hashlib.shake_256(item.encode("utf-8")).digest(NUM_PERM * 4))
+
+
+def minhash(items: Iterable[str]) -> List[int]:
+    rows = [_hashes(item) for item in items]
+    if not rows:
+        return [_MAX_HASH] * NUM_PERM
+    return list(map(min, zip(*rows)))
+
+
+def similarity(left: Sequence[int], right: Sequence[int]) -> float:
+    """Estimated Jaccard similarity of the shingle sets behind two signatures."""
+
+    return sum(1 for a, b in zip(left, right) if a == b) / NUM_PERM
+
+
+@dataclass
+class Fingerprint:
+    capability: Optional[str]
+    title: str
+    digest: str
+    signature: List[int]
+
+    @classmethod
+    def from_body(cls, capability: Optional[str], title: str, body: str) -> "Fingerprint":
+        tokens = normalize_body(body)
+        digest = hashlib.sha256(" ".join(tokens).encode("utf-8")).hexdigest()
+        return cls(capability, title, digest, minhash(shingles(tokens)))
+
+
+def _bands(signature: Sequence[int]) -> List[Tuple[int, Tuple[int, ...]]]:
+    return [(band, tuple(signature[band * _ROWS : (band + 1) * _ROWS])) for band in range(BANDS)]
+
+
+class LSHIndex:
+    """Band buckets over a fixed set of fingerprints."""
+
+    def __init__(self, fingerprints: Sequence[Fingerprint]) -> None:
+        self.fingerprints = list(fingerprints)
+        self._buckets: Dict[Tuple[int, Tuple[int, ...]], List[int]] = {}
+        self._by_digest: Dict[str, List[int]] = {}
+        for position, fingerprint in enumerate(self.fingerprints):
+            self._by_digest.setdefault(fingerprint.digest, []).append(position)
+            for key in _bands(fingerprint.signature):
+                self._buckets.setdefault(key, []).append(position)
+
+    def exact_groups(self) -> List[List[Fingerprint]]:
+        return [
+            [self.fingerprints[position] for position in positions]
+            for positions in self._by_digest.values()
+            if len(positions) > 1
+        ]
+
+    def near_pairs(self, threshold: float = DEFAULT_THRESHOLD) -> List[Tuple[Fingerprint, Fingerprint, float]]:
+        """Pairs above ``threshold`` that are not exact duplicates, most similar first."""
+
+        candidates: Set[Tuple[int, int]] = set()
+        for members in self._buckets.values():
+            for i, left in enumerate(members):
+                for right in members[i + 1 :]:
+                    candidates.add((left, right))
+        pairs = []
+        for left, right in candidates:
+            a, b = self.fingerprints[left], self.fingerprints[right]
+            if a.digest == b.digest:
+                continue
+            score = similarity(a.signature, b.signature)
+            if score >= threshold:
+                pairs.append((a, b, score))
+        return sorted(pairs, key=lambda pair: (-pair[2], pair[0].capability or "", pair[0].title))
+
+    def matches(
+        self, fingerprint: Fingerprint, threshold: float = DEFAULT_THRESHOLD
+    ) -> List[Tuple[Fingerprint, float]]:
+        """Indexed requirements identical or similar to ``fingerprint``."""
+
+        positions = set(self._by_digest.get(fingerprint.digest, []))
+        for key in _bands(fingerprint.signature):
+            positions.update(self._buckets.get(key, []))
+        found = []
+        for position in positions:
+            other = self.fingerprints[position]
+            score = 1.0 if other.digest == fingerprint.digest else similarity(other.signature, fingerprint.signature)
+            if score >= threshold:
+                found.append((other, score))
+        return sorted(found, key=lambda item: (-item[1], item[0].capability or "", item[0].title))
+
+
+class DedupeIndex:
+    """Fingerprints of every canonical requirement, cached in ``state/dedupe_index.json``.
+
+    Entries are keyed by capability and reused while the canonical spec's hash
+    is unchanged, so only edited specs are re-shingled.
+    """
+
+    def __init__(self, path: Path, data: Optional[Dict] = None) -> None:
+        self.path = path
+        self.capabilities: Dict[str, Dict] = (data or {}).get("capabilities", {})
+        self.dirty = False
+
+    @classmethod
+    def load(cls, flow_dir: Path, project: str) -> "DedupeIndex":
+        path = dedupe_index_path(flow_dir, project)
+        data: Optional[Dict] = None
+        if path.exists():
+            try:
+                raw = json.loads(path.read_text(encoding="utf-8"))
+            except json.JSONDecodeError:
+                raw = None
+            if isinstance(raw, dict) and raw.get("version") == DEDUPE_INDEX_VERSION:
+                data = raw
+        return cls(path, data)
+
+    def save(self) -> None:
+        if not self.dirty:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        payload = {"version": DEDUPE_INDEX_VERSION, "capabilities": self.capabilities}
+        self.path.write_text(json.dumps(payload, sort_keys=True) + "\n", encoding="utf-8")
+        self.dirty = False
+
+    def refresh(self, flow_dir: Path, project: str) -> int:
+        """Re-fingerprint capabilities whose canonical spec changed; return how many were redone."""
+
+        current = canonical_capabilities(flow_dir, project)
+        redone = 0
+        for capability in current:
+            path = canonical_spec_path(flow_dir, project, capability)
+            digest = canonical_spec_sha256(path)
+            entry = self.capabilities.get(capability)
+            if entry and entry["sha256"] == digest:
+                continue
+            document = SpecDocument.parse(read_canonical_spec(path) or "")
+            requirements = []
+            for title in document.titles():
+                fingerprint = Fingerprint.from_body(capability, title, document.block_text(title))
+                requirements.append([title, fingerprint.digest, fingerprint.signature])
+            self.capabilities[capability] = {"sha256": digest, "requirements": requirements}
+            self.dirty = True
+            redone += 1
+        for capability in set(self.capabilities) - set(current):
+            del self.capabilities[capability]
+            self.dirty = True
+        return redone
+
+    def fingerprints(self, capabilities: Optional[Iterable[str]] = None) -> List[Fingerprint]:
+        wanted = set(capabilities) if capabilities is not None else None
+        return [
+            Fingerprint(capability, title, digest, signature)
+            for capability, entry in sorted(self.capabilities.items())
+            if wanted is None or capability in wanted
+            for title, digest, signature in entry["requirements"]
+        ]
+
+
+def load_lsh_index(flow_dir: Path, project: str) -> LSHIndex:
+    """Refresh the cached fingerprints and return an LSH index over the whole corpus."""
+
+    index = DedupeIndex.load(flow_dir, project)
+    index.refresh(flow_dir, project)
+    index.save()
+    return LSHIndex(index.fingerprints())
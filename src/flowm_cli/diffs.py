@@ -0,0 +1,257 @@
+"""Requirement-block-aware unified diffs for canonical specs (stdlib-only)."""
+from __future__ import annotations
+
+from collections import Counter
+from difflib import SequenceMatcher, unified_diff
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+REQUIREMENT_HEADER = "### Requirement:"
+
+Opcode = Tuple[str, int, int, int, int]
+
+
+def requirement_segments(lines: Sequence[str]) -> List[Tuple[int, int]]:
+    """Split spec lines into ``(start, end)`` spans: the preamble, then one per requirement."""
+
+    starts = [idx for idx, line in enumerate(lines) if line.startswith(REQUIREMENT_HEADER)]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+    ends = starts[1:] + [len(lines)]
+    return list(zip(starts, ends))
+
+
+def block_opcodes(a: Sequence[str], b: Sequence[str]) -> List[Opcode]:
+    """Return line opcodes for ``a`` → ``b``, diffing only requirement blocks that differ.
+
+    Blocks are first matched by content, so unchanged requirements are skipped
+    wholesale and line-level matching only runs inside the changed regions.
+    """
+
+    a_segments = requirement_segments(a)
+    b_segments = requirement_segments(b)
+    # Blocks are compared as line tuples, never by a bare hash, so a hash
+    # collision cannot make two different blocks look equal.
+    a_keys = [tuple(a[start:end]) for start, end in a_segments]
+    b_keys = [tuple(b[start:end]) for start, end in b_segments]
+
+    codes: List[Opcode] = []
+    matcher = SequenceMatcher(None, a_keys, b_keys, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        a_lo, a_hi = _line_bounds(a_segments, i1, i2, len(a))
+        b_lo, b_hi = _line_bounds(b_segments, j1, j2, len(b))
+        if tag == "equal":
+            _push(codes, ("equal", a_lo, a_hi, b_lo, b_hi))
+            continue
+        inner = SequenceMatcher(None, a[a_lo:a_hi], b[b_lo:b_hi])
+        for inner_tag, x1, x2, y1, y2 in inner.get_opcodes():
+            _push(codes, (inner_tag, a_lo + x1, a_lo + x2, b_lo + y1, b_lo + y2))
+    return codes
+
+
+def _line_bounds(segments: List[Tuple[int, int]], lo: int, hi: int, total: int) -> Tuple[int, int]:
+    if lo < hi:
+        return segments[lo][0], segments[hi - 1][1]
+    position = segments[lo][0] if lo < len(segments) else total
+    return position, position
+
+
+def _push(codes: List[Opcode], code: Opcode) -> None:
+    if code[1] == code[2] and code[3] == code[4]:
+        return
+    if codes and codes[-1][0] == "equal" and code[0] == "equal":
+        last = codes[-1]
+        codes[-1] = ("equal", last[1], code[2], last[3], code[4])
+        return
+    codes.append(code)
+
+
+def _group_opcodes(codes: List[Opcode], n: int) -> Iterator[List[Opcode]]:
+    # Mirrors SequenceMatcher.get_grouped_opcodes so hunks match difflib's.
+    codes = list(codes) or [("equal", 0, 1, 0, 1)]
+    if codes[0][0] == "equal":
+        tag, i1, i2, j1, j2 = codes[0]
+        codes[0] = tag, max(i1, i2 - n), i2, max(j1, j2 - n), j2
+    if codes[-1][0] == "equal":
+        tag, i1, i2, j1, j2 = codes[-1]
+        codes[-1] = tag, i1, min(i2, i1 + n), j1, min(j2, j1 + n)
+
+    window = n + n
+    group: List[Opcode] = []
+    for tag, i1, i2, j1, j2 in codes:
+        if tag == "equal" and i2 - i1 > window:
+            group.append((tag, i1, min(i2, i1 + n), j1, min(j2, j1 + n)))
+            yield group
+            group = []
+            i1, j1 = max(i1, i2 - n), max(j1, j2 - n)
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == "equal"):
+        yield group
+
+
+def _format_range(start: int, stop: int) -> str:
+    beginning = start + 1
+    length = stop - start
+    if length == 1:
+        return f"{beginning}"
+    if not length:
+        beginning -= 1
+    return f"{beginning},{length}"
+
+
+def unified_block_diff(
+    a: Sequence[str],
+    b: Sequence[str],
+    fromfile: str = "",
+    tofile: str = "",
+    n: int = 3,
+) -> Iterator[str]:
+    """Yield a standard unified diff (``lineterm=""``) built from :func:`block_opcodes`."""
+
+    started = False
+    for group in _group_opcodes(block_opcodes(a, b), n):
+        if not started:
+            started = True
+            yield f"--- {fromfile}"
+            yield f"+++ {tofile}"
+        first, last = group[0], group[-1]
+        yield f"@@ -{_format_range(first[1], last[2])} +{_format_range(first[3], last[4])} @@"
+        for tag, i1, i2, j1, j2 in group:
+            if tag == "equal":
+                for line in a[i1:i2]:
+                    yield " " + line
+                continue
+            if tag in {"replace", "delete"}:
+                for line in a[i1:i2]:
+                    yield "-" + line
+            if tag in {"replace", "insert"}:
+                for line in b[j1:j2]:
+                    yield "+" + line
+
+
+def spec_diff_lines(
+    current: str,
+    updated: str,
+    fromfile: str,
+    tofile: str,
+) -> List[str]:
+    """Diff two spec texts, falling back to plain difflib for unstructured text."""
+
+    a = current.splitlines()
+    b = updated.splitlines()
+    structured = len(requirement_segments(a)) > 1 or len(requirement_segments(b)) > 1
+    if not structured:
+        return list(unified_diff(a, b, fromfile=fromfile, tofile=tofile, lineterm=""))
+    return list(unified_block_diff(a, b, fromfile=fromfile, tofile=tofile))
+
+
+Block = Tuple[str, List[str]]
+
+
+def _split_blocks(text: str) -> Tuple[List[str], List[Block]]:
+    lines = text.splitlines()
+    preamble: List[str] = []
+    blocks: List[Block] = []
+    for start, end in requirement_segments(lines):
+        if start < len(lines) and lines[start].startswith(REQUIREMENT_HEADER):
+            blocks.append((lines[start][len(REQUIREMENT_HEADER) :].strip(), lines[start:end]))
+        else:
+            preamble = lines[start:end]
+    return preamble, blocks
+
+
+def _duplicate_titles(blocks: List[Block]) -> List[str]:
+    counts = Counter(title for title, _ in blocks)
+    return sorted(title for title, count in counts.items() if count > 1)
+
+
+def block_reverse_patch(before: Optional[str], after: str, renames: Optional[Dict[str, str]] = None) -> Dict:
+    """Describe how to turn ``after`` back into ``before``, one requirement block at a time.
+
+    Only touched blocks are stored: ``{"title", "text"}`` restores (or, with
+    ``text`` ``None``, drops) a block, and ``{"title": None, "text", "anchor"}``
+    re-inserts a removed block after the block titled ``anchor``. ``renames``
+    maps new titles to the titles they replaced. Blocks are matched by title,
+    so when either side repeats a title the patch only records ``refused``
+    and :func:`apply_block_patch` declines to replay it.
+    """
+
+    renames = renames or {}
+    before_preamble, before_blocks = _split_blocks(before or "")
+    after_preamble, after_blocks = _split_blocks(after)
+    duplicates = sorted(set(_duplicate_titles(before_blocks)) | set(_duplicate_titles(after_blocks)))
+    if duplicates:
+        return {"refused": f"duplicate requirement title(s): {', '.join(duplicates)}"}
+    previous: Dict[str, List[str]] = {}
+    for title, lines in before_blocks:
+        previous.setdefault(title, lines)
+
+    ops: List[Dict[str, Optional[str]]] = []
+    matched = set()
+    for title, lines in after_blocks:
+        old = renames.get(title, title)
+        if old in previous and old not in matched:
+            matched.add(old)
+            if previous[old] != lines:
+                ops.append({"title": title, "text": "\n".join(previous[old])})
+        else:
+            ops.append({"title": title, "text": None})
+    anchor: Optional[str] = None
+    for title, lines in before_blocks:
+        if title not in matched:
+            ops.append({"title": None, "text": "\n".join(lines), "anchor": anchor})
+        anchor = title
+
+    patch: Dict = {"ops": ops}
+    if before is None:
+        patch["created"] = True
+    elif before_preamble != after_preamble:
+        patch["preamble"] = "\n".join(before_preamble)
+    return patch
+
+
+def apply_block_patch(text: str, patch: Dict) -> Optional[str]:
+    """Apply a :func:`block_reverse_patch` to ``text``.
+
+    Returns ``None`` when the patch undoes the creation of a spec that has no
+    other requirements left. Raises ``ValueError`` if a block it needs is gone
+    or its title is no longer unique.
+    """
+
+    if patch.get("refused"):
+        raise ValueError(f"merge cannot be replayed: {patch['refused']}")
+    preamble, blocks = _split_blocks(text)
+    entries: List[Block] = list(blocks)
+    duplicates = set(_duplicate_titles(blocks))
+
+    def locate(title: str) -> int:
+        if title in duplicates:
+            raise ValueError(f"requirement '{title}' appears more than once in the spec")
+        for idx, (candidate, _) in enumerate(entries):
+            if candidate == title:
+                return idx
+        raise ValueError(f"requirement '{title}' is no longer in the spec")
+
+    for op in patch.get("ops", []):
+        if op.get("title") is None:
+            continue
+        idx = locate(str(op["title"]))
+        if op.get("text") is None:
+            del entries[idx]
+        else:
+            lines = str(op["text"]).split("\n")
+            entries[idx] = (lines[0][len(REQUIREMENT_HEADER) :].strip(), lines)
+    for op in patch.get("ops", []):
+        if op.get("title") is not None:
+            continue
+        position = 0 if op.get("anchor") is None else locate(str(op["anchor"])) + 1
+        lines = str(op["text"]).split("\n")
+        entries.insert(position, (lines[0][len(REQUIREMENT_HEADER) :].strip(), lines))
+
+    if patch.get("created") and not entries:
+        return None
+    if "preamble" in patch:
+        preamble = patch["preamble"].split("\n") if patch["preamble"] else []
+    out = list(preamble)
+    for _, lines in entries:
+        out.extend(lines)
+    return "\n".join(out) + "\n"
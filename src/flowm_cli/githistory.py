@@ -0,0 +1,285 @@
+"""Per-requirement evolution of canonical specs, reconstructed from git history.
+
+One ``git log --raw`` walk lists every commit that touched the capability's
+spec files together with the before/after blob IDs, and one long-lived
+``git cat-file --batch`` process serves blob contents. Each blob is reduced
+to per-requirement and per-scenario digests. The digests are cached by blob
+ID in ``state/git_blob_cache.json``, so repeated queries over a long history
+only read blobs added since the last run.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import subprocess
+from contextlib import closing
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path, PurePosixPath
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .state import (
+    REQUIREMENTS_DIRNAME,
+    SpecDocument,
+    StateError,
+    git_blob_cache_path,
+)
+
+GIT_BLOB_CACHE_VERSION = 1
+SCENARIO_HEADER = "#### Scenario:"
+NULL_BLOB = "0" * 40
+DIGEST_LENGTH = 16
+
+# title -> [block digest, {scenario name: scenario digest}]
+BlobSummary = Dict[str, List]
+
+
+@dataclass
+class RequirementEvent:
+    commit: str
+    committed_at: str
+    author: str
+    subject: str
+    capability: str
+    title: str
+    operation: str
+    scenarios: List[str] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, object]:
+        return asdict(self)
+
+
+def _digest(lines: List[str]) -> str:
+    text = "\n".join(line.rstrip() for line in lines).strip()
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:DIGEST_LENGTH]
+
+
+def summarize_spec(text: str) -> BlobSummary:
+    """Digest each requirement block of ``text`` and each of its scenarios."""
+
+    document = SpecDocument.parse(text)
+    summary: BlobSummary = {}
+    for title in document.titles():
+        lines = document.block_text(title).splitlines()
+        scenarios: Dict[str, List[str]] = {}
+        current: Optional[List[str]] = None
+        for line in lines:
+            if line.startswith(SCENARIO_HEADER):
+                current = scenarios.setdefault(line[len(SCENARIO_HEADER) :].strip(), [])
+            if current is not None:
+                current.append(line)
+        summary[title] = [_digest(lines), {name: _digest(body) for name, body in scenarios.items()}]
+    return summary
+
+
+def spec_file_capability(path: str) -> Optional[str]:
+    """Capability of a path relative to the specs root, or ``None`` for non-requirement files."""
+
+    parts = PurePosixPath(path).parts
+    if len(parts) >= 2 and parts[-1] == "spec.md":
+        return "/".join(parts[:-1])
+    if len(parts) >= 3 and parts[-2] == REQUIREMENTS_DIRNAME and parts[-1].endswith(".md"):
+        return "/".join(parts[:-2])
+    return None
+
+
+class CatFileBatch:
+    """A single ``git cat-file --batch`` process answering blob lookups over a pipe."""
+
+    def __init__(self, repo: Path) -> None:
+        self.repo = repo
+        self._process: Optional[subprocess.Popen] = None
+
+    def read(self, obj: str) -> bytes:
+        if self._process is None:
+            self._process = subprocess.Popen(
+                ["git", "cat-file", "--batch"],
+                cwd=str(self.repo),
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+            )
+        stdin, stdout = self._process.stdin, self._process.stdout
+        assert stdin is not None and stdout is not None
+        stdin.write(obj.encode("utf-8") + b"\n")
+        stdin.flush()
+        header = stdout.readline().split()
+        if len(header) != 3:
+            raise StateError(f"git cat-file could not read {obj}")
+        data = stdout.read(int(header[2]))
+        stdout.read(1)
+        return data
+
+    def close(self) -> None:
+        if self._process is None:
+            return
+        assert self._process.stdin is not None
+        self._process.stdin.close()
+        self._process.wait()
+        self._process = None
+
+    def __enter__(self) -> "CatFileBatch":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+
+class GitBlobCache:
+    """Blob ID -> requirement digests, persisted across runs."""
+
+    def __init__(self, path: Path, data: Optional[Dict] = None) -> None:
+        self.path = path
+        self.blobs: Dict[str, BlobSummary] = (data or {}).get("blobs", {})
+        self.dirty = False
+
+    @classmethod
+    def load(cls, flow_dir: Path, project: str) -> "GitBlobCache":
+        path = git_blob_cache_path(flow_dir, project)
+        data: Optional[Dict] = None
+        if path.exists():
+            try:
+                raw = json.loads(path.read_text(encoding="utf-8"))
+            except json.JSONDecodeError:
+                raw = None
+            if isinstance(raw, dict) and raw.get("version") == GIT_BLOB_CACHE_VERSION:
+                data = raw
+        return cls(path, data)
+
+    def save(self) -> None:
+        if not self.dirty:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        payload = {"version": GIT_BLOB_CACHE_VERSION, "blobs": self.blobs}
+        self.path.write_text(json.dumps(payload, sort_keys=True) + "\n", encoding="utf-8")
+        self.dirty = False
+
+    def summary(self, blob: str, batch: CatFileBatch) -> BlobSummary:
+        if blob == NULL_BLOB:
+            return {}
+        cached = self.blobs.get(blob)
+        if cached is None:
+            cached = summarize_spec(batch.read(blob).decode("utf-8", errors="replace"))
+            self.blobs[blob] = cached
+            self.dirty = True
+        return cached
+
+
+def _git(repo: Path, *args: str) -> str:
+    try:
+        result = subprocess.run(
+            ["git", *args], cwd=str(repo), stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=False
+        )
+    except FileNotFoundError as exc:
+        raise StateError("git is not installed") from exc
+    if result.returncode != 0:
+        raise StateError(result.stderr.strip() or f"git {args[0]} failed")
+    return result.stdout.strip()
+
+
+def _iter_commits(repo: Path, pathspec: str) -> Iterator[Tuple[List[str], List[Tuple[str, str, str]]]]:
+    """Stream ``([sha, timestamp, author, subject], [(old blob, new blob, path)])`` oldest first."""
+
+    process = subprocess.Popen(
+        [
+            "git",
+            "-c",
+            "core.quotePath=false",
+            "log",
+            "--reverse",
+            "--raw",
+            "--no-abbrev",
+            "--no-renames",
+            "--format=%x01%H%x00%ct%x00%an%x00%s",
+            "--",
+            pathspec,
+        ],
+        cwd=str(repo),
+        stdout=subprocess.PIPE,
+        text=True,
+        encoding="utf-8",
+        errors="replace",
+    )
+    assert process.stdout is not None
+    header: Optional[List[str]] = None
+    entries: List[Tuple[str, str, str]] = []
+    completed = False
+    try:
+        for line in process.stdout:
+            line = line.rstrip("\n")
+            if line.startswith("\x01"):
+                if header is not None:
+                    yield header, entries
+                header, entries = line[1:].split("\x00", 3), []
+            elif line.startswith(":"):
+                meta, path = line.split("\t", 1)
+                fields = meta.split()
+                entries.append((fields[2], fields[3], path))
+        if header is not None:
+            yield header, entries
+        completed = True
+    finally:
+        # Abandoned early (the consumer raised or stopped): do not leave git log running.
+        if not completed:
+            process.kill()
+        process.stdout.close()
+        returncode = process.wait()
+    if returncode != 0:
+        raise StateError(f"git log failed for {pathspec}")
+
+
+def _merge(summaries: List[BlobSummary]) -> BlobSummary:
+    merged: BlobSummary = {}
+    for summary in summaries:
+        merged.update(summary)
+    return merged
+
+
+def requirement_events(
+    specs_root: Path,
+    cache: GitBlobCache,
+    capability: Optional[str] = None,
+) -> List[RequirementEvent]:
+    """Every ADDED/MODIFIED/REMOVED requirement change committed under ``specs_root``, oldest first.
+
+    Files of one capability touched by the same commit are compared as a
+    whole, so moving a requirement between the single-file and directory
+    layouts does not show up as a removal and an addition.
+    """
+
+    if not specs_root.is_dir():
+        raise StateError(f"No canonical specs at {specs_root}")
+    repo = Path(_git(specs_root, "rev-parse", "--show-toplevel"))
+    prefix = specs_root.resolve().relative_to(repo.resolve()).as_posix()
+    prefix = "" if prefix == "." else f"{prefix}/"
+    pathspec = f"{prefix}{capability}" if capability else prefix or "."
+    events: List[RequirementEvent] = []
+    with CatFileBatch(repo) as batch, closing(_iter_commits(repo, pathspec)) as commits:
+        for (sha, timestamp, author, subject), entries in commits:
+            touched: Dict[str, Tuple[List[BlobSummary], List[BlobSummary]]] = {}
+            for old, new, path in entries:
+                owner = spec_file_capability(path[len(prefix) :]) if path.startswith(prefix) else None
+                if owner is None or (capability and owner != capability):
+                    continue
+                before, after = touched.setdefault(owner, ([], []))
+                before.append(cache.summary(old, batch))
+                after.append(cache.summary(new, batch))
+            committed_at = datetime.fromtimestamp(int(timestamp), tz=timezone.utc).isoformat()
+            for owner, (before, after) in sorted(touched.items()):
+                old_map, new_map = _merge(before), _merge(after)
+                for title in list(old_map) + [title for title in new_map if title not in old_map]:
+                    old_entry, new_entry = old_map.get(title), new_map.get(title)
+                    if old_entry == new_entry:
+                        continue
+                    old_scenarios = old_entry[1] if old_entry else {}
+                    new_scenarios = new_entry[1] if new_entry else {}
+                    changed = [
+                        name
+                        for name in list(old_scenarios) + [name for name in new_scenarios if name not in old_scenarios]
+                        if old_scenarios.get(name) != new_scenarios.get(name)
+                    ]
+                    operation = "ADDED" if old_entry is None else "REMOVED" if new_entry is None else "MODIFIED"
+                    events.append(
+                        RequirementEvent(sha, committed_at, author, subject, owner, title, operation, changed)
+                    )
+    cache.save()
+    return events
@@ -0,0 +1,379 @@
+"""Bulk capability refactors (renames, merges and splits) driven by a TOML map."""
+from __future__ import annotations
+
+import os
+import shutil
+import tempfile
+import tomllib
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .references import update_reference_graph
+from .state import (
+    RequirementHistory,
+    SpecDocument,
+    SpecHistory,
+    SpecIndex,
+    StateError,
+    canonical_spec_files,
+    canonical_spec_path,
+    change_delta_specs,
+    change_dir,
+    default_spec_content,
+    list_changes,
+    load_spec_index,
+    parse_delta_file,
+    project_state_dir,
+    read_canonical_spec,
+    remove_canonical_spec,
+    requirement_title,
+    save_spec_index,
+    spec_index_path,
+    write_canonical_spec,
+)
+
+
+class RefactorError(RuntimeError):
+    """Raised when a refactor map is invalid, conflicts, or fails to apply."""
+
+
+@dataclass
+class RefactorMap:
+    """Parsed ``--map`` file.
+
+    ``renames`` maps old → new capability, ``merges`` maps a target to the
+    capabilities folded into it, and ``splits`` maps a source capability to
+    ``{target: [requirement titles]}``.
+    """
+
+    renames: Dict[str, str] = field(default_factory=dict)
+    merges: List[Tuple[str, List[str]]] = field(default_factory=list)
+    splits: List[Tuple[str, Dict[str, List[str]]]] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.renames) + len(self.merges) + len(self.splits)
+
+
+@dataclass
+class RefactorPlan:
+    """Every mutation a refactor performs, computed before anything is touched."""
+
+    dir_moves: List[Tuple[Path, Path]] = field(default_factory=list)
+    writes: Dict[str, str] = field(default_factory=dict)
+    removals: List[Path] = field(default_factory=list)
+    change_moves: List[Tuple[Path, Path]] = field(default_factory=list)
+    renames: Dict[str, str] = field(default_factory=dict)
+    retired: List[str] = field(default_factory=list)
+    index: Optional[SpecIndex] = None
+    index_updates: int = 0
+    summary: List[str] = field(default_factory=list)
+
+
+def load_refactor_map(path: Path) -> RefactorMap:
+    try:
+        data = tomllib.loads(path.read_text(encoding="utf-8"))
+    except (OSError, tomllib.TOMLDecodeError) as exc:
+        raise RefactorError(f"Cannot read refactor map {path}: {exc}") from exc
+
+    renames = data.get("rename", {})
+    if not isinstance(renames, dict) or not all(isinstance(v, str) for v in renames.values()):
+        raise RefactorError("[rename] must map capability names to new names")
+
+    merges: List[Tuple[str, List[str]]] = []
+    for item in data.get("merge", []):
+        into, sources = item.get("into"), item.get("from")
+        if not isinstance(into, str) or not isinstance(sources, list) or not sources:
+            raise RefactorError("[[merge]] entries need 'into' and a non-empty 'from' list")
+        merges.append((into, [str(source) for source in sources]))
+
+    splits: List[Tuple[str, Dict[str, List[str]]]] = []
+    for item in data.get("split", []):
+        source, targets = item.get("from"), item.get("into")
+        if not isinstance(source, str) or not isinstance(targets, dict) or not targets:
+            raise RefactorError("[[split]] entries need 'from' and an 'into' table")
+        splits.append(
+            (source, {target: [requirement_title(t) for t in titles] for target, titles in targets.items()})
+        )
+
+    unknown = set(data) - {"rename", "merge", "split"}
+    if unknown:
+        raise RefactorError(f"Unknown refactor map section(s): {', '.join(sorted(unknown))}")
+    return RefactorMap(dict(renames), merges, splits)
+
+
+def plan_refactor(
+    flow_dir: Path,
+    project: str,
+    refactor: RefactorMap,
+    *,
+    include_changes: bool = True,
+) -> RefactorPlan:
+    """Resolve ``refactor`` against the project and collect every conflict up front."""
+
+    plan = RefactorPlan()
+    conflicts: List[str] = []
+    index = load_spec_index(flow_dir, project)
+
+    def canonical(capability: str) -> Path:
+        return canonical_spec_path(flow_dir, project, capability)
+
+    # Each capability may be touched by one operation only, and never as both a
+    # source and a target, so the outcome does not depend on evaluation order.
+    sources: Dict[str, str] = {}
+    targets: Dict[str, str] = {}
+
+    def claim(table: Dict[str, str], capability: str, label: str) -> None:
+        if capability in table:
+            conflicts.append(f"'{capability}' appears in both {table[capability]} and {label}")
+        table[capability] = label
+
+    for old, new in refactor.renames.items():
+        claim(sources, old, f"rename {old}")
+        claim(targets, new, f"rename {old}")
+    for into, merged in refactor.merges:
+        for source in merged:
+            claim(sources, source, f"merge into {into}")
+        claim(targets, into, f"merge into {into}")
+    for source, split_targets in refactor.splits:
+        claim(sources, source, f"split {source}")
+        for target in split_targets:
+            claim(targets, target, f"split {source}")
+    for capability in sorted(set(sources) & set(targets)):
+        conflicts.append(f"'{capability}' is both a source ({sources[capability]}) and a target ({targets[capability]})")
+
+    documents: Dict[str, SpecDocument] = {}
+
+    def document(capability: str, *, create: bool) -> Optional[SpecDocument]:
+        if capability not in documents:
+            text = read_canonical_spec(canonical(capability))
+            if text is not None:
+                documents[capability] = SpecDocument.parse(text)
+            elif create:
+                documents[capability] = SpecDocument.parse(default_spec_content(capability))
+            else:
+                return None
+        return documents[capability]
+
+    for old, new in refactor.renames.items():
+        if not canonical(old).parent.exists():
+            conflicts.append(f"rename {old}: capability not found")
+            continue
+        if canonical(new).parent.exists():
+            conflicts.append(f"rename {old}: capability '{new}' already exists")
+            continue
+        plan.dir_moves.append((canonical(old).parent, canonical(new).parent))
+        plan.renames[old] = new
+        plan.index_updates += index.rename_capability(old, new)
+        plan.summary.append(f"rename {old} → {new}")
+
+    for into, merged in refactor.merges:
+        target = document(into, create=True)
+        assert target is not None
+        for source in merged:
+            doc = document(source, create=False)
+            if doc is None:
+                conflicts.append(f"merge into {into}: capability '{source}' not found")
+                continue
+            for title in doc.titles():
+                if title in target:
+                    conflicts.append(f"merge into {into}: requirement '{title}' from '{source}' already exists")
+                    continue
+                target.add(title, doc.block_text(title))
+            plan.removals.append(canonical(source))
+            plan.retired.append(source)
+            plan.index_updates += index.rename_capability(source, into)
+        plan.writes[into] = target.render()
+        plan.summary.append(f"merge {', '.join(merged)} → {into}")
+
+    for source, split_targets in refactor.splits:
+        doc = document(source, create=False)
+        if doc is None:
+            conflicts.append(f"split {source}: capability not found")
+            continue
+        for target_name, titles in split_targets.items():
+            target = document(target_name, create=True)
+            assert target is not None
+            for title in titles:
+                if title not in doc:
+                    conflicts.append(f"split {source}: requirement '{title}' not found")
+                    continue
+                if title in target:
+                    conflicts.append(f"split {source}: requirement '{title}' already exists in '{target_name}'")
+                    continue
+                target.add(title, doc.block_text(title))
+                doc.remove(title)
+                requirement_id = index.find(source, title)
+                if requirement_id is not None:
+                    index[requirement_id] = {**index[requirement_id], "capability": target_name}
+                    plan.index_updates += 1
+            plan.writes[target_name] = target.render()
+        plan.writes[source] = doc.render()
+        moved = sum(len(titles) for titles in split_targets.values())
+        plan.summary.append(f"split {source}: {moved} requirement(s) → {', '.join(split_targets)}")
+
+    if include_changes:
+        conflicts.extend(_plan_change_moves(flow_dir, project, refactor, plan))
+
+    if conflicts:
+        raise RefactorError("\n".join(conflicts))
+    plan.index = index
+    return plan
+
+
+def _plan_change_moves(
+    flow_dir: Path,
+    project: str,
+    refactor: RefactorMap,
+    plan: RefactorPlan,
+) -> List[str]:
+    destinations: Dict[str, str] = dict(refactor.renames)
+    for into, merged in refactor.merges:
+        destinations.update({source: into for source in merged})
+    split_titles = {
+        source: {title for titles in split_targets.values() for title in titles}
+        for source, split_targets in refactor.splits
+    }
+
+    conflicts: List[str] = []
+    for change in list_changes(flow_dir, project):
+        specs_root = change_dir(flow_dir, project, change) / "specs"
+        present = {capability: path for capability, path in change_delta_specs(flow_dir, project, change)}
+        claimed: Dict[str, str] = {}
+        for capability in sorted(present):
+            destination = destinations.get(capability)
+            if destination is not None:
+                other = claimed.get(destination) or (destination if destination in present else None)
+                if other is not None:
+                    conflicts.append(
+                        f"{change}: deltas for '{capability}' and '{other}' would both land in '{destination}'"
+                    )
+                    continue
+                claimed[destination] = capability
+                plan.change_moves.append((specs_root / capability, specs_root / destination))
+            elif capability in split_titles:
+                try:
+                    parsed = parse_delta_file(present[capability])
+                except StateError as exc:
+                    conflicts.append(f"{change}: {capability}: {exc}")
+                    continue
+                touched = {delta.title for deltas in parsed.requirements.values() for delta in deltas}
+                touched.update(requirement_title(rename.old) for rename in parsed.renames)
+                moved = sorted(touched & split_titles[capability])
+                if moved:
+                    conflicts.append(
+                        f"{change}: '{capability}' deltas touch requirement(s) being split out: {', '.join(moved)}"
+                    )
+    return conflicts
+
+
+def apply_refactor(flow_dir: Path, project: str, plan: RefactorPlan, *, change_id: str = "refactor") -> None:
+    """Apply ``plan``; on any failure every completed step is undone.
+
+    Once applied, every capability written or renamed gets a spec history
+    version and every relocated requirement a ``MOVED`` lineage event, both
+    attributed to ``change_id``, and the reference graph is refreshed.
+    """
+
+    undo: List[Callable[[], None]] = []
+    before: Dict[str, Optional[str]] = {}
+    moved = {
+        requirement_id: meta
+        for requirement_id, meta in ((plan.index.changes() or {}) if plan.index is not None else {}).items()
+        if meta is not None
+    }
+    state_root = project_state_dir(flow_dir, project)
+    state_root.mkdir(parents=True, exist_ok=True)
+    trash = Path(tempfile.mkdtemp(prefix=".refactor-", dir=state_root))
+
+    def move(source: Path, target: Path) -> None:
+        created = not target.parent.exists()
+        target.parent.mkdir(parents=True, exist_ok=True)
+        source.rename(target)
+        undo.append(lambda: target.rename(source))
+        if created:
+            undo.append(lambda: _remove_empty(target.parent))
+
+    def write(number: int, capability: str, text: str) -> None:
+        # Snapshot the whole capability folder: directory-layout specs span many files.
+        path = canonical_spec_path(flow_dir, project, capability)
+        directory = path.parent
+        backup = trash / f"backup-{number}"
+        existed = directory.exists()
+        if existed:
+            shutil.copytree(directory, backup)
+
+        def restore() -> None:
+            shutil.rmtree(directory, ignore_errors=True)
+            if existed:
+                shutil.copytree(backup, directory)
+
+        undo.append(restore)
+        before[capability] = read_canonical_spec(path)
+        write_canonical_spec(path, text, capability, plan.index)
+
+    def retire(number: int, path: Path) -> None:
+        # Only the source's own spec files go: nested capabilities stay in place.
+        directory = path.parent
+        backup = trash / f"removed-{number}"
+        for file in canonical_spec_files(path):
+            copy = backup / file.relative_to(directory)
+            copy.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy2(file, copy)
+        undo.append(lambda: shutil.copytree(backup, directory, dirs_exist_ok=True))
+        remove_canonical_spec(path)
+
+    try:
+        for source, target in plan.dir_moves:
+            move(source, target)
+        for number, (capability, text) in enumerate(plan.writes.items()):
+            write(number, capability, text)
+        for number, path in enumerate(plan.removals):
+            retire(number, path)
+        for source, target in plan.change_moves:
+            move(source, target)
+        if plan.index is not None and plan.index_updates:
+            index_file = spec_index_path(flow_dir, project)
+            previous_index = index_file.read_text(encoding="utf-8") if index_file.exists() else None
+            save_spec_index(flow_dir, project, plan.index)
+            if previous_index is None:
+                undo.append(lambda: index_file.unlink())
+            else:
+                undo.append(lambda: _write_atomic(index_file, previous_index))
+    except Exception as exc:
+        for step in reversed(undo):
+            try:
+                step()
+            except OSError:
+                pass
+        shutil.rmtree(trash, ignore_errors=True)
+        raise RefactorError(f"Refactor failed and was rolled back: {exc}") from exc
+    shutil.rmtree(trash, ignore_errors=True)
+
+    timestamp = datetime.now(timezone.utc).isoformat()
+    history = SpecHistory.load(flow_dir, project)
+    for capability in [*plan.renames.values(), *plan.writes]:
+        after = read_canonical_spec(canonical_spec_path(flow_dir, project, capability))
+        if after is not None:
+            history.record(capability, before.get(capability), after, change_id, timestamp)
+    history.save()
+    lineage = RequirementHistory.load(flow_dir, project)
+    for requirement_id, meta in sorted(moved.items()):
+        lineage.record(requirement_id, "MOVED", meta["title"], meta["capability"], change_id, timestamp)
+    lineage.save()
+    update_reference_graph(flow_dir, project, [*plan.renames, *plan.renames.values(), *plan.retired, *plan.writes])
+
+
+def _write_atomic(path: Path, text: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _remove_empty(directory: Path) -> None:
+    try:
+        directory.rmdir()
+    except OSError:
+        pass
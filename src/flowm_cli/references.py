@@ -0,0 +1,189 @@
+"""Cross-reference graph between canonical requirements, capabilities and requirement IDs.
+
+Each canonical requirement's outgoing references are extracted once, when its
+capability is merged, and persisted per capability in
+``state/reference_graph.json``. Candidate targets are backticked names
+(`` `billing` ``) and dotted requirement IDs (``billing.invoice-numbers``).
+They are resolved against known capabilities and the spec index when the graph
+is queried, so a reference written before its target exists starts counting
+once the target is merged.
+"""
+from __future__ import annotations
+
+import json
+import re
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+from .state import (
+    SpecDocument,
+    SpecIndex,
+    StateError,
+    canonical_capabilities,
+    canonical_spec_path,
+    read_canonical_spec,
+    reference_graph_path,
+    state_lock,
+)
+
+REFERENCE_GRAPH_VERSION = 1
+
+_NAME_REF_RE = re.compile(r"`([A-Za-z0-9][\w./-]*)`")
+_ID_REF_RE = re.compile(r"\b[a-z0-9][a-z0-9_-]*(?:\.[a-z0-9][a-z0-9_-]*)+\b")
+_ID_LINE_RE = re.compile(r"^\s*requirement-id\s*:", re.IGNORECASE)
+
+Node = Tuple[str, str]  # ("capability", name) or ("requirement", id)
+
+
+def extract_references(body: str) -> List[str]:
+    """Candidate reference targets in a requirement block, ignoring its own ``Requirement-ID`` line."""
+
+    found: Set[str] = set()
+    for line in body.splitlines():
+        if _ID_LINE_RE.match(line):
+            continue
+        found.update(_NAME_REF_RE.findall(line))
+        found.update(_ID_REF_RE.findall(line))
+    return sorted(found)
+
+
+@dataclass
+class Impact:
+    capability: str
+    depth: int
+    via: Optional[str]
+
+
+class ReferenceGraph:
+    """Outgoing references per capability and requirement title."""
+
+    def __init__(self, path: Path, data: Optional[Dict] = None) -> None:
+        self.path = path
+        self.capabilities: Dict[str, Dict] = (data or {}).get("capabilities", {})
+        self._changed: Dict[str, Optional[Dict]] = {}
+
+    @classmethod
+    def _read(cls, path: Path) -> Optional[Dict]:
+        if not path.exists():
+            return None
+        try:
+            raw = json.loads(path.read_text(encoding="utf-8"))
+        except json.JSONDecodeError:
+            return None
+        if isinstance(raw, dict) and raw.get("version") == REFERENCE_GRAPH_VERSION:
+            return raw
+        return None
+
+    @classmethod
+    def load(cls, flow_dir: Path, project: str) -> "ReferenceGraph":
+        path = reference_graph_path(flow_dir, project)
+        return cls(path, cls._read(path))
+
+    def save(self, flow_dir: Path, project: str) -> None:
+        """Replay updated capabilities onto the file as it is now, under the state lock."""
+
+        if not self._changed:
+            return
+        with state_lock(flow_dir, project):
+            fresh = (self._read(self.path) or {}).get("capabilities", {})
+            for capability, entry in self._changed.items():
+                if entry is None:
+                    fresh.pop(capability, None)
+                else:
+                    fresh[capability] = entry
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            payload = {"version": REFERENCE_GRAPH_VERSION, "capabilities": fresh}
+            self.path.write_text(json.dumps(payload, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+        self.capabilities = fresh
+        self._changed = {}
+
+    def update(self, flow_dir: Path, project: str, capability: str) -> None:
+        """Re-extract one capability's references from its canonical spec."""
+
+        path = canonical_spec_path(flow_dir, project, capability)
+        text = read_canonical_spec(path)
+        if text is None:
+            entry: Optional[Dict] = None
+            self.capabilities.pop(capability, None)
+        else:
+            document = SpecDocument.parse(text)
+            references = {title: extract_references(document.block_text(title)) for title in document.titles()}
+            entry = {"references": {title: targets for title, targets in references.items() if targets}}
+            self.capabilities[capability] = entry
+        self._changed[capability] = entry
+
+    def sync(self, flow_dir: Path, project: str) -> int:
+        """Add capabilities missing from the graph and drop vanished ones; return how many changed."""
+
+        current = canonical_capabilities(flow_dir, project)
+        stale = [capability for capability in self.capabilities if capability not in current]
+        missing = [capability for capability in current if capability not in self.capabilities]
+        for capability in stale + missing:
+            self.update(flow_dir, project, capability)
+        return len(stale) + len(missing)
+
+    def referrers(self) -> Dict[str, List[Tuple[str, str]]]:
+        """Reverse adjacency: target token -> ``(capability, title)`` of requirements mentioning it."""
+
+        reverse: Dict[str, List[Tuple[str, str]]] = {}
+        for capability, entry in sorted(self.capabilities.items()):
+            for title, targets in entry["references"].items():
+                for target in targets:
+                    reverse.setdefault(target, []).append((capability, title))
+        return reverse
+
+    def impact(self, target: str, spec_index: SpecIndex) -> List[Impact]:
+        """Capabilities transitively affected by a change to ``target``, nearest first.
+
+        ``target`` is a capability name or requirement ID. A requirement that
+        mentions an affected capability, or one of its requirement IDs, makes
+        its own capability and requirement affected in turn.
+        """
+
+        if target in self.capabilities:
+            root: Node = ("capability", target)
+            owner = target
+        elif target in spec_index:
+            root = ("requirement", target)
+            owner = str(spec_index[target].get("capability"))
+        else:
+            raise StateError(f"Unknown capability or requirement ID '{target}'")
+
+        reverse = self.referrers()
+        affected: Dict[str, Impact] = {owner: Impact(owner, 0, None)}
+        seen: Set[Node] = {root}
+        queue: Deque[Tuple[Node, int]] = deque([(root, 0)])
+        while queue:
+            (kind, name), depth = queue.popleft()
+            tokens = [name] + spec_index.ids_for(name) if kind == "capability" else [name]
+            for token in tokens:
+                for capability, title in reverse.get(token, []):
+                    if capability not in affected:
+                        affected[capability] = Impact(capability, depth + 1, f"{capability}/{title} → {token}")
+                    for node in (("capability", capability), ("requirement", spec_index.find(capability, title))):
+                        if node[1] and node not in seen:
+                            seen.add(node)
+                            queue.append((node, depth + 1))
+        return sorted(affected.values(), key=lambda item: (item.depth, item.capability))
+
+
+def load_reference_graph(flow_dir: Path, project: str) -> ReferenceGraph:
+    """Load the graph, picking up capabilities created or removed outside merges."""
+
+    graph = ReferenceGraph.load(flow_dir, project)
+    if graph.sync(flow_dir, project):
+        graph.save(flow_dir, project)
+    return graph
+
+
+def update_reference_graph(flow_dir: Path, project: str, capabilities: Optional[Iterable[str]] = None) -> None:
+    """Refresh the graph entries of capabilities whose canonical spec was just written (all when ``None``)."""
+
+    graph = ReferenceGraph.load(flow_dir, project)
+    if capabilities is None:
+        capabilities = sorted(set(graph.capabilities) | set(canonical_capabilities(flow_dir, project)))
+    for capability in capabilities:
+        graph.update(flow_dir, project, capability)
+    graph.save(flow_dir, project)
@@ -0,0 +1,350 @@
+"""Full-text search over canonical specs, delta specs and change notes."""
+from __future__ import annotations
+
+import json
+import math
+import re
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import typer
+from rich.markup import escape
+from rich.panel import Panel
+
+from .state import (
+    REQUIREMENT_HEADER,
+    REQUIREMENTS_DIRNAME,
+    SPEC_ORDER_FILENAME,
+    StateError,
+    file_sha256,
+    list_changes,
+    load_spec_index,
+    project_dir,
+    requirement_title,
+    search_index_path,
+)
+from .utils import console, locate_flow_dir, require_flow_dir, resolve_project
+
+SEARCH_INDEX_VERSION = 1
+CHANGE_DOCUMENTS = ("spec.md", "plan.md", "tasks.md", "notes/research.md")
+TITLE_WEIGHT = 3
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TOKEN_RE = re.compile(r"[^\W_]+", re.UNICODE)
+_HEADING_RE = re.compile(r"^#{1,6}\s+(.*)$")
+
+
+def tokenize(text: str) -> List[str]:
+    return [token.lower() for token in _TOKEN_RE.findall(text)]
+
+
+@dataclass
+class SearchHit:
+    path: str
+    kind: str
+    title: str
+    line: int
+    score: float
+    capability: Optional[str] = None
+    change: Optional[str] = None
+    requirement_id: Optional[str] = None
+    snippet: str = ""
+
+    def to_dict(self) -> Dict[str, object]:
+        return {key: value for key, value in self.__dict__.items() if value is not None}
+
+
+def iter_documents(flow_dir: Path, project: str) -> Iterator[Tuple[str, Path]]:
+    """Yield ``(kind, path)`` for every searchable Markdown file in ``project``."""
+
+    root = project_dir(flow_dir, project)
+    specs_root = root / "specs"
+    if specs_root.exists():
+        for path in sorted(specs_root.rglob("spec.md")):
+            yield "canonical", path
+        # Directory-layout specs are indexed one requirement file at a time.
+        for order in sorted(specs_root.rglob(SPEC_ORDER_FILENAME)):
+            for path in sorted((order.parent / REQUIREMENTS_DIRNAME).glob("*.md")):
+                yield "canonical", path
+    for change in list_changes(flow_dir, project):
+        change_root = root / "changes" / change
+        for name in CHANGE_DOCUMENTS:
+            path = change_root / name
+            if path.is_file():
+                yield "change", path
+        delta_root = change_root / "specs"
+        if delta_root.exists():
+            for path in sorted(delta_root.rglob("spec.md")):
+                yield "delta", path
+
+
+def split_units(text: str, kind: str) -> List[Tuple[str, int, int]]:
+    """Split a document into ``(title, start_line, end_line)`` search units.
+
+    Spec files are split per requirement block; other notes per Markdown heading.
+    """
+
+    lines = text.splitlines()
+    starts: List[Tuple[int, str]] = []
+    for idx, line in enumerate(lines):
+        if kind != "change":
+            if line.startswith(REQUIREMENT_HEADER):
+                starts.append((idx, requirement_title(line)))
+            continue
+        match = _HEADING_RE.match(line)
+        if match:
+            starts.append((idx, match.group(1).strip()))
+    if not starts or starts[0][0] != 0:
+        starts.insert(0, (0, ""))
+    bounds = [start for start, _ in starts[1:]] + [len(lines)]
+    return [(title, start, end) for (start, title), end in zip(starts, bounds) if end > start]
+
+
+class SearchIndex:
+    """Inverted index persisted in ``state/search_index.json``.
+
+    ``files`` records each document's stat/hash and units, ``docs`` maps a
+    compact unit id to ``[path, unit]``, and ``postings`` maps a term to
+    ``{unit id: weighted term frequency}``. :meth:`refresh` only re-tokenizes
+    documents whose content hash changed.
+    """
+
+    def __init__(self, path: Path, root: Path, data: Optional[Dict] = None) -> None:
+        self.path = path
+        self.root = root
+        data = data or {}
+        self.files: Dict[str, Dict] = data.get("files", {})
+        self.docs: Dict[str, List] = data.get("docs", {})
+        self.postings: Dict[str, Dict[str, int]] = data.get("postings", {})
+        self.next_doc: int = data.get("next_doc", 0)
+        self.dirty = False
+
+    @classmethod
+    def load(cls, flow_dir: Path, project: str) -> "SearchIndex":
+        path = search_index_path(flow_dir, project)
+        data: Optional[Dict] = None
+        if path.exists():
+            try:
+                raw = json.loads(path.read_text(encoding="utf-8"))
+            except json.JSONDecodeError:
+                raw = None
+            if isinstance(raw, dict) and raw.get("version") == SEARCH_INDEX_VERSION:
+                data = raw
+        return cls(path, project_dir(flow_dir, project), data)
+
+    def save(self) -> None:
+        if not self.dirty:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        payload = {
+            "version": SEARCH_INDEX_VERSION,
+            "files": self.files,
+            "docs": self.docs,
+            "postings": self.postings,
+            "next_doc": self.next_doc,
+        }
+        self.path.write_text(json.dumps(payload, sort_keys=True) + "\n", encoding="utf-8")
+        self.dirty = False
+
+    def refresh(self, documents: List[Tuple[str, Path]]) -> int:
+        """Bring the index in line with ``documents``; return how many were re-tokenized."""
+
+        seen = set()
+        reindexed = 0
+        for kind, path in documents:
+            key = path.relative_to(self.root).as_posix()
+            seen.add(key)
+            stat = path.stat()
+            entry = self.files.get(key)
+            if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+                continue
+            digest = file_sha256(path)
+            if entry and entry["sha256"] == digest:
+                entry.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+                self.dirty = True
+                continue
+            self._drop(key)
+            self._add(key, kind, path, digest, stat.st_size, stat.st_mtime_ns)
+            reindexed += 1
+        for key in [key for key in self.files if key not in seen]:
+            self._drop(key)
+        return reindexed
+
+    def _drop(self, key: str) -> None:
+        entry = self.files.pop(key, None)
+        if entry is None:
+            return
+        for unit in entry["units"]:
+            doc = unit["doc"]
+            self.docs.pop(doc, None)
+            for term in unit["terms"]:
+                posting = self.postings.get(term)
+                if posting is None:
+                    continue
+                posting.pop(doc, None)
+                if not posting:
+                    del self.postings[term]
+        self.dirty = True
+
+    def _add(self, key: str, kind: str, path: Path, digest: str, size: int, mtime_ns: int) -> None:
+        text = path.read_text(encoding="utf-8")
+        lines = text.splitlines()
+        units = []
+        for number, (title, start, end) in enumerate(split_units(text, kind)):
+            counts = Counter(tokenize("\n".join(lines[start:end])))
+            for token in tokenize(title):
+                counts[token] += TITLE_WEIGHT
+            doc = str(self.next_doc)
+            self.next_doc += 1
+            self.docs[doc] = [key, number]
+            for term, count in counts.items():
+                self.postings.setdefault(term, {})[doc] = count
+            units.append(
+                {
+                    "doc": doc,
+                    "title": title,
+                    "start": start,
+                    "end": end,
+                    "length": sum(counts.values()),
+                    "terms": sorted(counts),
+                }
+            )
+        self.files[key] = {
+            "kind": kind,
+            "sha256": digest,
+            "size": size,
+            "mtime_ns": mtime_ns,
+            "units": units,
+        }
+        self.dirty = True
+
+    def query(self, text: str, *, limit: int = 10, kind: Optional[str] = None) -> List[Tuple[str, int, float]]:
+        """Return ``(path, unit, score)`` ranked by BM25 over the indexed units."""
+
+        terms = list(dict.fromkeys(tokenize(text)))
+        if not terms:
+            return []
+        total_units = sum(len(entry["units"]) for entry in self.files.values()) or 1
+        total_length = sum(unit["length"] for entry in self.files.values() for unit in entry["units"])
+        average = total_length / total_units or 1.0
+
+        scores: Dict[str, float] = {}
+        for term in terms:
+            posting = self.postings.get(term, {})
+            if not posting:
+                continue
+            idf = math.log(1 + (total_units - len(posting) + 0.5) / (len(posting) + 0.5))
+            for doc, frequency in posting.items():
+                key, number = self.docs[doc]
+                entry = self.files[key]
+                if kind and entry["kind"] != kind:
+                    continue
+                length = entry["units"][number]["length"]
+                norm = frequency + BM25_K1 * (1 - BM25_B + BM25_B * length / average)
+                scores[doc] = scores.get(doc, 0.0) + idf * frequency * (BM25_K1 + 1) / norm
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+        results = []
+        for doc, score in ranked:
+            key, number = self.docs[doc]
+            results.append((key, number, score))
+        return results
+
+
+def search_project(
+    flow_dir: Path,
+    project: str,
+    query: str,
+    *,
+    limit: int = 10,
+    kind: Optional[str] = None,
+) -> List[SearchHit]:
+    index = SearchIndex.load(flow_dir, project)
+    index.refresh(list(iter_documents(flow_dir, project)))
+    index.save()
+
+    spec_index = load_spec_index(flow_dir, project)
+    terms = set(tokenize(query))
+    hits: List[SearchHit] = []
+    for key, number, score in index.query(query, limit=limit, kind=kind):
+        entry = index.files[key]
+        unit = entry["units"][number]
+        parts = key.split("/")
+        hit = SearchHit(
+            path=key,
+            kind=entry["kind"],
+            title=unit["title"],
+            line=unit["start"] + 1,
+            score=round(score, 4),
+        )
+        if entry["kind"] == "canonical" and parts[-2] == REQUIREMENTS_DIRNAME:
+            hit.capability = "/".join(parts[1:-2])
+            hit.requirement_id = Path(parts[-1]).stem
+        elif entry["kind"] == "canonical":
+            hit.capability = "/".join(parts[1:-1])
+            hit.requirement_id = spec_index.find(hit.capability, unit["title"]) if unit["title"] else None
+        else:
+            hit.change = parts[1]
+            if entry["kind"] == "delta":
+                hit.capability = "/".join(parts[3:-1])
+        hit.line, hit.snippet = _snippet(index.root / key, unit, terms)
+        hits.append(hit)
+    return hits
+
+
+def _snippet(path: Path, unit: Dict, terms: set) -> Tuple[int, str]:
+    # Prefer the body line sharing the most query terms; the header is the fallback.
+    best: Tuple[float, int, str] = (0, unit["start"] + 1, unit["title"])
+    with path.open("r", encoding="utf-8") as fh:
+        for number, line in enumerate(fh):
+            if number < unit["start"]:
+                continue
+            if number >= unit["end"]:
+                break
+            overlap: float = len(terms & set(tokenize(line)))
+            if number == unit["start"] and unit["title"] and overlap:
+                overlap = 0.5
+            if overlap > best[0]:
+                best = (overlap, number + 1, line.strip())
+    return best[1], best[2]
+
+
+def register_search_commands(app: typer.Typer) -> None:
+    """Attach the root ``search`` command to the Typer app."""
+
+    @app.command("search")
+    def cmd_search(
+        query: str = typer.Argument(..., help="Words to look for"),
+        project: Optional[str] = typer.Option(None, "--project", "-p", help="Project slug"),
+        limit: int = typer.Option(10, "--limit", "-n", min=1, help="Maximum number of results"),
+        kind: Optional[str] = typer.Option(None, "--kind", help="Restrict to canonical, delta, or change documents"),
+        json_output: bool = typer.Option(False, "--json", help="Emit JSON instead of a table"),
+    ) -> None:
+        """Search canonical specs, delta specs, and change notes."""
+
+        if kind not in {None, "canonical", "delta", "change"}:
+            console.print(Panel("--kind must be canonical, delta, or change.", border_style="red"))
+            raise typer.Exit(1)
+        flow_path = locate_flow_dir()
+        require_flow_dir(flow_path)
+        project_slug = resolve_project(flow_path, project)
+        try:
+            hits = search_project(flow_path, project_slug, query, limit=limit, kind=kind)
+        except StateError as exc:
+            console.print(Panel(str(exc), border_style="red"))
+            raise typer.Exit(1)
+
+        if json_output:
+            typer.echo(json.dumps([hit.to_dict() for hit in hits], indent=2))
+            return
+        if not hits:
+            console.print(Panel(f"No matches for '{query}'.", border_style="yellow"))
+            return
+        rows = []
+        for hit in hits:
+            label = hit.requirement_id or hit.title or hit.path
+            rows.append(f"[bold]{escape(label)}[/bold] · {hit.kind} · {hit.path}:{hit.line}\n  {escape(hit.snippet)}")
+        console.print(Panel("\n".join(rows), title=f"Search: {query}", border_style="cyan"))
@@ -0,0 +1,236 @@
+"""TF-IDF similarity between new requirement text and canonical requirements.
+
+Requires the optional NumPy dependency (``pip install 'flowm-cli[similarity]'``).
+Term counts are stored per capability as sparse rows (``indptr``/``indices``/
+``counts`` arrays) under ``state/similarity/``, next to a shared vocabulary
+with document frequencies, so a refresh only re-tokenizes capabilities whose
+canonical spec changed. Queries weight the rows with the current IDF and
+score every requirement with one vectorized cosine computation.
+"""
+from __future__ import annotations
+
+import json
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # optional extra
+    np = None  # type: ignore[assignment]
+
+from .dedupe import normalize_body
+from .search import tokenize
+from .state import (
+    SpecDocument,
+    canonical_capabilities,
+    canonical_spec_path,
+    canonical_spec_sha256,
+    read_canonical_spec,
+    similarity_dir,
+)
+
+SIMILARITY_INDEX_VERSION = 1
+VOCABULARY_FILENAME = "vocabulary.json"
+DEFAULT_TOP_K = 5
+
+
+class SimilarityUnavailable(RuntimeError):
+    """Raised when the optional NumPy dependency is not installed."""
+
+
+def similarity_available() -> bool:
+    return np is not None
+
+
+def require_numpy() -> None:
+    if np is None:
+        raise SimilarityUnavailable(
+            "Similarity search needs NumPy. Install it with: pip install 'flowm-cli[similarity]'"
+        )
+
+
+def requirement_terms(title: str, body: str) -> Counter:
+    """Term counts for a requirement: its title plus normalized body and scenarios."""
+
+    return Counter(tokenize(title) + normalize_body(body))
+
+
+@dataclass
+class SimilarMatch:
+    capability: str
+    title: str
+    score: float
+
+
+class SimilarityIndex:
+    """Sparse TF-IDF index over canonical requirements, refreshed per capability."""
+
+    def __init__(self, root: Path, data: Optional[Dict] = None) -> None:
+        require_numpy()
+        self.root = root
+        data = data or {}
+        self.terms: Dict[str, int] = data.get("terms", {})
+        self.df: List[int] = data.get("df", [])
+        self.capabilities: Dict[str, Dict] = data.get("capabilities", {})
+        self.dirty = False
+        self._weights: Optional[Tuple] = None
+
+    @classmethod
+    def load(cls, flow_dir: Path, project: str) -> "SimilarityIndex":
+        root = similarity_dir(flow_dir, project)
+        path = root / VOCABULARY_FILENAME
+        data: Optional[Dict] = None
+        if path.exists():
+            try:
+                raw = json.loads(path.read_text(encoding="utf-8"))
+            except json.JSONDecodeError:
+                raw = None
+            if (
+                isinstance(raw, dict)
+                and raw.get("version") == SIMILARITY_INDEX_VERSION
+                and all((root / entry["file"]).exists() for entry in raw.get("capabilities", {}).values())
+            ):
+                data = raw
+        return cls(root, data)
+
+    def save(self) -> None:
+        if not self.dirty:
+            return
+        self.root.mkdir(parents=True, exist_ok=True)
+        payload = {
+            "version": SIMILARITY_INDEX_VERSION,
+            "terms": self.terms,
+            "df": self.df,
+            "capabilities": self.capabilities,
+        }
+        tmp = self.root / f".{VOCABULARY_FILENAME}.tmp"
+        tmp.write_text(json.dumps(payload, sort_keys=True) + "\n", encoding="utf-8")
+        tmp.replace(self.root / VOCABULARY_FILENAME)
+        self.dirty = False
+
+    def refresh(self, flow_dir: Path, project: str) -> int:
+        """Re-tokenize capabilities whose canonical spec changed; return how many were redone."""
+
+        current = canonical_capabilities(flow_dir, project)
+        redone = 0
+        for capability in current:
+            path = canonical_spec_path(flow_dir, project, capability)
+            digest = canonical_spec_sha256(path)
+            entry = self.capabilities.get(capability)
+            if entry and entry["sha256"] == digest:
+                continue
+            if entry:
+                self._forget(capability)
+            document = SpecDocument.parse(read_canonical_spec(path) or "")
+            titles = document.titles()
+            self._store(
+                capability,
+                digest,
+                titles,
+                [requirement_terms(title, document.block_text(title)) for title in titles],
+            )
+            redone += 1
+        for capability in set(self.capabilities) - set(current):
+            self._forget(capability)
+            del self.capabilities[capability]
+        return redone
+
+    def _rows(self, capability: str) -> Tuple:
+        with np.load(self.root / self.capabilities[capability]["file"]) as arrays:
+            return arrays["indptr"], arrays["indices"], arrays["counts"]
+
+    def _forget(self, capability: str) -> None:
+        _, indices, _ = self._rows(capability)
+        for column in indices.tolist():
+            self.df[column] -= 1
+        (self.root / self.capabilities[capability]["file"]).unlink()
+        self.dirty = True
+        self._weights = None
+
+    def _store(self, capability: str, digest: Optional[str], titles: List[str], rows: Sequence[Counter]) -> None:
+        indptr = [0]
+        indices: List[int] = []
+        counts: List[int] = []
+        for terms in rows:
+            for term, count in terms.items():
+                column = self.terms.setdefault(term, len(self.terms))
+                if column == len(self.df):
+                    self.df.append(0)
+                self.df[column] += 1
+                indices.append(column)
+                counts.append(count)
+            indptr.append(len(indices))
+        name = f"{capability.replace('/', '--')}.npz"
+        self.root.mkdir(parents=True, exist_ok=True)
+        np.savez(
+            self.root / name,
+            indptr=np.asarray(indptr, dtype=np.int64),
+            indices=np.asarray(indices, dtype=np.int32),
+            counts=np.asarray(counts, dtype=np.float32),
+        )
+        self.capabilities[capability] = {"sha256": digest, "titles": titles, "file": name}
+        self.dirty = True
+        self._weights = None
+
+    def _matrix(self) -> Tuple:
+        """TF-IDF weights for every stored row, concatenated across capabilities."""
+
+        if self._weights is None:
+            owners: List[Tuple[str, str]] = []
+            lengths, indices, counts = [], [], []
+            for capability in sorted(self.capabilities):
+                indptr, cols, values = self._rows(capability)
+                owners.extend((capability, title) for title in self.capabilities[capability]["titles"])
+                lengths.append(np.diff(indptr))
+                indices.append(cols)
+                counts.append(values)
+            rows = len(owners)
+            row_lengths = np.concatenate(lengths) if lengths else np.zeros(0, dtype=np.int64)
+            columns = np.concatenate(indices) if indices else np.zeros(0, dtype=np.int32)
+            values = np.concatenate(counts) if counts else np.zeros(0, dtype=np.float32)
+            idf = np.log((1.0 + rows) / (1.0 + np.asarray(self.df, dtype=np.float64))) + 1.0
+            weights = values * idf[columns]
+            row_ids = np.repeat(np.arange(rows), row_lengths)
+            norms = np.sqrt(np.bincount(row_ids, weights=weights * weights, minlength=rows))
+            self._weights = (owners, idf, columns, weights, row_ids, norms)
+        return self._weights
+
+    def query(
+        self,
+        terms: Counter,
+        *,
+        top: int = DEFAULT_TOP_K,
+        exclude: Optional[Tuple[str, str]] = None,
+    ) -> List[SimilarMatch]:
+        """Return the ``top`` canonical requirements closest to ``terms`` by cosine similarity."""
+
+        owners, idf, columns, weights, row_ids, norms = self._matrix()
+        if not owners:
+            return []
+        vector = np.zeros(len(idf))
+        for term, count in terms.items():
+            column = self.terms.get(term)
+            if column is not None:
+                vector[column] = count * idf[column]
+        magnitude = float(np.linalg.norm(vector))
+        if magnitude == 0.0:
+            return []
+        dots = np.bincount(row_ids, weights=weights * vector[columns], minlength=len(owners))
+        scores = np.divide(dots, norms * magnitude, out=np.zeros_like(dots), where=norms > 0)
+        if exclude is not None and exclude in owners:
+            scores[owners.index(exclude)] = 0.0
+        count = min(top, len(owners))
+        best = np.argpartition(-scores, count - 1)[:count]
+        ranked = sorted(best.tolist(), key=lambda row: (-scores[row], owners[row]))
+        return [SimilarMatch(*owners[row], float(scores[row])) for row in ranked if scores[row] > 0]
+
+
+def load_similarity_index(flow_dir: Path, project: str) -> SimilarityIndex:
+    """Load, refresh and persist the project's similarity index."""
+
+    index = SimilarityIndex.load(flow_dir, project)
+    index.refresh(flow_dir, project)
+    index.save()
+    return index
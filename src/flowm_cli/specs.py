@@ -1,48 +1,96 @@
 """Spec validation and apply commands."""
 from __future__ import annotations
 
+import filecmp
+import hashlib
 import json
-from dataclasses import dataclass
+import os
+import shutil
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
-from difflib import unified_diff
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, TypeVar
 
 import typer
+from rich.markup import escape
 from rich.panel import Panel
 
+from .dedupe import DEFAULT_THRESHOLD, Fingerprint, load_lsh_index
+from .diffs import apply_block_patch, block_reverse_patch, spec_diff_lines
+from .githistory import GitBlobCache, requirement_events
+from .refactor import RefactorError, apply_refactor, load_refactor_map, plan_refactor
+from .references import load_reference_graph, update_reference_graph
+from .similar import (
+    DEFAULT_TOP_K,
+    SimilarityUnavailable,
+    load_similarity_index,
+    requirement_terms,
+)
 from .state import (
     SPEC_MANIFEST_FILENAME,
     SPEC_MERGE_REPORT_FILENAME,
     archive_change,
+    apply_deltas_to_file,
     apply_deltas_to_spec,
     canonical_spec_path,
+    canonical_capabilities,
+    capability_locks,
+    canonical_spec_sha256,
     change_delta_specs,
+    conflict_index_path,
     change_dir,
     list_changes,
     default_spec_content,
     ensure_canonical_spec,
+    file_sha256,
+    requirement_title,
+    DeltaCache,
     DeltaParseResult,
     RequirementDelta,
+    RequirementHistory,
+    SpecDocument,
+    SpecHistory,
+    SpecIndex,
+    StateError,
     load_spec_index,
-    parse_delta_markdown,
+    parse_delta_file,
     project_dir,
+    project_state_dir,
+    read_canonical_spec,
+    read_indexed_requirement,
+    record_requirement_spans,
+    remove_canonical_spec,
+    set_canonical_layout,
+    write_canonical_spec,
     save_spec_index,
     slugify_identifier,
     spec_manifest_path,
     spec_merge_report_path,
-    validate_delta_result,
+    spec_plan_path,
+    uses_directory_layout,
 )
+from .trace import trace_project
 from .utils import (
     append_timeline,
     console,
     locate_flow_dir,
+    project_source_path,
     require_flow_dir,
     resolve_project,
 )
 
 specs_app = typer.Typer(help="Validate and apply spec deltas")
 
+T = TypeVar("T")
+R = TypeVar("R")
+
+PREVIEW_FILENAME = "merge.preview.md"
+STAGING_DIRNAME = "staging"
+QUEUE_STAGING_NAME = ".queue"
+
 
 class SpecCommandError(RuntimeError):
     """Raised when spec helper operations fail."""
@@ -50,13 +98,57 @@ class SpecCommandError(RuntimeError):
 
 @dataclass
 class CapabilityContext:
+    """One capability of a change, with its merge result staged on disk.
+
+    Only paths are held: ``current_text``/``updated_text`` read the base and the
+    staged spec on demand, so memory stays flat however many specs a change touches.
+    """
+
     name: str
     delta_path: Path
     canonical_path: Path
     parsed: DeltaParseResult
-    current_text: str
-    updated_text: str
+    base_path: Optional[Path]
+    staged_path: Path
+    changed: bool
+    would_create: bool
+    inputs: Dict[str, Optional[str]] = field(default_factory=dict)
+
+    @property
+    def current_text(self) -> str:
+        text = read_canonical_spec(self.base_path) if self.base_path else None
+        return default_spec_content(self.name) if text is None else text
+
+    @property
+    def updated_text(self) -> str:
+        return self.staged_path.read_text(encoding="utf-8")
+
+
+@dataclass
+class MergeTarget:
+    """A canonical spec write, backed by in-memory text or a saved preview file.
+
+    ``base_sha256`` is the canonical hash the update was computed from; with
+    ``parsed`` (and ``base_path``, a copy of that base) a stale target can be
+    re-applied to the fresh spec instead of aborting.
+    """
+
+    name: str
+    delta_path: Path
+    canonical_path: Path
+    changed: bool
     would_create: bool
+    updated_text: Optional[str] = None
+    preview_path: Optional[Path] = None
+    base_sha256: Optional[str] = None
+    base_path: Optional[Path] = None
+    parsed: Optional[DeltaParseResult] = None
+
+    def read_updated(self) -> str:
+        if self.updated_text is not None:
+            return self.updated_text
+        assert self.preview_path is not None
+        return self.preview_path.read_text(encoding="utf-8")
 
 
 @specs_app.command("status")
@@ -69,6 +161,7 @@ def specs_status(
     require_flow_dir(flow_path)
     project_slug = resolve_project(flow_path, project)
     rows: List[str] = []
+    cache = DeltaCache.load(flow_path, project_slug)
 
     for change in list_changes(flow_path, project_slug):
         deltas = change_delta_specs(flow_path, project_slug, change)
@@ -76,11 +169,13 @@ def specs_status(
             continue
         manifest = spec_manifest_path(flow_path, project_slug, change)
         report = spec_merge_report_path(flow_path, project_slug, change)
+        valid = all(not _lookup_delta(cache, capability, path)[1] for capability, path in deltas)
         rows.append(
             " · ".join(
                 [
                     f"{change}",
                     f"specs={len(deltas)}",
+                    f"valid={'yes' if valid else 'no'}",
                     f"manifest={'yes' if manifest.exists() else 'no'}",
                     f"prepared={_format_file_timestamp(manifest)}",
                     f"report={_format_file_timestamp(report)}",
@@ -88,6 +183,7 @@ def specs_status(
             )
         )
 
+    cache.save()
     if not rows:
         console.print(Panel("No delta specs pending for this project.", border_style="green"))
         return
@@ -97,40 +193,108 @@ def specs_status(
     )
 
 
+@specs_app.command("conflicts")
+def specs_conflicts(
+    project: Optional[str] = typer.Option(None, "--project", "-p", help="Project slug"),
+    as_json: bool = typer.Option(False, "--json", help="Print conflicts as JSON"),
+) -> None:
+    """List requirements that more than one active change touches."""
+
+    flow_path = locate_flow_dir()
+    require_flow_dir(flow_path)
+    project_slug = resolve_project(flow_path, project)
+    touches = _refresh_touch_index(flow_path, project_slug)
+    conflicts = [
+        {"capability": capability, "title": title, "changes": owners}
+        for (capability, title), owners in sorted(touches.items())
+        if len({owner["change_id"] for owner in owners}) > 1
+    ]
+
+    if as_json:
+        typer.echo(json.dumps(conflicts, indent=2, sort_keys=True))
+    elif not conflicts:
+        console.print(Panel("No overlapping requirements across active changes.", border_style="green"))
+    else:
+        lines = [
+            f"{item['capability']} · '{item['title']}' · "
+            + ", ".join(f"{owner['change_id']} ({owner['operation']})" for owner in item["changes"])
+            for item in conflicts
+        ]
+        console.print(
+            Panel("\n".join(lines), title=f"Spec Conflicts · {project_slug}", border_style="yellow")
+        )
+    if conflicts:
+        raise typer.Exit(1)
+
+
 @specs_app.command("prepare")
 def specs_prepare(
     change_id: str = typer.Argument(..., help="Change identifier"),
     project: Optional[str] = typer.Option(None, "--project", "-p", help="Project slug"),
     diff: bool = typer.Option(True, "--diff/--no-diff", help="Write per-capability diff files"),
+    full: bool = typer.Option(False, "--full", help="Recompute every capability, even when its inputs are unchanged"),
+    changed_only: bool = typer.Option(False, "--changed-only", help="List only the capabilities that were recomputed"),
+    jobs: int = typer.Option(1, "--jobs", "-j", min=0, help="Worker processes for apply/diff work (0 = one per CPU)"),
+    dedupe: bool = typer.Option(True, "--dedupe/--no-dedupe", help="Warn when ADDED requirements duplicate canonical ones"),
+    similar: int = typer.Option(0, "--similar", min=0, help="List the N nearest canonical requirements per ADDED requirement (needs NumPy)"),
 ) -> None:
     """Generate a manifest + diff preview for the delta specs of a change."""
 
     flow_path = locate_flow_dir()
     require_flow_dir(flow_path)
     project_slug = resolve_project(flow_path, project)
+    manifest_path = spec_manifest_path(flow_path, project_slug, change_id)
+    reused: Dict[str, Dict] = {}
+    if not full:
+        reused = _reusable_manifest_entries(flow_path, project_slug, change_id, write_diffs=diff)
     try:
-        contexts = _gather_capability_contexts(flow_path, project_slug, change_id)
+        contexts = _gather_capability_contexts(
+            flow_path, project_slug, change_id, skip=set(reused), jobs=jobs
+        )
     except SpecCommandError as exc:
         console.print(Panel(str(exc), border_style="red"))
         raise typer.Exit(1)
 
-    spec_index = load_spec_index(flow_path, project_slug)
-    manifest = _build_manifest(
-        flow_path,
-        project_slug,
-        change_id,
-        contexts,
-        spec_index,
-        write_diffs=diff,
-    )
-    manifest_path = spec_manifest_path(flow_path, project_slug, change_id)
-    _write_manifest(manifest_path, manifest)
+    try:
+        spec_index = load_spec_index(flow_path, project_slug)
+        manifest = _build_manifest(
+            flow_path,
+            project_slug,
+            change_id,
+            contexts,
+            spec_index,
+            write_diffs=diff,
+            reused=reused,
+            jobs=jobs,
+        )
+        _write_manifest(manifest_path, manifest)
+        _write_plan(flow_path, project_slug, change_id, contexts, manifest)
+    finally:
+        _discard_staging(flow_path, project_slug, change_id)
+    if dedupe:
+        warnings = _duplicate_warnings(flow_path, project_slug, contexts)
+        if warnings:
+            console.print(Panel("\n".join(warnings), title="Possible duplicate requirements", border_style="yellow"))
+    if similar:
+        try:
+            neighbours = _similar_requirement_lines(flow_path, project_slug, contexts, similar)
+        except SimilarityUnavailable as exc:
+            console.print(Panel(escape(str(exc)), border_style="yellow"))
+        else:
+            if neighbours:
+                console.print(Panel("\n".join(neighbours), title="Nearest canonical requirements", border_style="cyan"))
     change_path = change_dir(flow_path, project_slug, change_id)
     rel_manifest = manifest_path.relative_to(change_path)
     stats = manifest.get("stats", {})
+    if changed_only:
+        redone = [ctx.name for ctx in contexts]
+        body = "\n".join(redone) if redone else "No capability inputs changed."
+        console.print(Panel(body, title=f"Recomputed · {change_id}", border_style="green"))
+        return
     console.print(
         Panel(
-            f"Prepared {stats.get('capabilities', 0)} capability delta(s); manifest at {rel_manifest}",
+            f"Prepared {stats.get('capabilities', 0)} capability delta(s) "
+            f"({len(contexts)} recomputed, {len(reused)} reused); manifest at {rel_manifest}",
             border_style="green",
         )
     )
@@ -138,43 +302,106 @@ def specs_prepare(
 
 @specs_app.command("merge")
 def specs_merge(
-    change_id: str = typer.Argument(..., help="Change identifier"),
+    change_ids: List[str] = typer.Argument(None, help="Change identifier (several with --queue)"),
     project: Optional[str] = typer.Option(None, "--project", "-p", help="Project slug"),
     dry_run: bool = typer.Option(False, "--dry-run", help="Preview without writing"),
     finalize: bool = typer.Option(False, "--finalize", help="Archive the change after a successful merge"),
     diff: bool = typer.Option(False, "--diff/--no-diff", help="Refresh diff files before merging"),
+    plan: bool = typer.Option(False, "--plan", help="Apply the plan saved by 'specs prepare' instead of recomputing"),
+    jobs: int = typer.Option(1, "--jobs", "-j", min=0, help="Worker processes for apply/diff work (0 = one per CPU)"),
+    queue: bool = typer.Option(False, "--queue", help="Merge every listed change in one pass, in the order given"),
+    all_ready: bool = typer.Option(False, "--all-ready", help="Queue every change whose manifest matches its current deltas"),
 ) -> None:
     flow_path = locate_flow_dir()
     require_flow_dir(flow_path)
     project_slug = resolve_project(flow_path, project)
+    change_ids = list(change_ids or [])
 
-    try:
-        contexts = _gather_capability_contexts(flow_path, project_slug, change_id)
-    except SpecCommandError as exc:
-        console.print(Panel(str(exc), border_style="red"))
+    if queue or all_ready:
+        if plan:
+            console.print(Panel("--plan cannot be combined with --queue/--all-ready.", border_style="red"))
+            raise typer.Exit(1)
+        if all_ready:
+            if change_ids:
+                console.print(Panel("Pass change ids or --all-ready, not both.", border_style="red"))
+                raise typer.Exit(1)
+            change_ids = _ready_changes(flow_path, project_slug)
+        if not change_ids:
+            console.print(Panel("No changes to merge.", border_style="yellow"))
+            raise typer.Exit(1)
+        _merge_queue(
+            flow_path,
+            project_slug,
+            change_ids,
+            dry_run=dry_run,
+            finalize=finalize,
+            write_diffs=diff,
+            jobs=jobs,
+        )
+        return
+
+    if len(change_ids) != 1:
+        console.print(Panel("Pass exactly one change id (use --queue for several).", border_style="red"))
         raise typer.Exit(1)
+    change_id = change_ids[0]
 
-    spec_index = load_spec_index(flow_path, project_slug)
-    manifest = _build_manifest(
-        flow_path,
-        project_slug,
-        change_id,
-        contexts,
-        spec_index,
-        write_diffs=diff,
-    )
-    manifest_path = spec_manifest_path(flow_path, project_slug, change_id)
-    _write_manifest(manifest_path, manifest)
+    if plan:
+        try:
+            manifest, targets = _load_plan_targets(flow_path, project_slug, change_id)
+        except SpecCommandError as exc:
+            console.print(Panel(str(exc), title="Plan rejected", border_style="red"))
+            raise typer.Exit(1)
+        spec_index = load_spec_index(flow_path, project_slug)
+        try:
+            results = _write_merge_targets(
+                flow_path,
+                project_slug,
+                change_id,
+                targets,
+                manifest,
+                spec_index,
+                dry_run=dry_run,
+                jobs=jobs,
+            )
+        except SpecCommandError as exc:
+            console.print(Panel(str(exc), title="Merge conflict", border_style="red"))
+            raise typer.Exit(1)
+    else:
+        try:
+            contexts = _gather_capability_contexts(flow_path, project_slug, change_id, jobs=jobs)
+        except SpecCommandError as exc:
+            console.print(Panel(str(exc), border_style="red"))
+            raise typer.Exit(1)
 
-    results = _perform_merge(
-        flow_path,
-        project_slug,
-        change_id,
-        contexts,
-        manifest,
-        spec_index,
-        dry_run=dry_run,
-    )
+        try:
+            spec_index = load_spec_index(flow_path, project_slug)
+            manifest = _build_manifest(
+                flow_path,
+                project_slug,
+                change_id,
+                contexts,
+                spec_index,
+                write_diffs=diff,
+                jobs=jobs,
+            )
+            manifest_path = spec_manifest_path(flow_path, project_slug, change_id)
+            _write_manifest(manifest_path, manifest)
+
+            results = _perform_merge(
+                flow_path,
+                project_slug,
+                change_id,
+                contexts,
+                manifest,
+                spec_index,
+                dry_run=dry_run,
+                jobs=jobs,
+            )
+        except SpecCommandError as exc:
+            console.print(Panel(str(exc), title="Merge conflict", border_style="red"))
+            raise typer.Exit(1)
+        finally:
+            _discard_staging(flow_path, project_slug, change_id)
 
     report_path = spec_merge_report_path(flow_path, project_slug, change_id)
     _write_merge_report(
@@ -184,6 +411,7 @@ def specs_merge(
         results,
         dry_run=dry_run,
         finalized=bool(finalize and not dry_run),
+        from_plan=plan,
     )
 
     summary = f"Merged {len(results)} capability delta(s)"
@@ -203,6 +431,562 @@ def specs_merge(
         console.print(Panel(f"Archived change '{change_id}'", border_style="cyan"))
 
 
+@specs_app.command("unmerge")
+def specs_unmerge(
+    change_id: str = typer.Argument(..., help="Merged change identifier"),
+    project: Optional[str] = typer.Option(None, "--project", "-p", help="Project slug"),
+    dry_run: bool = typer.Option(False, "--dry-run", help="Check the reverse patches without writing"),
+) -> None:
+    """Revert a merged change using the reverse patches stored in its merge report."""
+
+    flow_path = locate_flow_dir()
+    require_flow_dir(flow_path)
+    project_slug = resolve_project(flow_path, project)
+    try:
+        lines = _unmerge_change(flow_path, project_slug, change_id, dry_run=dry_run)
+    except SpecCommandError as exc:
+        console.print(Panel(str(exc), title="Unmerge refused", border_style="red"))
+        raise typer.Exit(1)
+    title = f"Unmerge plan for {change_id} (dry run)" if dry_run else f"Unmerged {change_id}"
+    console.print(Panel("\n".join(lines), title=title, border_style="cyan" if dry_run else "green"))
+
+
+@specs_app.command("dedupe")
+def specs_dedupe(
+    project: Optional[str] = typer.Option(None, "--project", "-p", help="Project slug"),
+    threshold: float = typer.Option(DEFAULT_THRESHOLD, "--threshold", min=0.0, max=1.0, help="Minimum estimated similarity for near-duplicates"),
+    json_output: bool = typer.Option(False, "--json", help="Emit JSON instead of a table"),
+) -> None:
+    """List duplicate and near-identical requirements across canonical specs."""
+
+    flow_path = locate_flow_dir()
+    require_flow_dir(flow_path)
+    project_slug = resolve_project(flow_path, project)
+    try:
+        lsh = load_lsh_index(flow_path, project_slug)
+    except StateError as exc:
+        console.print(Panel(str(exc), border_style="red"))
+        raise typer.Exit(1)
+    spec_index = load_spec_index(flow_path, project_slug)
+
+    def describe(fingerprint: Fingerprint) -> Dict[str, Optional[str]]:
+        return {
+            "capability": fingerprint.capability,
+            "title": fingerprint.title,
+            "requirement_id": spec_index.find(fingerprint.capability or "", fingerprint.title),
+        }
+
+    exact = [[describe(item) for item in group] for group in lsh.exact_groups()]
+    near = [
+        {"similarity": round(score, 3), "requirements": [describe(left), describe(right)]}
+        for left, right, score in lsh.near_pairs(threshold)
+    ]
+
+    if json_output:
+        typer.echo(json.dumps({"exact": exact, "near": near}, indent=2))
+    elif not exact and not near:
+        console.print(Panel(f"No duplicates among {len(lsh.fingerprints)} requirement(s).", border_style="green"))
+    else:
+        lines = [
+            "exact · " + " = ".join(f"{item['capability']}/{escape(str(item['title']))}" for item in group)
+            for group in exact
+        ]
+        for pair in near:
+            left, right = pair["requirements"]
+            lines.append(
+                f"{pair['similarity']:.2f}  · {left['capability']}/{escape(str(left['title']))}"
+                f" ~ {right['capability']}/{escape(str(right['title']))}"
+            )
+        console.print(Panel("\n".join(lines), title=f"Duplicate requirements · {project_slug}", border_style="yellow"))
+    if exact or near:
+        raise typer.Exit(1)
+
+
+@specs_app.command("similar")
+def specs_similar(
+    query: str = typer.Argument(..., help="Requirement text, or the path of a delta spec"),
+    project: Optional[str] = typer.Option(None, "--project", "-p", help="Project slug"),
+    top: int = typer.Option(DEFAULT_TOP_K, "--top", "-k", min=1, help="Matches to list per requirement"),
+    json_output: bool = typer.Option(False, "--json", help="Emit JSON instead of a table"),
+) -> None:
+    """Find the canonical requirements most similar to some text or a delta's requirements (TF-IDF)."""
+
+    flow_path = locate_flow_dir()
+    require_flow_dir(flow_path)
+    project_slug = resolve_project(flow_path, project)
+    source = Path(query)
+    try:
+        index = load_similarity_index(flow_path, project_slug)
+        if source.is_file():
+            parts = source.resolve().parent.parts
+            capability = "/".join(parts[len(parts) - parts[::-1].index("specs") :]) if "specs" in parts else parts[-1]
+            parsed = parse_delta_file(source)
+            queries = [
+                (f"{operation} {delta.title}", (capability, delta.title), requirement_terms(delta.title, delta.body))
+                for operation in ("ADDED", "MODIFIED")
+                for delta in parsed.requirements.get(operation, [])
+            ]
+        else:
+            queries = [("query", None, requirement_terms("", query))]
+    except (SimilarityUnavailable, StateError, OSError) as exc:
+        console.print(Panel(escape(str(exc)), border_style="red"))
+        raise typer.Exit(1)
+    spec_index = load_spec_index(flow_path, project_slug)
+
+    results = [
+        {
+            "query": label,
+            "matches": [
+                {
+                    "capability": match.capability,
+                    "title": match.title,
+                    "requirement_id": spec_index.find(match.capability, match.title),
+                    "score": round(match.score, 3),
+                }
+                for match in index.query(terms, top=top, exclude=exclude)
+            ],
+        }
+        for label, exclude, terms in queries
+    ]
+    if json_output:
+        typer.echo(json.dumps(results, indent=2))
+        return
+    if not results:
+        console.print(Panel("No ADDED or MODIFIED requirements in the delta.", border_style="yellow"))
+        return
+    for result in results:
+        lines = [
+            f"{item['score']:.2f}  {item['capability']}/{escape(item['title'])}"
+            + (f"  ({item['requirement_id']})" if item["requirement_id"] else "")
+            for item in result["matches"]
+        ]
+        console.print(
+            Panel(
+                "\n".join(lines) or "No similar requirements.",
+                title=escape(result["query"]),
+                border_style="cyan",
+            )
+        )
+
+
+@specs_app.command("impact")
+def specs_impact(
+    target: str = typer.Argument(..., help="Capability name or requirement ID"),
+    project: Optional[str] = typer.Option(None, "--project", "-p", help="Project slug"),
+    json_output: bool = typer.Option(False, "--json", help="Emit JSON instead of a table"),
+) -> None:
+    """Show capabilities and active changes transitively affected by a capability or requirement."""
+
+    flow_path = locate_flow_dir()
+    require_flow_dir(flow_path)
+    project_slug = resolve_project(flow_path, project)
+    try:
+        graph = load_reference_graph(flow_path, project_slug)
+        affected = graph.impact(target, load_spec_index(flow_path, project_slug))
+    except StateError as exc:
+        console.print(Panel(str(exc), border_style="red"))
+        raise typer.Exit(1)
+
+    names = {item.capability for item in affected}
+    changes = []
+    for change in list_changes(flow_path, project_slug):
+        touched = sorted(names.intersection(capability for capability, _ in change_delta_specs(flow_path, project_slug, change)))
+        if touched:
+            changes.append({"change_id": change, "capabilities": touched})
+
+    if json_output:
+        payload = {
+            "target": target,
+            "capabilities": [{"capability": item.capability, "depth": item.depth, "via": item.via} for item in affected],
+            "changes": changes,
+        }
+        typer.echo(json.dumps(payload, indent=2))
+        return
+    lines = [
+        f"{item.depth}  {item.capability}" + (f"  ← {escape(item.via)}" if item.via else "")
+        for item in affected
+    ]
+    lines.append("")
+    if changes:
+        lines.extend(f"change {item['change_id']}: {', '.join(item['capabilities'])}" for item in changes)
+    else:
+        lines.append("No active changes touch the affected capabilities.")
+    console.print(Panel("\n".join(lines), title=f"Impact · {escape(target)}", border_style="cyan"))
+
+
+@specs_app.command("trace")
+def specs_trace(
+    project: Optional[str] = typer.Option(None, "--project", "-p", help="Project slug"),
+    include: List[str] = typer.Option([], "--include", "-i", help="Glob of source paths to scan (repeatable), e.g. 'tests/**'"),
+    json_output: bool = typer.Option(False, "--json", help="Emit JSON instead of a table"),
+) -> None:
+    """Report which requirements and scenarios are referenced from the project's source tree."""
+
+    flow_path = locate_flow_dir()
+    require_flow_dir(flow_path)
+    project_slug = resolve_project(flow_path, project)
+    source_path = project_source_path(flow_path, project_slug)
+    if not source_path.exists():
+        console.print(Panel(f"Project path does not exist: {source_path}", border_style="red"))
+        raise typer.Exit(1)
+    try:
+        requirements, scanned, rescanned = trace_project(flow_path, project_slug, source_path, include=include)
+    except StateError as exc:
+        console.print(Panel(str(exc), border_style="red"))
+        raise typer.Exit(1)
+
+    covered = [item for item in requirements if item.covered]
+    if json_output:
+        payload = {
+            "source": str(source_path),
+            "files": scanned,
+            "covered": len(covered),
+            "total": len(requirements),
+            "requirements": [item.to_dict() for item in requirements],
+        }
+        typer.echo(json.dumps(payload, indent=2))
+        return
+    scenarios = [files for item in requirements for files in item.scenarios.values()]
+    lines = [
+        f"{len(covered)}/{len(requirements)} requirement(s) referenced, "
+        f"{sum(1 for files in scenarios if files)}/{len(scenarios)} scenario(s) tagged "
+        f"({scanned} file(s), {rescanned} rescanned)"
+    ]
+    for item in requirements:
+        if item.covered:
+            continue
+        lines.append(f"uncovered · {item.requirement_id}  {item.capability}/{escape(item.title)}")
+    border = "green" if len(covered) == len(requirements) else "yellow"
+    console.print(Panel("\n".join(lines), title=f"Trace · {project_slug}", border_style=border))
+
+
+@specs_app.command("layout")
+def specs_layout(
+    capabilities: List[str] = typer.Argument(..., help="Capabilities to convert"),
+    to: str = typer.Option(..., "--to", help="Target storage layout: 'directory' (one file per requirement) or 'file'"),
+    project: Optional[str] = typer.Option(None, "--project", "-p", help="Project slug"),
+) -> None:
+    """Switch canonical specs between a single spec.md and one file per requirement."""
+
+    flow_path = locate_flow_dir()
+    require_flow_dir(flow_path)
+    project_slug = resolve_project(flow_path, project)
+    spec_index = load_spec_index(flow_path, project_slug)
+
+    converted: List[str] = []
+    try:
+        for capability in capabilities:
+            path = canonical_spec_path(flow_path, project_slug, capability)
+            if set_canonical_layout(path, capability, to, spec_index):
+                converted.append(capability)
+    except StateError as exc:
+        console.print(Panel(str(exc), border_style="red"))
+        raise typer.Exit(1)
+
+    if not converted:
+        console.print(Panel(f"Already using the {to} layout.", border_style="yellow"))
+        return
+    console.print(Panel(f"Converted to {to} layout: {', '.join(converted)}", border_style="green"))
+
+
+@specs_app.command("show")
+def specs_show(
+    capability: str = typer.Argument(..., help="Capability name"),
+    project: Optional[str] = typer.Option(None, "--project", "-p", help="Project slug"),
+) -> None:
+    """Print a canonical spec, assembling directory-layout specs on demand."""
+
+    flow_path = locate_flow_dir()
+    require_flow_dir(flow_path)
+    project_slug = resolve_project(flow_path, project)
+    try:
+        text = read_canonical_spec(canonical_spec_path(flow_path, project_slug, capability))
+    except StateError as exc:
+        console.print(Panel(str(exc), border_style="red"))
+        raise typer.Exit(1)
+    if text is None:
+        console.print(Panel(f"Capability '{capability}' not found.", border_style="red"))
+        raise typer.Exit(1)
+    typer.echo(text, nl=False)
+
+
+@specs_app.command("history")
+def specs_history(
+    capability: str = typer.Argument(..., help="Capability name"),
+    project: Optional[str] = typer.Option(None, "--project", "-p", help="Project slug"),
+    json_output: bool = typer.Option(False, "--json", help="Emit JSON instead of a table"),
+) -> None:
+    """List the recorded versions of a canonical spec."""
+
+    flow_path = locate_flow_dir()
+    require_flow_dir(flow_path)
+    project_slug = resolve_project(flow_path, project)
+    versions = SpecHistory.load(flow_path, project_slug).versions(capability)
+
+    if json_output:
+        typer.echo(json.dumps(versions, indent=2))
+        return
+    if not versions:
+        console.print(Panel(f"No recorded versions for '{capability}'.", border_style="yellow"))
+        return
+    rows = [
+        f"{number}. {entry['recorded_at']} · {entry['change_id'] or '(baseline)'} · {str(entry['object'])[:12]}"
+        for number, entry in enumerate(versions, start=1)
+    ]
+    console.print(Panel("\n".join(rows), title=f"History: {capability}", border_style="cyan"))
+
+
+@specs_app.command("git-history")
+def specs_git_history(
+    capability: str = typer.Argument(..., help="Capability name"),
+    project: Optional[str] = typer.Option(None, "--project", "-p", help="Project slug"),
+    requirement: Optional[str] = typer.Option(None, "--requirement", "-r", help="Only this requirement (title or ID)"),
+    scenario: Optional[str] = typer.Option(None, "--scenario", "-s", help="Only commits that changed this scenario"),
+    json_output: bool = typer.Option(False, "--json", help="Emit JSON instead of a table"),
+) -> None:
+    """Show how a capability's requirements evolved across git commits."""
+
+    flow_path = locate_flow_dir()
+    require_flow_dir(flow_path)
+    project_slug = resolve_project(flow_path, project)
+    title = None
+    if requirement:
+        meta = load_spec_index(flow_path, project_slug).get(requirement)
+        title = str(meta["title"]) if meta else requirement_title(requirement)
+    try:
+        events = requirement_events(
+            project_dir(flow_path, project_slug) / "specs",
+            GitBlobCache.load(flow_path, project_slug),
+            capability,
+        )
+    except StateError as exc:
+        console.print(Panel(str(exc), border_style="red"))
+        raise typer.Exit(1)
+    events = [
+        event
+        for event in events
+        if (title is None or event.title == title) and (scenario is None or scenario in event.scenarios)
+    ]
+
+    if json_output:
+        typer.echo(json.dumps([event.to_dict() for event in events], indent=2))
+        return
+    if not events:
+        console.print(Panel(f"No committed requirement changes for '{capability}'.", border_style="yellow"))
+        return
+    lines = []
+    for event in events:
+        line = f"{event.committed_at[:10]} {event.commit[:10]} {event.operation:<8} {escape(event.title)}"
+        if event.scenarios:
+            line += " " + escape(f"[{', '.join(event.scenarios)}]")
+        lines.append(f"{line} · {escape(event.subject)}")
+    console.print(Panel("\n".join(lines), title=f"Git history: {capability}", border_style="cyan"))
+
+
+@specs_app.command("diff")
+def specs_diff(
+    capability: str = typer.Argument(..., help="Capability name"),
+    at: str = typer.Option(..., "--at", help="Change ID or ISO date/time of the version to compare"),
+    against: Optional[str] = typer.Option(None, "--against", help="Second change ID or date (default: current spec)"),
+    project: Optional[str] = typer.Option(None, "--project", "-p", help="Project slug"),
+    show: bool = typer.Option(False, "--show", help="Print the version selected by --at instead of a diff"),
+) -> None:
+    """Diff a recorded spec version against the current spec or another version."""
+
+    flow_path = locate_flow_dir()
+    require_flow_dir(flow_path)
+    project_slug = resolve_project(flow_path, project)
+    history = SpecHistory.load(flow_path, project_slug)
+
+    try:
+        old_entry = history.resolve(capability, at)
+        old_text = history.text(old_entry)
+        if show:
+            typer.echo(old_text, nl=False)
+            return
+        if against:
+            new_entry = history.resolve(capability, against)
+            new_text = history.text(new_entry)
+            new_label = f"{capability}@{against}"
+        else:
+            new_text = read_canonical_spec(canonical_spec_path(flow_path, project_slug, capability)) or ""
+            new_label = f"{capability} (current)"
+    except StateError as exc:
+        console.print(Panel(str(exc), border_style="red"))
+        raise typer.Exit(1)
+
+    diff = spec_diff_lines(old_text, new_text, f"{capability}@{at}", new_label)
+    if not diff:
+        console.print(Panel("No differences.", border_style="green"))
+        return
+    typer.echo("\n".join(diff))
+
+
+@specs_app.command("blame")
+def specs_blame(
+    capability: str = typer.Argument(..., help="Capability name"),
+    project: Optional[str] = typer.Option(None, "--project", "-p", help="Project slug"),
+    json_output: bool = typer.Option(False, "--json", help="Emit JSON instead of a table"),
+) -> None:
+    """Show which changes added, modified, or renamed each requirement of a capability."""
+
+    flow_path = locate_flow_dir()
+    require_flow_dir(flow_path)
+    project_slug = resolve_project(flow_path, project)
+    try:
+        text = read_canonical_spec(canonical_spec_path(flow_path, project_slug, capability))
+    except StateError as exc:
+        console.print(Panel(str(exc), border_style="red"))
+        raise typer.Exit(1)
+    if text is None:
+        console.print(Panel(f"Capability '{capability}' not found.", border_style="red"))
+        raise typer.Exit(1)
+
+    spec_index = load_spec_index(flow_path, project_slug)
+    lineage = RequirementHistory.load(flow_path, project_slug)
+    rows: List[Dict[str, object]] = []
+    for title in SpecDocument.parse(text).titles():
+        requirement_id = spec_index.find(capability, title)
+        rows.append(
+            {
+                "title": title,
+                "requirement_id": requirement_id,
+                "lineage": lineage.lineage(requirement_id) if requirement_id else [],
+            }
+        )
+
+    if json_output:
+        typer.echo(json.dumps(rows, indent=2))
+        return
+    if not rows:
+        console.print(Panel(f"'{capability}' has no requirements.", border_style="yellow"))
+        return
+    lines: List[str] = []
+    for row in rows:
+        lines.append(f"[bold]{escape(str(row['title']))}[/bold] · {row['requirement_id'] or '(not indexed)'}")
+        events = row["lineage"] or [{"operation": "-", "change_id": "no recorded changes", "recorded_at": ""}]
+        for event in events:  # type: ignore[union-attr]
+            lines.append(f"  {event['recorded_at'][:10]:<10} {event['operation']:<8} {event['change_id']}")
+    console.print(Panel("\n".join(lines), title=f"Blame: {capability}", border_style="cyan"))
+
+
+@specs_app.command("get")
+def specs_get(
+    requirement_id: Optional[str] = typer.Argument(None, help="Requirement ID from the spec index"),
+    capability: Optional[str] = typer.Option(None, "--capability", "-c", help="Capability (with --title) instead of an ID"),
+    title: Optional[str] = typer.Option(None, "--title", "-t", help="Requirement title (with --capability)"),
+    project: Optional[str] = typer.Option(None, "--project", "-p", help="Project slug"),
+    json_output: bool = typer.Option(False, "--json", help="Emit JSON instead of Markdown"),
+) -> None:
+    """Print a single canonical requirement without loading the whole spec."""
+
+    flow_path = locate_flow_dir()
+    require_flow_dir(flow_path)
+    project_slug = resolve_project(flow_path, project)
+    spec_index = load_spec_index(flow_path, project_slug)
+
+    if requirement_id is None:
+        if not capability or not title:
+            console.print(Panel("Pass a requirement ID, or both --capability and --title.", border_style="red"))
+            raise typer.Exit(1)
+        requirement_id = spec_index.find(capability, requirement_title(title))
+        if requirement_id is None:
+            console.print(Panel(f"No requirement '{title}' indexed for '{capability}'.", border_style="red"))
+            raise typer.Exit(1)
+
+    try:
+        text = read_indexed_requirement(flow_path, project_slug, spec_index, requirement_id)
+    except StateError as exc:
+        console.print(Panel(str(exc), border_style="red"))
+        raise typer.Exit(1)
+
+    if json_output:
+        meta = spec_index[requirement_id]
+        payload = {
+            "requirement_id": requirement_id,
+            "capability": meta.get("capability"),
+            "title": meta.get("title"),
+            "text": text,
+        }
+        typer.echo(json.dumps(payload, indent=2))
+        return
+    typer.echo(text.rstrip("\n"))
+
+
+@specs_app.command("refactor")
+def specs_refactor(
+    map_path: Path = typer.Option(..., "--map", help="TOML file with [rename], [[merge]] and [[split]] entries"),
+    project: Optional[str] = typer.Option(None, "--project", "-p", help="Project slug"),
+    include_changes: bool = typer.Option(True, "--include-changes/--no-include-changes", help="Move capability folders inside active change workspaces"),
+    dry_run: bool = typer.Option(False, "--dry-run", help="Check the map and show the plan without applying it"),
+) -> None:
+    """Apply many capability renames, merges and splits in one pass."""
+
+    flow_path = locate_flow_dir()
+    require_flow_dir(flow_path)
+    project_slug = resolve_project(flow_path, project)
+
+    try:
+        refactor = load_refactor_map(map_path)
+        if not len(refactor):
+            console.print(Panel("Refactor map is empty.", border_style="yellow"))
+            return
+        plan = plan_refactor(flow_path, project_slug, refactor, include_changes=include_changes)
+        if not dry_run:
+            apply_refactor(flow_path, project_slug, plan, change_id=f"refactor:{map_path.stem}")
+    except (RefactorError, StateError) as exc:
+        console.print(Panel(str(exc), title="Refactor aborted", border_style="red"))
+        raise typer.Exit(1)
+
+    lines = list(plan.summary)
+    lines.append(f"index entries updated={plan.index_updates} · change folders moved={len(plan.change_moves)}")
+    title = "Refactor plan (dry run)" if dry_run else "Refactor applied"
+    console.print(Panel("\n".join(lines), title=title, border_style="cyan" if dry_run else "green"))
+
+
+@specs_app.command("reindex")
+def specs_reindex(
+    project: Optional[str] = typer.Option(None, "--project", "-p", help="Project slug"),
+    check: bool = typer.Option(False, "--check", help="Report drift from the rebuilt index without writing it"),
+    jobs: int = typer.Option(1, "--jobs", "-j", min=0, help="Parallel workers for parsing canonical specs (0 = one per CPU)"),
+) -> None:
+    """Rebuild spec_index.json from canonical specs and past merges."""
+
+    flow_path = locate_flow_dir()
+    require_flow_dir(flow_path)
+    project_slug = resolve_project(flow_path, project)
+
+    try:
+        current = load_spec_index(flow_path, project_slug)
+    except StateError as exc:
+        current = SpecIndex()
+        console.print(Panel(f"Existing index unreadable ({exc}); rebuilding from scratch.", border_style="yellow"))
+    try:
+        rebuilt = _rebuild_spec_index(flow_path, project_slug, current, jobs=jobs)
+    except StateError as exc:
+        console.print(Panel(str(exc), border_style="red"))
+        raise typer.Exit(1)
+
+    drift = _index_drift(current, rebuilt)
+    if check:
+        if drift:
+            console.print(Panel("\n".join(drift), title="Spec index drift", border_style="red"))
+            raise typer.Exit(1)
+        console.print(Panel(f"Spec index matches canonical specs ({len(rebuilt)} requirements).", border_style="green"))
+        return
+
+    save_spec_index(flow_path, project_slug, rebuilt)
+    for capability in canonical_capabilities(flow_path, project_slug):
+        record_requirement_spans(
+            flow_path, project_slug, capability, canonical_spec_path(flow_path, project_slug, capability)
+        )
+    update_reference_graph(flow_path, project_slug)
+    message = f"Rebuilt spec index: {len(rebuilt)} requirement(s)"
+    if drift:
+        message += f", {len(drift)} correction(s)"
+    console.print(Panel(message, border_style="green"))
+
+
 @specs_app.command("rename-capability")
 def specs_rename_capability(
     old: str = typer.Argument(..., help="Existing capability name"),
@@ -214,111 +998,333 @@ def specs_rename_capability(
         console.print(Panel("Old and new capability names match.", border_style="yellow"))
         raise typer.Exit(1)
 
-    flow_path = locate_flow_dir()
-    require_flow_dir(flow_path)
-    project_slug = resolve_project(flow_path, project)
+    flow_path = locate_flow_dir()
+    require_flow_dir(flow_path)
+    project_slug = resolve_project(flow_path, project)
+
+    canonical_old = canonical_spec_path(flow_path, project_slug, old).parent
+    canonical_new = canonical_spec_path(flow_path, project_slug, new).parent
+    if not canonical_old.exists():
+        console.print(Panel(f"Capability '{old}' not found.", border_style="red"))
+        raise typer.Exit(1)
+    if canonical_new.exists():
+        console.print(
+            Panel(
+                f"Capability '{new}' already exists. Merge specs manually, then remove the old folder.",
+                border_style="red",
+            )
+        )
+        raise typer.Exit(1)
+
+    canonical_new.parent.mkdir(parents=True, exist_ok=True)
+    canonical_old.rename(canonical_new)
+
+    spec_index = load_spec_index(flow_path, project_slug)
+    if spec_index.rename_capability(old, new):
+        save_spec_index(flow_path, project_slug, spec_index)
+
+    warnings: List[str] = []
+    if include_changes:
+        for change in list_changes(flow_path, project_slug):
+            change_specs = change_dir(flow_path, project_slug, change) / "specs"
+            source = change_specs / old
+            if not source.exists():
+                continue
+            target = change_specs / new
+            if target.exists():
+                warnings.append(f"{change}: target '{new}' already exists; skipped")
+                continue
+            target.parent.mkdir(parents=True, exist_ok=True)
+            source.rename(target)
+
+    message = f"Renamed capability '{old}' → '{new}'"
+    if warnings:
+        message += f" with {len(warnings)} warning(s)"
+    console.print(Panel(message, border_style="green"))
+    if warnings:
+        console.print(Panel("\n".join(warnings), border_style="yellow"))
+
+
+def _lookup_delta(
+    cache: DeltaCache, capability: str, path: Path
+) -> Tuple[Optional[DeltaParseResult], List[str]]:
+    """Return the cached parse of a delta spec plus capability-prefixed errors."""
+
+    try:
+        parsed, errors = cache.lookup(path)
+    except (StateError, OSError, UnicodeDecodeError, json.JSONDecodeError) as exc:
+        return None, [f"{capability}: {exc}"]
+    return parsed, [f"{capability}: {err}" for err in errors]
+
+
+def _capability_inputs(delta_path: Path, canonical_path: Path) -> Dict[str, Optional[str]]:
+    """Content hashes of everything a capability preview is computed from."""
+
+    return {
+        "delta_sha256": file_sha256(delta_path),
+        "canonical_sha256": canonical_spec_sha256(canonical_path),
+    }
+
+
+def _load_json_object(path: Path) -> Optional[Dict]:
+    if not path.exists():
+        return None
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except json.JSONDecodeError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def _reusable_manifest_entries(
+    flow_path: Path,
+    project_slug: str,
+    change_id: str,
+    *,
+    write_diffs: bool,
+) -> Dict[str, Dict]:
+    """Return previous manifest entries whose delta and canonical inputs are unchanged."""
+
+    previous = _load_json_object(spec_manifest_path(flow_path, project_slug, change_id))
+    if not previous:
+        return {}
+    change_path = change_dir(flow_path, project_slug, change_id)
+    entries = {entry.get("capability"): entry for entry in previous.get("capabilities", [])}
+    planned = _planned_capabilities(flow_path, project_slug, change_id)
+    reused: Dict[str, Dict] = {}
+    for capability, path in change_delta_specs(flow_path, project_slug, change_id):
+        entry = entries.get(capability)
+        plan_entry = planned.get(capability)
+        if not entry or not entry.get("inputs") or not plan_entry:
+            continue
+        canonical = canonical_spec_path(flow_path, project_slug, capability)
+        if entry["inputs"] != _capability_inputs(path, canonical) or plan_entry.get("inputs") != entry["inputs"]:
+            continue
+        preview = change_path / plan_entry["preview_path"]
+        if not preview.exists() or file_sha256(preview) != plan_entry.get("preview_sha256"):
+            continue
+        diff_rel = entry.get("diff_path")
+        if write_diffs and entry.get("preview_changed"):
+            if not diff_rel or not (change_path / diff_rel).exists():
+                continue
+            if entry.get("diff_sha256") and file_sha256(change_path / diff_rel) != entry["diff_sha256"]:
+                continue
+        reused[capability] = entry
+    return reused
+
+
+def _resolve_jobs(jobs: int) -> int:
+    return jobs if jobs > 0 else (os.cpu_count() or 1)
+
+
+def _map_jobs(func: Callable[[T], R], items: Sequence[T], jobs: int, *, threads: bool = False) -> List[R]:
+    """Map ``func`` over ``items`` in a worker pool, returning results in input order."""
+
+    workers = min(_resolve_jobs(jobs), len(items))
+    if workers <= 1:
+        return [func(item) for item in items]
+    executor = ThreadPoolExecutor if threads else ProcessPoolExecutor
+    with executor(max_workers=workers) as pool:
+        return list(pool.map(func, items))
+
+
+def _stage_job(
+    job: Tuple[str, Optional[str], Optional[str], str, DeltaParseResult]
+) -> Tuple[bool, bool, Optional[str]]:
+    """Apply one capability's deltas and write the result to its staging file.
+
+    When ``base_copy`` is given the text the deltas were applied to is staged
+    too. Returns ``(would_create, changed, error)``; texts never leave the worker.
+    """
+
+    capability, source, base_copy, staged, parsed = job
+    try:
+        if source and Path(source).exists() and not uses_directory_layout(Path(source)):
+            # Single-file specs are streamed so only one block is in memory.
+            if base_copy:
+                shutil.copyfile(source, base_copy)
+            apply_deltas_to_file(Path(source), Path(staged), parsed)
+            return False, not filecmp.cmp(source, staged, shallow=False), None
+        current = read_canonical_spec(Path(source)) if source else None
+        would_create = current is None
+        if current is None:
+            current = default_spec_content(capability)
+        elif base_copy:
+            Path(base_copy).write_text(current, encoding="utf-8")
+        updated = apply_deltas_to_spec(current, parsed)
+    except StateError as exc:
+        return False, False, str(exc)
+    Path(staged).write_text(updated, encoding="utf-8")
+    return would_create, updated != current, None
+
+
+def _diff_job(ctx: CapabilityContext) -> Optional[Tuple[str, str]]:
+    """Write one capability's ``merge.diff`` next to its delta; return its path and sha256.
+
+    Returns ``None`` (removing any stale file) when nothing changed. The diff
+    text never leaves the worker, so only one per job is in memory.
+    """
+
+    diff_file = ctx.delta_path.parent / "merge.diff"
+    diff_text = _render_diff_text(ctx.name, ctx.current_text, ctx.updated_text)
+    if not diff_text:
+        diff_file.unlink(missing_ok=True)
+        return None
+    diff_file.write_text(diff_text, encoding="utf-8")
+    return str(diff_file), hashlib.sha256(diff_text.encode("utf-8")).hexdigest()
 
-    canonical_old = canonical_spec_path(flow_path, project_slug, old).parent
-    canonical_new = canonical_spec_path(flow_path, project_slug, new).parent
-    if not canonical_old.exists():
-        console.print(Panel(f"Capability '{old}' not found.", border_style="red"))
-        raise typer.Exit(1)
-    if canonical_new.exists():
-        console.print(
-            Panel(
-                f"Capability '{new}' already exists. Merge specs manually, then remove the old folder.",
-                border_style="red",
-            )
-        )
-        raise typer.Exit(1)
 
-    canonical_new.parent.mkdir(parents=True, exist_ok=True)
-    canonical_old.rename(canonical_new)
+def _staging_dir(flow_path: Path, project_slug: str, name: str) -> Path:
+    """Empty scratch folder for staged merge results; remove it with :func:`_discard_staging`."""
 
-    spec_index = load_spec_index(flow_path, project_slug)
-    updated = False
-    for meta in spec_index.values():
-        if meta.get("capability") == old:
-            meta["capability"] = new
-            updated = True
-    if updated:
-        save_spec_index(flow_path, project_slug, spec_index)
+    path = project_state_dir(flow_path, project_slug) / STAGING_DIRNAME / name
+    shutil.rmtree(path, ignore_errors=True)
+    path.mkdir(parents=True)
+    return path
 
-    warnings: List[str] = []
-    if include_changes:
-        for change in list_changes(flow_path, project_slug):
-            change_specs = change_dir(flow_path, project_slug, change) / "specs"
-            source = change_specs / old
-            if not source.exists():
-                continue
-            target = change_specs / new
-            if target.exists():
-                warnings.append(f"{change}: target '{new}' already exists; skipped")
-                continue
-            target.parent.mkdir(parents=True, exist_ok=True)
-            source.rename(target)
 
-    message = f"Renamed capability '{old}' → '{new}'"
-    if warnings:
-        message += f" with {len(warnings)} warning(s)"
-    console.print(Panel(message, border_style="green"))
-    if warnings:
-        console.print(Panel("\n".join(warnings), border_style="yellow"))
+def _staging_stem(capability: str) -> str:
+    # Nested capabilities ("billing/invoices") stay flat inside the staging folder.
+    return capability.replace("/", "--")
+
+
+def _discard_staging(flow_path: Path, project_slug: str, name: str) -> None:
+    root = project_state_dir(flow_path, project_slug) / STAGING_DIRNAME
+    shutil.rmtree(root / name, ignore_errors=True)
+    try:
+        root.rmdir()
+    except OSError:
+        pass
 
 
-def _gather_capability_contexts(flow_path: Path, project_slug: str, change_id: str) -> List[CapabilityContext]:
+def _gather_capability_contexts(
+    flow_path: Path,
+    project_slug: str,
+    change_id: str,
+    *,
+    skip: Optional[set[str]] = None,
+    jobs: int = 1,
+) -> List[CapabilityContext]:
     deltas = change_delta_specs(flow_path, project_slug, change_id)
     if not deltas:
         raise SpecCommandError("No delta specs to process.")
 
-    contexts: List[CapabilityContext] = []
+    # Validate every delta before staging anything, then stage one capability
+    # at a time; nothing outside the staging folder is written until all succeed.
+    cache = DeltaCache.load(flow_path, project_slug)
+    parsed_deltas: List[Tuple[str, Path, DeltaParseResult]] = []
     errors: List[str] = []
     for capability, path in deltas:
-        text = path.read_text(encoding="utf-8")
-        try:
-            parsed = parse_delta_markdown(text)
-        except Exception as exc:  # pragma: no cover - parser already covered in tests
-            errors.append(f"{capability}: {exc}")
+        if skip and capability in skip:
             continue
-        validation_errors = validate_delta_result(parsed)
-        if validation_errors:
-            errors.extend(f"{capability}: {err}" for err in validation_errors)
+        parsed, validation_errors = _lookup_delta(cache, capability, path)
+        if parsed is None or validation_errors:
+            errors.extend(validation_errors)
             continue
+        parsed_deltas.append((capability, path, parsed))
 
+    cache.save()
+    if errors:
+        raise SpecCommandError("\n".join(errors))
+
+    staging = _staging_dir(flow_path, project_slug, change_id)
+    contexts: List[CapabilityContext] = []
+    for capability, path, parsed in parsed_deltas:
         target = canonical_spec_path(flow_path, project_slug, capability)
-        if target.exists():
-            current = target.read_text(encoding="utf-8")
-            would_create = False
-        else:
-            current = default_spec_content(capability)
-            would_create = True
-        updated = apply_deltas_to_spec(current, parsed)
         contexts.append(
             CapabilityContext(
                 name=capability,
                 delta_path=path,
                 canonical_path=target,
                 parsed=parsed,
-                current_text=current,
-                updated_text=updated,
-                would_create=would_create,
+                base_path=staging / f"{_staging_stem(capability)}.base.md",
+                staged_path=staging / f"{_staging_stem(capability)}.md",
+                changed=False,
+                would_create=False,
+                # Hashed before the spec is read, so a concurrent write is never missed.
+                inputs=_capability_inputs(path, target),
             )
         )
 
+    staged = _map_jobs(
+        _stage_job,
+        [
+            (ctx.name, str(ctx.canonical_path), str(ctx.base_path), str(ctx.staged_path), ctx.parsed)
+            for ctx in contexts
+        ],
+        jobs,
+    )
+    for ctx, (would_create, changed, error) in zip(contexts, staged):
+        if error:
+            errors.append(f"{ctx.name}: {error}")
+            continue
+        ctx.would_create = would_create
+        ctx.changed = changed
+        if would_create:
+            ctx.base_path = None
     if errors:
+        _discard_staging(flow_path, project_slug, change_id)
         raise SpecCommandError("\n".join(errors))
     return contexts
 
 
+def _duplicate_warnings(
+    flow_path: Path,
+    project_slug: str,
+    contexts: Sequence[CapabilityContext],
+) -> List[str]:
+    """Warn about ADDED requirements that match canonical ones exactly or closely."""
+
+    added = [
+        (ctx.name, delta)
+        for ctx in contexts
+        for delta in ctx.parsed.requirements.get("ADDED", [])
+    ]
+    if not added:
+        return []
+    lsh = load_lsh_index(flow_path, project_slug)
+    warnings: List[str] = []
+    for capability, delta in added:
+        fingerprint = Fingerprint.from_body(capability, delta.title, delta.body)
+        for match, score in lsh.matches(fingerprint)[:3]:
+            kind = "duplicates" if score == 1.0 and match.digest == fingerprint.digest else f"{score:.0%} similar to"
+            warnings.append(
+                f"{capability}: ADDED '{escape(delta.title)}' {kind} {match.capability}/'{escape(match.title)}'"
+            )
+    return warnings
+
+
+def _similar_requirement_lines(
+    flow_path: Path,
+    project_slug: str,
+    contexts: Sequence[CapabilityContext],
+    top: int,
+) -> List[str]:
+    """Nearest canonical requirements for each ADDED requirement, by TF-IDF cosine."""
+
+    added = [
+        (ctx.name, delta)
+        for ctx in contexts
+        for delta in ctx.parsed.requirements.get("ADDED", [])
+    ]
+    if not added:
+        return []
+    index = load_similarity_index(flow_path, project_slug)
+    lines: List[str] = []
+    for capability, delta in added:
+        matches = index.query(requirement_terms(delta.title, delta.body), top=top)
+        if matches:
+            nearest = ", ".join(f"{match.capability}/'{escape(match.title)}' {match.score:.2f}" for match in matches)
+            lines.append(f"{capability}: '{escape(delta.title)}' → {nearest}")
+    return lines
+
+
 def _render_diff_text(capability: str, current: str, updated: str) -> str:
-    lines = list(
-        unified_diff(
-            current.splitlines(),
-            updated.splitlines(),
-            fromfile=f"canonical/{capability}",
-            tofile=f"preview/{capability}",
-            lineterm="",
-        )
+    lines = spec_diff_lines(
+        current,
+        updated,
+        fromfile=f"canonical/{capability}",
+        tofile=f"preview/{capability}",
     )
     if not lines:
         return ""
@@ -338,23 +1344,21 @@ def _find_requirement_identifier(delta: RequirementDelta) -> Optional[str]:
 def _resolve_requirement_id(
     delta: RequirementDelta,
     capability: str,
-    spec_index: Dict[str, Dict[str, str]],
+    spec_index: SpecIndex,
     seen: set[str],
+    aliases: Optional[Dict[str, str]] = None,
 ) -> str:
     explicit = _find_requirement_identifier(delta)
     candidate = slugify_identifier(explicit) if explicit else None
-    existing_ids = set(spec_index.keys())
 
     if not candidate and delta.operation in {"MODIFIED", "REMOVED"}:
-        for requirement_id, meta in spec_index.items():
-            if meta.get("capability") == capability and meta.get("title") == delta.title:
-                candidate = requirement_id
-                break
+        lookup_title = (aliases or {}).get(delta.title, delta.title)
+        candidate = spec_index.find(capability, lookup_title)
 
     if not candidate:
         candidate = f"{slugify_identifier(capability)}.{slugify_identifier(delta.title)}"
 
-    if delta.operation in {"MODIFIED", "REMOVED"} and candidate in existing_ids:
+    if delta.operation in {"MODIFIED", "REMOVED"} and candidate in spec_index:
         return candidate
 
     if candidate not in seen:
@@ -375,13 +1379,20 @@ def _build_manifest(
     project_slug: str,
     change_id: str,
     contexts: List[CapabilityContext],
-    spec_index: Dict[str, Dict[str, str]],
+    spec_index: SpecIndex,
     *,
     write_diffs: bool,
+    reused: Optional[Dict[str, Dict]] = None,
+    jobs: int = 1,
 ) -> Dict:
     change_path = change_dir(flow_path, project_slug, change_id)
     project_path = project_dir(flow_path, project_slug)
+    if not isinstance(spec_index, SpecIndex):
+        spec_index = SpecIndex(spec_index)
     seen_ids: set[str] = set(spec_index.keys())
+    reused = reused or {}
+    for entry in reused.values():
+        seen_ids.update(requirement["requirement_id"] for requirement in entry.get("requirements", []))
 
     manifest = {
         "version": 1,
@@ -391,19 +1402,12 @@ def _build_manifest(
         "capabilities": [],
     }
 
-    requirement_total = 0
-    diff_count = 0
-    for ctx in contexts:
-        diff_rel: Optional[str] = None
-        if write_diffs:
-            diff_text = _render_diff_text(ctx.name, ctx.current_text, ctx.updated_text)
-            diff_file = ctx.delta_path.parent / "merge.diff"
-            if diff_text:
-                diff_file.write_text(diff_text, encoding="utf-8")
-                diff_rel = str(diff_file.relative_to(change_path))
-                diff_count += 1
-            elif diff_file.exists():
-                diff_file.unlink()
+    entries: Dict[str, Dict] = dict(reused)
+    diff_files: List[Optional[Tuple[str, str]]] = [None] * len(contexts)
+    if write_diffs:
+        diff_files = _map_jobs(_diff_job, contexts, jobs)
+    for ctx, diff_file in zip(contexts, diff_files):
+        diff_rel = str(Path(diff_file[0]).relative_to(change_path)) if diff_file else None
 
         delta_rel = str(ctx.delta_path.relative_to(change_path))
         canonical_rel = str(ctx.canonical_path.relative_to(project_path))
@@ -412,8 +1416,10 @@ def _build_manifest(
             "delta_path": delta_rel,
             "canonical_path": canonical_rel,
             "diff_path": diff_rel,
+            "diff_sha256": diff_file[1] if diff_file else None,
             "would_create": ctx.would_create,
-            "preview_changed": ctx.updated_text != ctx.current_text,
+            "preview_changed": ctx.changed,
+            "inputs": ctx.inputs or _capability_inputs(ctx.delta_path, ctx.canonical_path),
             "requirements": [],
             "renames": [
                 {"from": rename.old, "to": rename.new}
@@ -421,9 +1427,15 @@ def _build_manifest(
             ],
         }
 
+        aliases = {
+            requirement_title(rename.new): requirement_title(rename.old)
+            for rename in ctx.parsed.renames
+        }
         for op, deltas in ctx.parsed.requirements.items():
             for delta in deltas:
-                requirement_id = _resolve_requirement_id(delta, ctx.name, spec_index, seen_ids)
+                requirement_id = _resolve_requirement_id(
+                    delta, ctx.name, spec_index, seen_ids, aliases
+                )
                 entry["requirements"].append(
                     {
                         "operation": op,
@@ -432,13 +1444,18 @@ def _build_manifest(
                         "has_scenario": "#### Scenario:" in delta.body,
                     }
                 )
-        requirement_total += len(entry["requirements"])
-        manifest["capabilities"].append(entry)
+        entries[ctx.name] = entry
 
+    if reused:
+        order = [capability for capability, _ in change_delta_specs(flow_path, project_slug, change_id)]
+        manifest["capabilities"] = [entries[name] for name in order if name in entries]
+    else:
+        manifest["capabilities"] = list(entries.values())
     manifest["stats"] = {
-        "capabilities": len(contexts),
-        "requirements": requirement_total,
-        "diffs": diff_count,
+        "capabilities": len(manifest["capabilities"]),
+        "requirements": sum(len(entry["requirements"]) for entry in manifest["capabilities"]),
+        "diffs": sum(1 for entry in manifest["capabilities"] if entry.get("diff_path")),
+        "recomputed": len(contexts),
     }
     return manifest
 
@@ -448,14 +1465,136 @@ def _write_manifest(path: Path, manifest: Dict) -> None:
     path.write_text(json.dumps(manifest, indent=2, sort_keys=True) + "\n", encoding="utf-8")
 
 
+def _planned_capabilities(flow_path: Path, project_slug: str, change_id: str) -> Dict[str, Dict]:
+    plan = _load_json_object(spec_plan_path(flow_path, project_slug, change_id)) or {}
+    return {item.get("capability"): item for item in plan.get("capabilities", [])}
+
+
+def _write_plan(
+    flow_path: Path,
+    project_slug: str,
+    change_id: str,
+    contexts: List[CapabilityContext],
+    manifest: Dict,
+) -> Path:
+    """Persist merge previews plus the hashes they were computed from.
+
+    Capabilities reused from an earlier prepare keep their previous plan entry,
+    whose preview file is still valid because its inputs are unchanged.
+    """
+
+    change_path = change_dir(flow_path, project_slug, change_id)
+    previous = _planned_capabilities(flow_path, project_slug, change_id)
+    recomputed = {ctx.name: ctx for ctx in contexts}
+    entries: List[Dict] = []
+    for entry in manifest.get("capabilities", []):
+        ctx = recomputed.get(entry["capability"])
+        if ctx is None:
+            entries.append(previous[entry["capability"]])
+            continue
+        preview = ctx.delta_path.parent / PREVIEW_FILENAME
+        shutil.copyfile(ctx.staged_path, preview)
+        entries.append(
+            {
+                "capability": ctx.name,
+                "delta_path": entry["delta_path"],
+                "canonical_path": entry["canonical_path"],
+                "preview_path": str(preview.relative_to(change_path)),
+                "preview_sha256": file_sha256(preview),
+                "inputs": entry["inputs"],
+            }
+        )
+
+    plan = {
+        "version": 1,
+        "project": project_slug,
+        "change_id": change_id,
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "capabilities": entries,
+    }
+    path = spec_plan_path(flow_path, project_slug, change_id)
+    _write_manifest(path, plan)
+    return path
+
+
+def _load_plan_targets(
+    flow_path: Path,
+    project_slug: str,
+    change_id: str,
+) -> Tuple[Dict, List[MergeTarget]]:
+    """Load the saved plan and check every precondition before anything is written."""
+
+    plan = _load_json_object(spec_plan_path(flow_path, project_slug, change_id))
+    manifest = _load_json_object(spec_manifest_path(flow_path, project_slug, change_id))
+    if not plan or not manifest:
+        raise SpecCommandError(f"No saved plan. Run 'flowm specs prepare {change_id}' first.")
+
+    change_path = change_dir(flow_path, project_slug, change_id)
+    project_path = project_dir(flow_path, project_slug)
+    entries = {entry.get("capability"): entry for entry in manifest.get("capabilities", [])}
+    planned = {item.get("capability") for item in plan.get("capabilities", [])}
+    errors: List[str] = []
+    for capability, _ in change_delta_specs(flow_path, project_slug, change_id):
+        if capability not in planned:
+            errors.append(f"{capability}: delta spec added after prepare")
+
+    targets: List[MergeTarget] = []
+    for item in plan.get("capabilities", []):
+        name = item["capability"]
+        delta_path = change_path / item["delta_path"]
+        canonical = project_path / item["canonical_path"]
+        preview = change_path / item["preview_path"]
+        entry = entries.get(name)
+        if not entry or entry.get("inputs") != item.get("inputs"):
+            errors.append(f"{name}: manifest no longer matches the saved plan")
+            continue
+        if not delta_path.exists():
+            errors.append(f"{name}: delta spec removed after prepare")
+            continue
+        current = _capability_inputs(delta_path, canonical)
+        if current["delta_sha256"] != item["inputs"]["delta_sha256"]:
+            errors.append(f"{name}: delta spec changed after prepare")
+        if current["canonical_sha256"] != item["inputs"]["canonical_sha256"]:
+            errors.append(f"{name}: canonical spec changed after prepare")
+        if not preview.exists() or file_sha256(preview) != item.get("preview_sha256"):
+            errors.append(f"{name}: merge preview missing or edited")
+        targets.append(
+            MergeTarget(
+                name=name,
+                delta_path=delta_path,
+                canonical_path=canonical,
+                changed=bool(entry.get("preview_changed")),
+                would_create=bool(entry.get("would_create")),
+                preview_path=preview,
+                base_sha256=item["inputs"].get("canonical_sha256"),
+            )
+        )
+
+    if errors:
+        errors.append(f"Re-run 'flowm specs prepare {change_id}' to refresh the plan.")
+        raise SpecCommandError("\n".join(errors))
+    return manifest, targets
+
+
 def _apply_spec_index_updates(
-    spec_index: Dict[str, Dict[str, str]],
+    spec_index: SpecIndex,
     entry: Dict,
     change_id: str,
     timestamp: str,
+    lineage: Optional[RequirementHistory] = None,
 ) -> None:
+    capability = entry["capability"]
+    for rename in entry.get("renames", []):
+        new_title = requirement_title(rename["to"])
+        renamed = spec_index.retitle(capability, requirement_title(rename["from"]), new_title)
+        if renamed and lineage is not None:
+            lineage.record(renamed, "RENAMED", new_title, capability, change_id, timestamp)
     for requirement in entry.get("requirements", []):
         requirement_id = requirement["requirement_id"]
+        if lineage is not None:
+            lineage.record(
+                requirement_id, requirement["operation"], requirement["title"], capability, change_id, timestamp
+            )
         if requirement["operation"] == "REMOVED":
             spec_index.pop(requirement_id, None)
         else:
@@ -467,44 +1606,685 @@ def _apply_spec_index_updates(
             }
 
 
+def _scan_canonical_job(job: Tuple[str, str]) -> List[Tuple[str, Optional[str]]]:
+    capability, path = job
+    text = read_canonical_spec(Path(path)) or ""
+    document = SpecDocument.parse(text)
+    blocks: List[Tuple[str, Optional[str]]] = []
+    for title, start, end in document.requirement_spans():
+        explicit = _find_requirement_identifier(
+            RequirementDelta("", title, "\n".join(text.splitlines()[start + 1 : end]))
+        )
+        blocks.append((title, slugify_identifier(explicit) if explicit else None))
+    return blocks
+
+
+def _merged_assignments(flow_path: Path, project_slug: str) -> Dict[Tuple[str, str], Dict[str, str]]:
+    """Replay merged manifests (oldest first) into ``(capability, title) -> id`` assignments."""
+
+    changes_root = project_dir(flow_path, project_slug) / "changes"
+    folders = [changes_root / change for change in list_changes(flow_path, project_slug)]
+    archive = changes_root / "archive"
+    if archive.exists():
+        folders.extend(path for path in archive.iterdir() if path.is_dir())
+
+    merged: List[Tuple[str, str, Dict]] = []
+    for folder in folders:
+        report = _load_json_object(folder / SPEC_MERGE_REPORT_FILENAME)
+        manifest = _load_json_object(folder / SPEC_MANIFEST_FILENAME)
+        if not report or report.get("dry_run") or report.get("unmerged_at") or not manifest:
+            continue
+        merged.append((str(report.get("generated_at") or ""), str(report.get("change_id") or folder.name), manifest))
+
+    assignments: Dict[Tuple[str, str], Dict[str, str]] = {}
+    for merged_at, change_id, manifest in sorted(merged, key=lambda item: item[0]):
+        for entry in manifest.get("capabilities", []):
+            capability = entry.get("capability")
+            for rename in entry.get("renames", []):
+                moved = assignments.pop((capability, requirement_title(rename["from"])), None)
+                if moved is not None:
+                    assignments[(capability, requirement_title(rename["to"]))] = moved
+            for requirement in entry.get("requirements", []):
+                key = (capability, requirement["title"])
+                if requirement["operation"] == "REMOVED":
+                    assignments.pop(key, None)
+                else:
+                    assignments[key] = {
+                        "requirement_id": requirement["requirement_id"],
+                        "change_id": change_id,
+                        "updated_at": merged_at,
+                    }
+    return assignments
+
+
+def _rebuild_spec_index(
+    flow_path: Path,
+    project_slug: str,
+    current: SpecIndex,
+    *,
+    jobs: int = 1,
+) -> SpecIndex:
+    """Recover requirement IDs from ``Requirement-ID:`` lines, past merges, then the current index."""
+
+    capabilities = canonical_capabilities(flow_path, project_slug)
+    paths = [canonical_spec_path(flow_path, project_slug, capability) for capability in capabilities]
+    scanned = _map_jobs(_scan_canonical_job, [(cap, str(path)) for cap, path in zip(capabilities, paths)], jobs)
+    assignments = _merged_assignments(flow_path, project_slug)
+
+    rebuilt = SpecIndex()
+    for capability, blocks in zip(capabilities, scanned):
+        for title, explicit in blocks:
+            assigned = assignments.get((capability, title), {})
+            known = current.find(capability, title)
+            requirement_id = explicit or assigned.get("requirement_id") or known
+            if not requirement_id:
+                requirement_id = f"{slugify_identifier(capability)}.{slugify_identifier(title)}"
+            base, suffix = requirement_id, 2
+            while requirement_id in rebuilt:
+                requirement_id = f"{base}-{suffix}"
+                suffix += 1
+            previous = current.get(requirement_id) or current.get(known or "") or {}
+            rebuilt[requirement_id] = {
+                "capability": capability,
+                "title": title,
+                "change_id": assigned.get("change_id") or previous.get("change_id"),
+                "updated_at": assigned.get("updated_at") or previous.get("updated_at"),
+            }
+    return rebuilt
+
+
+def _index_drift(current: SpecIndex, rebuilt: SpecIndex) -> List[str]:
+    drift: List[str] = []
+    for requirement_id in sorted(set(current) | set(rebuilt)):
+        old, new = current.get(requirement_id), rebuilt.get(requirement_id)
+        if old is None:
+            drift.append(f"missing: {requirement_id} ({new['capability']} / {new['title']})")
+        elif new is None:
+            drift.append(f"stale: {requirement_id} ({old.get('capability')} / {old.get('title')}) not in canonical specs")
+        elif (old.get("capability"), old.get("title")) != (new["capability"], new["title"]):
+            drift.append(
+                f"moved: {requirement_id} {old.get('capability')} / {old.get('title')} → {new['capability']} / {new['title']}"
+            )
+    return drift
+
+
+def _index_snapshot(spec_index: SpecIndex, entry: Dict) -> Dict[str, Optional[Dict]]:
+    """Index entries a manifest entry is about to change, as they are now (``None`` if absent)."""
+
+    capability = entry["capability"]
+    ids = [requirement["requirement_id"] for requirement in entry.get("requirements", [])]
+    for rename in entry.get("renames", []):
+        renamed = spec_index.find(capability, requirement_title(rename["from"]))
+        if renamed:
+            ids.append(renamed)
+    return {requirement_id: dict(spec_index[requirement_id]) if requirement_id in spec_index else None for requirement_id in ids}
+
+
+def _entry_renames(entry: Dict) -> Dict[str, str]:
+    return {requirement_title(rename["to"]): requirement_title(rename["from"]) for rename in entry.get("renames", [])}
+
+
+def _locate_change_folder(flow_path: Path, project_slug: str, change_id: str) -> Optional[Path]:
+    """Active change folder, or the newest archived ``<date>-<change_id>`` folder."""
+
+    active = change_dir(flow_path, project_slug, change_id)
+    if active.exists():
+        return active
+    archive = project_dir(flow_path, project_slug) / "changes" / "archive"
+    if not archive.exists():
+        return None
+    candidates = sorted(archive.glob(f"*-{change_id}"))
+    candidates = [path for path in candidates if path.is_dir() and path.name[11:] == change_id]
+    return candidates[-1] if candidates else None
+
+
+def _unmerge_overlaps(lineage: RequirementHistory, results: List[Dict], change_id: str) -> List[str]:
+    """Requirements this change touched that a later change edited since."""
+
+    overlaps: List[str] = []
+    for result in results:
+        for requirement_id in result.get("index_delta") or {}:
+            events = lineage.lineage(requirement_id)
+            own = [idx for idx, event in enumerate(events) if event["change_id"] == change_id]
+            if not own:
+                continue
+            later: Dict[str, None] = {}
+            for event in events[own[-1] + 1 :]:
+                if event["operation"] == "UNMERGED":
+                    later.pop(event["change_id"], None)
+                elif event["change_id"] != change_id:
+                    later[event["change_id"]] = None
+            if later:
+                overlaps.append(f"{requirement_id}: changed later by {', '.join(sorted(later))}")
+    return overlaps
+
+
+def _unmerge_change(flow_path: Path, project_slug: str, change_id: str, *, dry_run: bool) -> List[str]:
+    """Replay a change's reverse patches; refuses before writing if anything overlaps."""
+
+    change_path = _locate_change_folder(flow_path, project_slug, change_id)
+    report = _load_json_object(change_path / SPEC_MERGE_REPORT_FILENAME) if change_path else None
+    if change_path is None or not report or report.get("dry_run"):
+        raise SpecCommandError(f"Change '{change_id}' has no completed merge to undo.")
+    if report.get("unmerged_at"):
+        raise SpecCommandError(f"Change '{change_id}' was already unmerged at {report['unmerged_at']}.")
+    results = [result for result in report.get("results", []) if "reverse_patch" in result]
+    if not results:
+        raise SpecCommandError("Merge report predates reverse patches; nothing to replay.")
+
+    with capability_locks(flow_path, project_slug, [str(result["capability"]) for result in results]):
+        lineage = RequirementHistory.load(flow_path, project_slug)
+        conflicts = _unmerge_overlaps(lineage, results, change_id)
+        planned: List[Tuple[str, Path, str, Optional[str]]] = []
+        for result in results:
+            capability = str(result["capability"])
+            path = canonical_spec_path(flow_path, project_slug, capability)
+            try:
+                current = read_canonical_spec(path)
+            except StateError as exc:
+                conflicts.append(f"{capability}: {exc}")
+                continue
+            if current is None:
+                conflicts.append(f"{capability}: canonical spec no longer exists")
+                continue
+            try:
+                restored = apply_block_patch(current, result["reverse_patch"])
+            except ValueError as exc:
+                conflicts.append(f"{capability}: {exc}")
+                continue
+            planned.append((capability, path, current, restored))
+        if conflicts:
+            raise SpecCommandError("\n".join(conflicts))
+
+        lines = [f"{capability}: {'remove spec' if restored is None else 'restore'}" for capability, _, _, restored in planned]
+        if dry_run:
+            return lines
+
+        timestamp = datetime.now(timezone.utc).isoformat()
+        spec_index = load_spec_index(flow_path, project_slug)
+        for result in results:
+            for requirement_id, meta in (result.get("index_delta") or {}).items():
+                title = str((meta or spec_index.get(requirement_id) or {}).get("title", ""))
+                if meta is None:
+                    spec_index.pop(requirement_id, None)
+                else:
+                    spec_index[requirement_id] = dict(meta)
+                lineage.record(requirement_id, "UNMERGED", title, str(result["capability"]), change_id, timestamp)
+
+        history = SpecHistory.load(flow_path, project_slug)
+        for capability, path, current, restored in planned:
+            if restored is None:
+                remove_canonical_spec(path)
+                record_requirement_spans(flow_path, project_slug, capability, path)
+                continue
+            write_canonical_spec(path, restored, capability, spec_index)
+            record_requirement_spans(flow_path, project_slug, capability, path)
+            history.record(capability, current, restored, f"unmerge:{change_id}", timestamp)
+        history.save()
+        save_spec_index(flow_path, project_slug, spec_index)
+        lineage.save()
+        update_reference_graph(flow_path, project_slug, [capability for capability, *_ in planned])
+
+        if change_path.parent.name == "archive":
+            active = change_dir(flow_path, project_slug, change_id)
+            if active.exists():
+                lines.append(f"'{active.name}' already exists; change left in the archive")
+            else:
+                change_path.rename(active)
+                change_path = active
+        report["unmerged_at"] = timestamp
+        (change_path / SPEC_MERGE_REPORT_FILENAME).write_text(
+            json.dumps(report, indent=2, sort_keys=True) + "\n", encoding="utf-8"
+        )
+        append_timeline(change_path, "specs.unmerge", f"Reverted merged specs for {len(planned)} capability(ies)")
+        return lines
+
+
 def _perform_merge(
     flow_path: Path,
     project_slug: str,
     change_id: str,
     contexts: List[CapabilityContext],
     manifest: Dict,
-    spec_index: Dict[str, Dict[str, str]],
+    spec_index: SpecIndex,
+    *,
+    dry_run: bool,
+    jobs: int = 1,
+) -> List[Dict[str, object]]:
+    targets = [
+        MergeTarget(
+            name=ctx.name,
+            delta_path=ctx.delta_path,
+            canonical_path=ctx.canonical_path,
+            changed=ctx.changed,
+            would_create=ctx.would_create,
+            preview_path=ctx.staged_path,
+            base_sha256=ctx.inputs.get("canonical_sha256"),
+            base_path=ctx.base_path,
+            parsed=ctx.parsed,
+        )
+        for ctx in contexts
+    ]
+    return _write_merge_targets(
+        flow_path,
+        project_slug,
+        change_id,
+        targets,
+        manifest,
+        spec_index,
+        dry_run=dry_run,
+        jobs=jobs,
+    )
+
+
+def _rebase_target(item: MergeTarget) -> Optional[str]:
+    """Re-apply a target whose canonical spec changed since it was read; return a conflict, if any.
+
+    Must run under the capability lock. The deltas are replayed on the fresh
+    text only when none of the requirements they touch changed in between.
+    """
+
+    if canonical_spec_sha256(item.canonical_path) == item.base_sha256:
+        return None
+    if item.parsed is None:
+        return f"{item.name}: canonical spec changed since it was read"
+
+    fresh = read_canonical_spec(item.canonical_path)
+    base = item.base_path.read_text(encoding="utf-8") if item.base_path and item.base_path.exists() else None
+    fresh_doc = SpecDocument.parse(fresh or default_spec_content(item.name))
+    base_doc = SpecDocument.parse(base or default_spec_content(item.name))
+    overlap = [
+        title
+        for title in dict.fromkeys(touch["title"] for touch in _delta_touches(item.parsed))
+        if (fresh_doc.block_text(title) if title in fresh_doc else None)
+        != (base_doc.block_text(title) if title in base_doc else None)
+    ]
+    if overlap:
+        return f"{item.name}: requirement(s) changed by another merge: {', '.join(map(str, overlap))}"
+    current = fresh if fresh is not None else default_spec_content(item.name)
+    try:
+        updated = apply_deltas_to_spec(current, item.parsed)
+    except StateError as exc:
+        return f"{item.name}: {exc}"
+    item.updated_text = updated
+    item.changed = updated != current
+    item.would_create = fresh is None
+    return None
+
+
+def _check_targets(targets: Sequence[MergeTarget]) -> None:
+    conflicts = [conflict for conflict in map(_rebase_target, targets) if conflict]
+    if conflicts:
+        raise SpecCommandError("Canonical specs changed during the merge:\n" + "\n".join(conflicts))
+
+
+def _write_canonical(item: MergeTarget, spec_index: SpecIndex) -> Tuple[Optional[str], str]:
+    # The index must already hold this merge's IDs: directory-layout specs name
+    # new requirement files after them.
+    before = read_canonical_spec(item.canonical_path)
+    updated = item.read_updated()
+    write_canonical_spec(item.canonical_path, updated, item.name, spec_index)
+    return before, updated
+
+
+def _write_merge_targets(
+    flow_path: Path,
+    project_slug: str,
+    change_id: str,
+    targets: List[MergeTarget],
+    manifest: Dict,
+    spec_index: SpecIndex,
     *,
     dry_run: bool,
+    jobs: int = 1,
 ) -> List[Dict[str, object]]:
     entry_map = {entry["capability"]: entry for entry in manifest.get("capabilities", [])}
-    timestamp = datetime.now(timezone.utc).isoformat()
-    results: List[Dict[str, object]] = []
+    if dry_run:
+        return [_merge_result(item, {}) for item in targets]
 
-    for ctx in contexts:
-        target = ctx.canonical_path
-        changed = ctx.updated_text != ctx.current_text
-        if not dry_run:
-            target.parent.mkdir(parents=True, exist_ok=True)
-            target.write_text(ctx.updated_text, encoding="utf-8")
-            entry = entry_map.get(ctx.name)
+    timestamp = datetime.now(timezone.utc).isoformat()
+    undo: Dict[str, Dict[str, object]] = {}
+    # Locks cover only the capabilities written here, so unrelated merges run
+    # in parallel; shared JSON state is re-read and merged when it is saved.
+    with capability_locks(flow_path, project_slug, [item.name for item in targets]):
+        _check_targets(targets)
+        lineage = RequirementHistory.load(flow_path, project_slug)
+        history = SpecHistory.load(flow_path, project_slug)
+        history_lock = threading.Lock()
+        for item in targets:
+            entry = entry_map.get(item.name)
+            undo[item.name] = {"index_delta": _index_snapshot(spec_index, entry) if entry else {}}
             if entry:
-                _apply_spec_index_updates(spec_index, entry, change_id, timestamp)
+                _apply_spec_index_updates(spec_index, entry, change_id, timestamp, lineage)
+
+        def commit(item: MergeTarget) -> Dict:
+            # Each worker holds one capability's before/after text at a time.
+            before, after = _write_canonical(item, spec_index)
+            with history_lock:
+                history.record(item.name, before, after, change_id, timestamp)
+            return block_reverse_patch(before, after, _entry_renames(entry_map.get(item.name, {})))
+
+        for item, patch in zip(targets, _map_jobs(commit, targets, jobs, threads=True)):
+            undo[item.name]["reverse_patch"] = patch
+            record_requirement_spans(flow_path, project_slug, item.name, item.canonical_path)
+        history.save()
+        save_spec_index(flow_path, project_slug, spec_index)
+        lineage.save()
+        update_reference_graph(flow_path, project_slug, [item.name for item in targets])
+    return [_merge_result(item, undo[item.name]) for item in targets]
+
+
+def _merge_result(item: MergeTarget, undo: Dict[str, object]) -> Dict[str, object]:
+    return {
+        "capability": item.name,
+        "delta_path": str(item.delta_path),
+        "canonical_path": str(item.canonical_path),
+        "changed": item.changed,
+        "would_create": item.would_create,
+        **undo,
+    }
 
-        results.append(
-            {
-                "capability": ctx.name,
-                "delta_path": str(ctx.delta_path),
-                "canonical_path": str(target),
-                "changed": changed,
-                "would_create": ctx.would_create,
-            }
+
+def _ready_changes(flow_path: Path, project_slug: str) -> List[str]:
+    """Changes whose saved manifest still matches every delta spec, oldest prepare first."""
+
+    ready: List[Tuple[str, str]] = []
+    for change in list_changes(flow_path, project_slug):
+        deltas = change_delta_specs(flow_path, project_slug, change)
+        manifest = _load_json_object(spec_manifest_path(flow_path, project_slug, change))
+        if not deltas or not manifest:
+            continue
+        recorded = {
+            entry.get("capability"): (entry.get("inputs") or {}).get("delta_sha256")
+            for entry in manifest.get("capabilities", [])
+        }
+        if all(recorded.get(capability) == file_sha256(path) for capability, path in deltas):
+            ready.append((str(manifest.get("generated_at", "")), change))
+    return [change for _, change in sorted(ready)]
+
+
+def _delta_touches(parsed: DeltaParseResult) -> List[Dict[str, Optional[str]]]:
+    touches: List[Dict[str, Optional[str]]] = []
+    for op, deltas in parsed.requirements.items():
+        for delta in deltas:
+            touches.append(
+                {
+                    "operation": op,
+                    "title": delta.title,
+                    "requirement_id": _find_requirement_identifier(delta),
+                }
+            )
+    for rename in parsed.renames:
+        for title in (requirement_title(rename.old), requirement_title(rename.new)):
+            touches.append({"operation": "RENAMED", "title": title, "requirement_id": None})
+    return touches
+
+
+def _refresh_touch_index(flow_path: Path, project_slug: str) -> Dict[Tuple[str, str], List[Dict]]:
+    """Map ``(capability, title)`` to the active changes whose deltas touch it.
+
+    Per-delta touch lists persist in ``state/conflict_index.json`` together with
+    the file's size, mtime and sha256; only deltas whose content changed are
+    looked up again (through the parse cache).
+    """
+
+    path = conflict_index_path(flow_path, project_slug)
+    stored = _load_json_object(path) or {}
+    previous: Dict[str, Dict] = stored.get("deltas", {}) if stored.get("version") == 1 else {}
+    cache = DeltaCache.load(flow_path, project_slug)
+    project_path = project_dir(flow_path, project_slug)
+    deltas: Dict[str, Dict] = {}
+    touches: Dict[Tuple[str, str], List[Dict]] = {}
+    for change in list_changes(flow_path, project_slug):
+        for capability, delta_path in change_delta_specs(flow_path, project_slug, change):
+            key = delta_path.relative_to(project_path).as_posix()
+            stat = delta_path.stat()
+            record = previous.get(key)
+            if not record or record.get("stat") != [stat.st_size, stat.st_mtime_ns]:
+                digest = file_sha256(delta_path)
+                if not record or record.get("sha256") != digest:
+                    try:
+                        parsed, _ = cache.lookup(delta_path)
+                    except StateError:
+                        record = {"touches": []}
+                    else:
+                        record = {"touches": _delta_touches(parsed)}
+                record = {**record, "sha256": digest, "stat": [stat.st_size, stat.st_mtime_ns]}
+            record.update({"change_id": change, "capability": capability})
+            deltas[key] = record
+            for touch in record["touches"]:
+                touches.setdefault((capability, touch["title"]), []).append(
+                    {
+                        "change_id": change,
+                        "operation": touch["operation"],
+                        "requirement_id": touch.get("requirement_id"),
+                    }
+                )
+    cache.save()
+    if deltas != previous:
+        _write_manifest(path, {"version": 1, "deltas": deltas})
+    return touches
+
+
+def _gather_queue_contexts(
+    flow_path: Path,
+    project_slug: str,
+    change_ids: List[str],
+    staging_name: str,
+) -> Tuple[Dict[str, List[CapabilityContext]], Dict[str, MergeTarget]]:
+    """Apply queued changes through staged files, one canonical read per capability.
+
+    Returns the per-change contexts (each seeing the text left by the changes
+    before it) and one final write target per capability. Any validation error
+    or requirement touched by more than one queued change aborts the whole
+    queue before anything is written.
+    """
+
+    cache = DeltaCache.load(flow_path, project_slug)
+    errors: List[str] = []
+    queued: Dict[str, List[Tuple[str, Path, DeltaParseResult]]] = {}
+    touched: Dict[Tuple[str, str], List[str]] = {}
+    for change in change_ids:
+        deltas = change_delta_specs(flow_path, project_slug, change)
+        if not deltas:
+            errors.append(f"{change}: no delta specs")
+            continue
+        queued[change] = []
+        for capability, path in deltas:
+            parsed, validation_errors = _lookup_delta(cache, capability, path)
+            if parsed is None or validation_errors:
+                errors.extend(f"{change}/{err}" for err in validation_errors)
+                continue
+            queued[change].append((capability, path, parsed))
+            for title in dict.fromkeys(touch["title"] for touch in _delta_touches(parsed)):
+                touched.setdefault((capability, title), []).append(change)
+    cache.save()
+
+    for (capability, title), owners in touched.items():
+        if len(owners) > 1:
+            errors.append(f"conflict: {capability} '{title}' is touched by {', '.join(owners)}")
+    if errors:
+        raise SpecCommandError("\n".join(errors))
+
+    # Each step is staged to its own file: the next change applies on top of the
+    # previous staged text, and the canonical spec is first copied in as the base
+    # so per-change history can still be recorded after the canonical write.
+    staging = _staging_dir(flow_path, project_slug, staging_name)
+    targets: Dict[str, MergeTarget] = {}
+    contexts: Dict[str, List[CapabilityContext]] = {}
+    for change in change_ids:
+        contexts[change] = []
+        for capability, path, parsed in queued[change]:
+            target = targets.get(capability)
+            first_touch = target is None
+            if target is None:
+                canonical = canonical_spec_path(flow_path, project_slug, capability)
+                base_sha256 = canonical_spec_sha256(canonical)
+                text = read_canonical_spec(canonical)
+                base = staging / f"{_staging_stem(capability)}.base.md"
+                if text is not None:
+                    base.write_text(text, encoding="utf-8")
+                target = MergeTarget(
+                    name=capability,
+                    delta_path=path,
+                    canonical_path=canonical,
+                    changed=False,
+                    would_create=text is None,
+                    preview_path=base if text is not None else None,
+                    base_sha256=base_sha256,
+                )
+                targets[capability] = target
+            staged = staging / f"{_staging_stem(capability)}.{change}.md"
+            base_path = target.preview_path
+            would_create, changed, error = _stage_job(
+                (capability, str(base_path) if base_path else None, None, str(staged), parsed)
+            )
+            if error:
+                errors.append(f"{change}/{capability}: {error}")
+                continue
+            contexts[change].append(
+                CapabilityContext(
+                    name=capability,
+                    delta_path=path,
+                    canonical_path=target.canonical_path,
+                    parsed=parsed,
+                    base_path=base_path,
+                    staged_path=staged,
+                    changed=changed,
+                    would_create=would_create and first_touch,
+                    inputs=_capability_inputs(path, target.canonical_path),
+                )
+            )
+            target.changed = target.changed or changed
+            target.preview_path = staged
+
+    if errors:
+        _discard_staging(flow_path, project_slug, staging_name)
+        raise SpecCommandError("\n".join(errors))
+    return contexts, targets
+
+
+def _merge_queue(
+    flow_path: Path,
+    project_slug: str,
+    change_ids: List[str],
+    *,
+    dry_run: bool,
+    finalize: bool,
+    write_diffs: bool,
+    jobs: int = 1,
+) -> None:
+    # Concurrent queue runs must not share (and wipe) each other's staged files.
+    staging_name = f"{QUEUE_STAGING_NAME}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+    try:
+        contexts, targets = _gather_queue_contexts(flow_path, project_slug, change_ids, staging_name)
+    except SpecCommandError as exc:
+        console.print(Panel(str(exc), title="Merge queue rejected", border_style="red"))
+        raise typer.Exit(1)
+
+    try:
+        spec_index = load_spec_index(flow_path, project_slug)
+        lineage = RequirementHistory.load(flow_path, project_slug)
+        timestamp = datetime.now(timezone.utc).isoformat()
+        reports: Dict[str, List[Dict[str, object]]] = {}
+        for change in change_ids:
+            manifest = _build_manifest(
+                flow_path,
+                project_slug,
+                change,
+                contexts[change],
+                spec_index,
+                write_diffs=write_diffs,
+            )
+            _write_manifest(spec_manifest_path(flow_path, project_slug, change), manifest)
+            entries = {entry["capability"]: entry for entry in manifest["capabilities"]}
+            index_deltas: Dict[str, Dict[str, Optional[Dict]]] = {}
+            for entry in manifest["capabilities"]:
+                index_deltas[entry["capability"]] = _index_snapshot(spec_index, entry)
+                _apply_spec_index_updates(spec_index, entry, change, timestamp, lineage)
+            reports[change] = []
+            for ctx in contexts[change]:
+                result: Dict[str, object] = {
+                    "capability": ctx.name,
+                    "delta_path": str(ctx.delta_path),
+                    "canonical_path": str(ctx.canonical_path),
+                    "changed": ctx.changed,
+                    "would_create": ctx.would_create,
+                }
+                if not dry_run:
+                    result["index_delta"] = index_deltas.get(ctx.name, {})
+                    result["reverse_patch"] = block_reverse_patch(
+                        None if ctx.would_create else ctx.current_text,
+                        ctx.updated_text,
+                        _entry_renames(entries.get(ctx.name, {})),
+                    )
+                reports[change].append(result)
+
+        if not dry_run:
+            _commit_queue(flow_path, project_slug, change_ids, contexts, targets, spec_index, timestamp, jobs)
+            lineage.save()
+    except SpecCommandError as exc:
+        console.print(Panel(str(exc), title="Merge queue rejected", border_style="red"))
+        raise typer.Exit(1)
+    finally:
+        _discard_staging(flow_path, project_slug, staging_name)
+
+    for change in change_ids:
+        _write_merge_report(
+            spec_merge_report_path(flow_path, project_slug, change),
+            project_slug,
+            change,
+            reports[change],
+            dry_run=dry_run,
+            finalized=bool(finalize and not dry_run),
         )
 
-    if not dry_run:
-        save_spec_index(flow_path, project_slug, spec_index)
+    summary = f"Merged {len(change_ids)} change(s) into {len(targets)} canonical spec(s): {', '.join(change_ids)}"
+    if dry_run:
+        summary = f"Dry run — {summary}"
+    console.print(Panel(summary, border_style="green"))
+
+    if finalize and dry_run:
+        console.print(Panel("Cannot finalize during a dry run.", border_style="yellow"))
+        return
+    if finalize:
+        for change in change_ids:
+            change_path = change_dir(flow_path, project_slug, change)
+            append_timeline(change_path, "specs.merge", "Merged delta specs into canonical specs (queue)")
+            archive_change(flow_path, project_slug, change)
+        console.print(Panel(f"Archived {len(change_ids)} change(s)", border_style="cyan"))
 
-    return results
+
+def _commit_queue(
+    flow_path: Path,
+    project_slug: str,
+    change_ids: List[str],
+    contexts: Dict[str, List[CapabilityContext]],
+    targets: Dict[str, MergeTarget],
+    spec_index: SpecIndex,
+    timestamp: str,
+    jobs: int,
+) -> None:
+    # Queued texts chain through several changes, so a stale base aborts
+    # instead of being re-applied.
+    with capability_locks(flow_path, project_slug, targets):
+        _check_targets(list(targets.values()))
+
+        def write(item: MergeTarget) -> None:
+            _write_canonical(item, spec_index)
+
+        _map_jobs(write, list(targets.values()), jobs, threads=True)
+        # Record one version per queued change, not just the final text.
+        history = SpecHistory.load(flow_path, project_slug)
+        for change in change_ids:
+            for ctx in contexts[change]:
+                before = None if ctx.would_create else ctx.current_text
+                history.record(ctx.name, before, ctx.updated_text, change, timestamp)
+        history.save()
+        for capability, target in targets.items():
+            record_requirement_spans(flow_path, project_slug, capability, target.canonical_path)
+        save_spec_index(flow_path, project_slug, spec_index)
+        update_reference_graph(flow_path, project_slug, targets)
 
 
 def _write_merge_report(
@@ -515,6 +2295,7 @@ def _write_merge_report(
     *,
     dry_run: bool,
     finalized: bool,
+    from_plan: bool = False,
 ) -> None:
     report = {
         "project": project_slug,
@@ -522,6 +2303,7 @@ def _write_merge_report(
         "generated_at": datetime.now(timezone.utc).isoformat(),
         "dry_run": dry_run,
         "finalized": finalized,
+        "from_plan": from_plan,
         "results": results,
     }
     path.parent.mkdir(parents=True, exist_ok=True)
@@ -550,16 +2332,11 @@ def specs_validate(
         console.print(Panel("No delta specs to validate.", border_style="yellow"))
         raise typer.Exit(1)
 
+    cache = DeltaCache.load(flow_path, project_slug)
     errors = []
     for capability, path in deltas:
-        text = path.read_text(encoding="utf-8")
-        try:
-            parsed = parse_delta_markdown(text)
-        except Exception as exc:
-            errors.append(f"{capability}: {exc}")
-            continue
-        for err in validate_delta_result(parsed):
-            errors.append(f"{capability}: {err}")
+        errors.extend(_lookup_delta(cache, capability, path)[1])
+    cache.save()
 
     if errors:
         console.print(Panel("\n".join(errors), title="Validation Errors", border_style="red"))
@@ -582,26 +2359,33 @@ def specs_apply(
         console.print(Panel("No delta specs to apply.", border_style="red"))
         raise typer.Exit(1)
 
+    cache = DeltaCache.load(flow_path, project_slug)
+    history = SpecHistory.load(flow_path, project_slug)
+    spec_index = load_spec_index(flow_path, project_slug)
+    timestamp = datetime.now(timezone.utc).isoformat()
     results = []
     for capability, path in deltas:
-        text = path.read_text(encoding="utf-8")
-        parsed = parse_delta_markdown(text)
-        errors = validate_delta_result(parsed)
+        try:
+            parsed, errors = cache.lookup(path)
+        except StateError as exc:
+            console.print(Panel(f"{capability}: {exc}", border_style="red"))
+            raise typer.Exit(1)
         if errors:
             console.print(Panel("\n".join(f"{capability}: {e}" for e in errors), border_style="red"))
             raise typer.Exit(1)
         target = canonical_spec_path(flow_path, project_slug, capability)
-        if target.exists():
-            current = target.read_text(encoding="utf-8")
-        elif dry_run:
-            current = default_spec_content(capability)
-        else:
-            current = ensure_canonical_spec(target, capability)
+        existing = read_canonical_spec(target)
+        current = existing
+        if current is None:
+            current = default_spec_content(capability) if dry_run else ensure_canonical_spec(target, capability)
         updated = apply_deltas_to_spec(current, parsed)
         results.append((capability, updated))
         if not dry_run:
-            target.write_text(updated, encoding="utf-8")
+            write_canonical_spec(target, updated, capability, spec_index)
+            history.record(capability, existing, updated, change_id, timestamp)
 
+    cache.save()
+    history.save()
     if dry_run:
         console.print(Panel(f"Dry run: would update {len(results)} spec(s) and archive change '{change_id}'", border_style="yellow"))
         return
@@ -610,6 +2394,7 @@ def specs_apply(
     if not change_path.exists():
         console.print(Panel(f"Change '{change_id}' not found for project '{project_slug}'", border_style="red"))
         raise typer.Exit(1)
+    update_reference_graph(flow_path, project_slug, [capability for capability, _ in results])
     append_timeline(change_path, "specs.apply", "Applied delta specs to canonical specs")
     archive_change(flow_path, project_slug, change_id)
     console.print(Panel(f"Applied {len(results)} spec(s) and archived change '{change_id}'", border_style="green"))
@@ -1,12 +1,22 @@
 """State management helpers for Flow Maestro's file-based workflow."""
 from __future__ import annotations
 
+import hashlib
 import json
+import mmap
 import re
+import zlib
+from contextlib import ExitStack, contextmanager
 from dataclasses import dataclass
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Dict, Iterable, List, Optional, Tuple
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple, Union
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None  # type: ignore[assignment]
+    import msvcrt
 
 
 STATE_DIR_NAME = "state"
@@ -15,6 +25,29 @@ SESSION_FILENAME = "session.json"
 SPEC_MANIFEST_FILENAME = "specs_manifest.json"
 SPEC_MERGE_REPORT_FILENAME = "specs_merge_report.json"
 SPEC_INDEX_FILENAME = "spec_index.json"
+SPEC_PLAN_FILENAME = "specs_plan.json"
+CONFLICT_INDEX_FILENAME = "conflict_index.json"
+DELTA_CACHE_FILENAME = "delta_cache.json"
+SEARCH_INDEX_FILENAME = "search_index.json"
+DEDUPE_INDEX_FILENAME = "dedupe_index.json"
+SIMILARITY_DIRNAME = "similarity"
+REFERENCE_GRAPH_FILENAME = "reference_graph.json"
+TRACE_CACHE_FILENAME = "trace_cache.json"
+GIT_BLOB_CACHE_FILENAME = "git_blob_cache.json"
+REQUIREMENT_SPANS_DIRNAME = "spans"
+REQUIREMENT_SPANS_VERSION = 1
+SPEC_ORDER_FILENAME = "order.json"
+SPEC_PREAMBLE_FILENAME = "preamble.md"
+REQUIREMENTS_DIRNAME = "requirements"
+OBJECTS_DIRNAME = "objects"
+SPEC_HISTORY_FILENAME = "spec_history.json"
+SPEC_HISTORY_VERSION = 1
+REQUIREMENT_HISTORY_FILENAME = "requirement_history.json"
+REQUIREMENT_HISTORY_VERSION = 1
+LOCKS_DIRNAME = "locks"
+STATE_LOCK_NAME = "state"
+DELTA_CACHE_VERSION = 1
+DELTA_CACHE_MAX_ENTRIES = 512
 
 
 class StateError(RuntimeError):
@@ -35,6 +68,18 @@ def _write_json(path: Path, data) -> None:
     path.write_text(json.dumps(data, indent=2, sort_keys=True) + "\n", encoding="utf-8")
 
 
+def _replace_json(path: Path, data) -> None:
+    """Write-then-rename so lock-free readers never observe a half-written file.
+
+    The temporary name is fixed, so callers must hold the state lock.
+    """
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_text(json.dumps(data, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+    tmp.replace(path)
+
+
 def state_dir(flow_dir: Path) -> Path:
     return flow_dir / STATE_DIR_NAME
 
@@ -91,6 +136,10 @@ def spec_merge_report_path(flow_dir: Path, project: str, change_id: str) -> Path
     return change_dir(flow_dir, project, change_id) / SPEC_MERGE_REPORT_FILENAME
 
 
+def spec_plan_path(flow_dir: Path, project: str, change_id: str) -> Path:
+    return change_dir(flow_dir, project, change_id) / SPEC_PLAN_FILENAME
+
+
 def project_state_dir(flow_dir: Path, project: str) -> Path:
     return project_dir(flow_dir, project) / "state"
 
@@ -99,6 +148,106 @@ def spec_index_path(flow_dir: Path, project: str) -> Path:
     return project_state_dir(flow_dir, project) / SPEC_INDEX_FILENAME
 
 
+def delta_cache_path(flow_dir: Path, project: str) -> Path:
+    return project_state_dir(flow_dir, project) / DELTA_CACHE_FILENAME
+
+
+def conflict_index_path(flow_dir: Path, project: str) -> Path:
+    return project_state_dir(flow_dir, project) / CONFLICT_INDEX_FILENAME
+
+
+def objects_dir(flow_dir: Path, project: str) -> Path:
+    return project_state_dir(flow_dir, project) / OBJECTS_DIRNAME
+
+
+def locks_dir(flow_dir: Path, project: str) -> Path:
+    return project_state_dir(flow_dir, project) / LOCKS_DIRNAME
+
+
+@contextmanager
+def file_lock(path: Path) -> Iterator[None]:
+    """Hold an exclusive advisory lock on ``path`` (created if missing) for the block."""
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("a+b") as handle:
+        if fcntl is not None:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+        else:  # pragma: no cover - Windows
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+            else:  # pragma: no cover - Windows
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def capability_locks(flow_dir: Path, project: str, capabilities: Iterable[str]) -> Iterator[None]:
+    """Lock each capability's canonical spec; sorted so concurrent merges cannot deadlock.
+
+    Merges touching disjoint capabilities never wait on each other.
+    """
+
+    with ExitStack() as stack:
+        for capability in sorted(set(capabilities)):
+            stack.enter_context(file_lock(locks_dir(flow_dir, project) / f"{capability.replace('/', '--')}.lock"))
+        yield
+
+
+def state_lock(flow_dir: Path, project: str):
+    """Short lock around read-merge-write cycles of the shared JSON state files."""
+
+    return file_lock(locks_dir(flow_dir, project) / f"{STATE_LOCK_NAME}.lock")
+
+
+def spec_history_path(flow_dir: Path, project: str) -> Path:
+    return project_state_dir(flow_dir, project) / SPEC_HISTORY_FILENAME
+
+
+def requirement_history_path(flow_dir: Path, project: str) -> Path:
+    return project_state_dir(flow_dir, project) / REQUIREMENT_HISTORY_FILENAME
+
+
+def search_index_path(flow_dir: Path, project: str) -> Path:
+    return project_state_dir(flow_dir, project) / SEARCH_INDEX_FILENAME
+
+
+def dedupe_index_path(flow_dir: Path, project: str) -> Path:
+    return project_state_dir(flow_dir, project) / DEDUPE_INDEX_FILENAME
+
+
+def similarity_dir(flow_dir: Path, project: str) -> Path:
+    return project_state_dir(flow_dir, project) / SIMILARITY_DIRNAME
+
+
+def reference_graph_path(flow_dir: Path, project: str) -> Path:
+    return project_state_dir(flow_dir, project) / REFERENCE_GRAPH_FILENAME
+
+
+def requirement_spans_path(flow_dir: Path, project: str, capability: str) -> Path:
+    return project_state_dir(flow_dir, project) / REQUIREMENT_SPANS_DIRNAME / f"{capability.replace('/', '--')}.json"
+
+
+def trace_cache_path(flow_dir: Path, project: str) -> Path:
+    return project_state_dir(flow_dir, project) / TRACE_CACHE_FILENAME
+
+
+def git_blob_cache_path(flow_dir: Path, project: str) -> Path:
+    return project_state_dir(flow_dir, project) / GIT_BLOB_CACHE_FILENAME
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as fh:
+        for chunk in iter(lambda: fh.read(65536), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
 def change_delta_specs(flow_dir: Path, project: str, change_id: str) -> List[Tuple[str, Path]]:
     base = change_dir(flow_dir, project, change_id) / "specs"
     if not base.exists():
@@ -155,30 +304,54 @@ class DeltaParseResult:
         }
         self.renames: List[RenameDelta] = []
 
+    def to_dict(self) -> Dict:
+        return {
+            "requirements": {
+                op: [[delta.title, delta.body] for delta in deltas]
+                for op, deltas in self.requirements.items()
+            },
+            "renames": [[rename.old, rename.new] for rename in self.renames],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "DeltaParseResult":
+        result = cls()
+        for op, deltas in data.get("requirements", {}).items():
+            result.requirements[op] = [RequirementDelta(op, title, body) for title, body in deltas]
+        result.renames = [RenameDelta(old, new) for old, new in data.get("renames", [])]
+        return result
+
 
 ALLOWED_SECTIONS = {"ADDED", "MODIFIED", "REMOVED", "RENAMED"}
+REQUIREMENT_HEADER = "### Requirement:"
 
 
-def parse_delta_markdown(text: str) -> DeltaParseResult:
-    lines = text.splitlines()
+def iter_delta_entries(lines: Iterable[str]) -> Iterator[Union[RequirementDelta, RenameDelta]]:
+    """Yield requirement and rename deltas while consuming ``lines`` lazily.
+
+    Only the requirement currently being read is buffered, so memory stays
+    bounded by the largest single requirement block.
+    """
+
     current_section: Optional[str] = None
     buffer: List[str] = []
     title: Optional[str] = None
-    result = DeltaParseResult()
 
-    def flush_requirement() -> None:
-        nonlocal buffer, title
+    def flush_requirement() -> Optional[RequirementDelta]:
+        nonlocal buffer
+        delta = None
         if current_section in {"ADDED", "MODIFIED", "REMOVED"} and title:
             body = "\n".join(buffer).strip()
-            result.requirements[current_section].append(
-                RequirementDelta(current_section, title, body)
-            )
+            delta = RequirementDelta(current_section, title, body)
         buffer = []
+        return delta
 
     for raw in lines:
         line = raw.strip("\ufeff")
         if line.startswith("## "):
-            flush_requirement()
+            delta = flush_requirement()
+            if delta:
+                yield delta
             header = line[3:].strip()
             section_name = header.split(" ")[0]
             upper = section_name.upper()
@@ -188,7 +361,9 @@ def parse_delta_markdown(text: str) -> DeltaParseResult:
             title = None
             continue
         if line.startswith("### Requirement:"):
-            flush_requirement()
+            delta = flush_requirement()
+            if delta:
+                yield delta
             title = line[len("### Requirement:") :].strip()
             buffer = [line]
             continue
@@ -200,16 +375,81 @@ def parse_delta_markdown(text: str) -> DeltaParseResult:
             if not buffer:
                 raise StateError("RENAMED section missing FROM entry")
             new_val = line.split(":", 1)[1].strip().strip("`")
-            result.renames.append(RenameDelta(buffer[0], new_val))
+            yield RenameDelta(buffer[0], new_val)
             buffer = []
             continue
         if title:
             buffer.append(raw)
 
-    flush_requirement()
+    delta = flush_requirement()
+    if delta:
+        yield delta
+
+
+def _collect_deltas(entries: Iterable[Union[RequirementDelta, RenameDelta]]) -> DeltaParseResult:
+    result = DeltaParseResult()
+    for entry in entries:
+        if isinstance(entry, RenameDelta):
+            result.renames.append(entry)
+        else:
+            result.requirements[entry.operation].append(entry)
     return result
 
 
+def parse_delta_markdown(text: str) -> DeltaParseResult:
+    return _collect_deltas(iter_delta_entries(text.splitlines()))
+
+
+def parse_delta_file(path: Path) -> DeltaParseResult:
+    """Parse a delta spec straight from disk without loading the whole file."""
+
+    with path.open("r", encoding="utf-8") as fh:
+        return _collect_deltas(iter_delta_entries(line.rstrip("\n") for line in fh))
+
+
+@dataclass
+class RequirementSpan:
+    title: str
+    offset: int
+    length: int
+    line: int
+
+
+def iter_requirement_spans(handle: BinaryIO) -> Iterator[RequirementSpan]:
+    """Yield the byte span of every requirement block in a binary handle.
+
+    ``handle`` may be an open file or an ``mmap``; it is read one line at a
+    time. Spans follow :class:`SpecDocument` semantics: a block runs up to the
+    next requirement header or the end of the file.
+    """
+
+    header = REQUIREMENT_HEADER.encode("utf-8")
+    offset = 0
+    current: Optional[RequirementSpan] = None
+    for line_no, raw in enumerate(iter(handle.readline, b"")):
+        if raw.startswith(header):
+            if current is not None:
+                current.length = offset - current.offset
+                yield current
+            title = raw[len(header) :].decode("utf-8").strip()
+            current = RequirementSpan(title, offset, 0, line_no)
+        offset += len(raw)
+    if current is not None:
+        current.length = offset - current.offset
+        yield current
+
+
+def requirement_spans(path: Path) -> List[RequirementSpan]:
+    with path.open("rb") as fh:
+        return list(iter_requirement_spans(fh))
+
+
+def read_requirement_span(path: Path, span: RequirementSpan) -> str:
+    with path.open("rb") as fh:
+        fh.seek(span.offset)
+        return fh.read(span.length).decode("utf-8")
+
+
 def validate_delta_result(result: DeltaParseResult) -> List[str]:
     errors: List[str] = []
     for op in ("ADDED", "MODIFIED"):
@@ -222,22 +462,201 @@ def validate_delta_result(result: DeltaParseResult) -> List[str]:
     return errors
 
 
-def _find_requirement_block(content: str, title: str) -> Tuple[int, int]:
-    lines = content.splitlines()
-    needle = f"### Requirement: {title}"
-    start_idx = None
-    for idx, line in enumerate(lines):
-        if line.strip() == needle:
-            start_idx = idx
-            break
-    if start_idx is None:
+class DeltaCache:
+    """On-disk cache of parsed delta specs and their validation errors.
+
+    Entries are keyed by the sha256 of the delta file, so unchanged files are
+    parsed once no matter how many spec commands run against them. The least
+    recently used entries are evicted once ``max_entries`` is exceeded.
+    """
+
+    def __init__(self, path: Path, max_entries: int = DELTA_CACHE_MAX_ENTRIES) -> None:
+        self.path = path
+        self.max_entries = max_entries
+        self._entries: Dict[str, Dict] = {}
+        self._tick = 0
+        self._dirty = False
+        try:
+            data = _load_json(path, {})
+        except StateError:
+            data = {}
+        if isinstance(data, dict) and data.get("version") == DELTA_CACHE_VERSION:
+            self._entries = data.get("entries") or {}
+            self._tick = int(data.get("tick") or 0)
+
+    @classmethod
+    def load(cls, flow_dir: Path, project: str) -> "DeltaCache":
+        return cls(delta_cache_path(flow_dir, project))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(self, path: Path) -> Tuple[DeltaParseResult, List[str]]:
+        """Return the parsed delta and validation errors for ``path``.
+
+        Parse failures are cached too and re-raised as :class:`StateError`.
+        """
+
+        digest = file_sha256(path)
+        entry = self._entries.get(digest)
+        if entry is None:
+            try:
+                parsed = parse_delta_file(path)
+            except StateError as exc:
+                entry = {"error": str(exc)}
+            else:
+                entry = {"result": parsed.to_dict(), "errors": validate_delta_result(parsed)}
+            self._entries[digest] = entry
+            self._dirty = True
+        # Hits only bump recency in memory; it is persisted with the next miss,
+        # so read-only commands never rewrite the file.
+        self._tick += 1
+        entry["used"] = self._tick
+        if "error" in entry:
+            raise StateError(entry["error"])
+        return DeltaParseResult.from_dict(entry["result"]), list(entry["errors"])
+
+    def save(self) -> None:
+        if not self._dirty:
+            return
+        if len(self._entries) > self.max_entries:
+            ranked = sorted(self._entries.items(), key=lambda item: item[1].get("used", 0), reverse=True)
+            self._entries = dict(ranked[: self.max_entries])
+        _write_json(
+            self.path,
+            {"version": DELTA_CACHE_VERSION, "tick": self._tick, "entries": self._entries},
+        )
+        self._dirty = False
+
+
+@dataclass
+class _RequirementBlock:
+    title: str
+    lines: List[str]
+    appended: bool = False
+
+
+class SpecDocument:
+    """Canonical spec parsed into a preamble and an ordered requirement map.
+
+    A requirement block runs from its ``### Requirement:`` header up to the next
+    header (or the end of the file). Edits update the map in place; the text is
+    serialized once by :meth:`render`.
+    """
+
+    def __init__(self, preamble: List[str], blocks: Iterable[_RequirementBlock] = ()) -> None:
+        self.preamble = preamble
+        self._blocks: List[Optional[_RequirementBlock]] = []
+        self._positions: Dict[str, List[int]] = {}
+        for block in blocks:
+            self._append(block)
+
+    @classmethod
+    def parse(cls, content: str) -> "SpecDocument":
+        preamble: List[str] = []
+        blocks: List[_RequirementBlock] = []
+        current: Optional[_RequirementBlock] = None
+        for line in content.splitlines():
+            if line.startswith(REQUIREMENT_HEADER):
+                current = _RequirementBlock(line[len(REQUIREMENT_HEADER) :].strip(), [line])
+                blocks.append(current)
+            elif current is None:
+                preamble.append(line)
+            else:
+                current.lines.append(line)
+        return cls(preamble, blocks)
+
+    def _append(self, block: _RequirementBlock) -> None:
+        self._positions.setdefault(block.title, []).append(len(self._blocks))
+        self._blocks.append(block)
+
+    def _locate(self, title: str) -> int:
+        positions = self._positions.get(title)
+        if not positions:
+            raise StateError(f"Requirement '{title}' not found")
+        return positions[0]
+
+    def __contains__(self, title: object) -> bool:
+        return bool(self._positions.get(title))  # type: ignore[arg-type]
+
+    def titles(self) -> List[str]:
+        return [block.title for block in self._blocks if block is not None]
+
+    def block_text(self, title: str) -> str:
+        block = self._blocks[self._locate(title)]
+        assert block is not None
+        return "\n".join(block.lines)
+
+    def requirement_spans(self) -> List[Tuple[str, int, int]]:
+        """Return ``(title, start, end)`` line spans in document order."""
+
+        spans: List[Tuple[str, int, int]] = []
+        offset = len(self.preamble)
+        for block in self._blocks:
+            if block is None:
+                continue
+            spans.append((block.title, offset, offset + len(block.lines)))
+            offset += len(block.lines)
+        return spans
+
+    def span(self, title: str) -> Tuple[int, int]:
+        for candidate, start, end in self.requirement_spans():
+            if candidate == title:
+                return start, end
         raise StateError(f"Requirement '{title}' not found")
-    end_idx = len(lines)
-    for idx in range(start_idx + 1, len(lines)):
-        if lines[idx].startswith("### Requirement:"):
-            end_idx = idx
-            break
-    return start_idx, end_idx
+
+    def remove(self, title: str) -> None:
+        idx = self._locate(title)
+        self._positions[title].pop(0)
+        self._blocks[idx] = None
+
+    def rename(self, old: str, new: str) -> None:
+        old_title = requirement_title(old)
+        positions = self._positions.get(old_title)
+        if not positions:
+            raise StateError(f"Cannot rename missing requirement: {old}")
+        idx = positions.pop(0)
+        block = self._blocks[idx]
+        assert block is not None
+        block.title = requirement_title(new)
+        block.lines[0] = f"{REQUIREMENT_HEADER} {block.title}"
+        positions = self._positions.setdefault(block.title, [])
+        positions.append(idx)
+        positions.sort()
+
+    def modify(self, title: str, body: str) -> None:
+        block = self._blocks[self._locate(title)]
+        assert block is not None
+        block.lines = body.splitlines()
+
+    def add(self, title: str, body: str) -> None:
+        self._append(_RequirementBlock(title, body.strip("\n").splitlines(), appended=True))
+
+    def render(self) -> str:
+        lines = list(self.preamble)
+        appended: List[str] = []
+        for block in self._blocks:
+            if block is None:
+                continue
+            if block.appended:
+                appended.append("\n".join(block.lines).rstrip())
+            else:
+                lines.extend(block.lines)
+        text = "\n".join(lines)
+        if appended:
+            text = "\n".join([text.rstrip(), *appended])
+        return text.rstrip() + "\n"
+
+
+def requirement_title(value: str) -> str:
+    value = value.replace("`", "").strip()
+    if value.startswith(REQUIREMENT_HEADER):
+        value = value[len(REQUIREMENT_HEADER) :]
+    return value.strip()
+
+
+def _find_requirement_block(content: str, title: str) -> Tuple[int, int]:
+    return SpecDocument.parse(content).span(title)
 
 
 def apply_deltas_to_spec(content: str, deltas: DeltaParseResult) -> str:
@@ -246,45 +665,116 @@ def apply_deltas_to_spec(content: str, deltas: DeltaParseResult) -> str:
             content = content.rstrip() + "\n\n## Requirements\n"
         content = content.rstrip() + "\n"
 
-    lines = content.splitlines()
-    content_str = "\n".join(lines)
-
+    document = SpecDocument.parse(content)
     for delta in deltas.requirements["REMOVED"]:
-        start, end = _find_requirement_block(content_str, delta.title)
-        parts = content_str.splitlines()
-        new_lines = parts[:start] + parts[end:]
-        content_str = "\n".join(new_lines).strip("\n") + "\n"
-
+        document.remove(delta.title)
     for rename in deltas.renames:
-        old = rename.old.replace("`", "").strip()
-        new = rename.new.replace("`", "").strip()
-        parts = content_str.splitlines()
-        needle = old
-        repl = new
-        found = False
-        for idx, line in enumerate(parts):
-            if needle in line:
-                parts[idx] = repl
-                found = True
-                break
-        if not found:
-            raise StateError(f"Cannot rename missing requirement: {old}")
-        content_str = "\n".join(parts)
-
+        document.rename(rename.old, rename.new)
     for delta in deltas.requirements["MODIFIED"]:
-        start, end = _find_requirement_block(content_str, delta.title)
-        parts = content_str.splitlines()
-        block_lines = delta.body.splitlines()
-        new_lines = parts[:start] + block_lines + parts[end:]
-        content_str = "\n".join(new_lines)
-
-    if deltas.requirements["ADDED"]:
-        if not content_str.endswith("\n"):
-            content_str += "\n"
-        for delta in deltas.requirements["ADDED"]:
-            content_str = content_str.rstrip() + "\n" + delta.body.strip("\n") + "\n"
-
-    return content_str.rstrip() + "\n"
+        document.modify(delta.title, delta.body)
+    for delta in deltas.requirements["ADDED"]:
+        document.add(delta.title, delta.body)
+    return document.render()
+
+
+class _RstripWriter:
+    """Write text while holding back trailing whitespace, mirroring ``text.rstrip()``."""
+
+    def __init__(self, handle: TextIO) -> None:
+        self.handle = handle
+        self.pending = ""
+        self.started = False
+
+    def write(self, text: str) -> None:
+        stripped = text.rstrip()
+        if stripped:
+            self.handle.write(self.pending + stripped)
+            self.pending = text[len(stripped) :]
+        else:
+            self.pending += text
+
+    def line(self, text: str) -> None:
+        self.write(f"\n{text}" if self.started else text)
+        self.started = True
+
+
+def apply_deltas_to_file(source: Path, target: Path, deltas: DeltaParseResult) -> None:
+    """Write ``source`` with ``deltas`` applied to ``target``, one requirement block at a time.
+
+    Produces the same text as :func:`apply_deltas_to_spec`. The source is
+    memory-mapped and read line by line, so peak memory is bounded by the
+    largest block plus the deltas. Empty specs, specs without requirement
+    headers and chained renames take the in-memory path.
+    """
+
+    renames = {requirement_title(rename.old): rename for rename in deltas.renames}
+    chained = len(renames) != len(deltas.renames) or any(
+        requirement_title(rename.new) in renames for rename in deltas.renames
+    )
+    with source.open("rb") as fh:
+        if chained or source.stat().st_size == 0:
+            view = None
+        else:
+            view = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        if view is None or view.find(REQUIREMENT_HEADER.encode("utf-8")) < 0:
+            if view is not None:
+                view.close()
+            target.write_text(apply_deltas_to_spec(source.read_text(encoding="utf-8"), deltas), encoding="utf-8")
+            return
+        removals: Dict[str, int] = {}
+        for delta in deltas.requirements["REMOVED"]:
+            removals[delta.title] = removals.get(delta.title, 0) + 1
+        modified = {delta.title: delta.body for delta in deltas.requirements["MODIFIED"]}
+        pending = dict(renames)
+        try:
+            with view, target.open("w", encoding="utf-8") as out:
+                writer = _RstripWriter(out)
+                block: List[str] = []
+
+                def flush() -> None:
+                    title = block[0][len(REQUIREMENT_HEADER) :].strip()
+                    lines = block
+                    if removals.get(title):
+                        removals[title] -= 1
+                        return
+                    if title in pending:
+                        title = requirement_title(pending.pop(title).new)
+                        lines[0] = f"{REQUIREMENT_HEADER} {title}"
+                    if title in modified:
+                        lines = modified.pop(title).splitlines()
+                    for line in lines:
+                        writer.line(line)
+
+                for raw in iter(view.readline, b""):
+                    line = raw.decode("utf-8").rstrip("\n")
+                    if line.endswith("\r"):
+                        line = line[:-1]
+                    if line.startswith(REQUIREMENT_HEADER):
+                        if block:
+                            flush()
+                        block = [line]
+                    elif block:
+                        block.append(line)
+                    else:
+                        writer.line(line)
+                if block:
+                    flush()
+
+                missing = [title for title, count in removals.items() if count]
+                if missing:
+                    raise StateError(f"Requirement '{missing[0]}' not found")
+                if pending:
+                    raise StateError(f"Cannot rename missing requirement: {next(iter(pending.values())).old}")
+                if modified:
+                    raise StateError(f"Requirement '{next(iter(modified))}' not found")
+                if deltas.requirements["ADDED"]:
+                    writer.pending = ""
+                for delta in deltas.requirements["ADDED"]:
+                    writer.write("\n" + "\n".join(delta.body.strip("\n").splitlines()).rstrip())
+                out.write("\n")
+        except StateError:
+            target.unlink(missing_ok=True)
+            raise
 
 
 def default_spec_content(capability: str) -> str:
@@ -293,14 +783,204 @@ def default_spec_content(capability: str) -> str:
 
 
 def ensure_canonical_spec(path: Path, capability: str) -> str:
-    if path.exists():
-        return path.read_text(encoding="utf-8")
+    current = read_canonical_spec(path)
+    if current is not None:
+        return current
     path.parent.mkdir(parents=True, exist_ok=True)
     base = default_spec_content(capability)
     path.write_text(base, encoding="utf-8")
     return base
 
 
+# Canonical specs are stored either as a single ``spec.md`` ("file" layout) or,
+# once converted, as ``requirements/<requirement-id>.md`` files plus
+# ``preamble.md`` and an ``order.json`` listing the blocks ("directory" layout).
+# The helpers below take the ``spec.md`` path in both cases.
+
+
+def uses_directory_layout(path: Path) -> bool:
+    return (path.parent / SPEC_ORDER_FILENAME).exists()
+
+
+def _load_spec_order(directory: Path) -> List[Dict[str, str]]:
+    data = _load_json(directory / SPEC_ORDER_FILENAME, {})
+    entries = data.get("requirements") if isinstance(data, dict) else None
+    if not isinstance(entries, list):
+        raise StateError(f"{directory / SPEC_ORDER_FILENAME} must list requirements")
+    return entries
+
+
+def _read_piece(path: Path) -> List[str]:
+    # Pieces are stored with one trailing newline added on write.
+    text = path.read_text(encoding="utf-8")
+    return text[:-1].split("\n") if text else []
+
+
+def read_canonical_spec(path: Path) -> Optional[str]:
+    """Return the canonical spec text (assembled for the directory layout), or ``None``."""
+
+    if not uses_directory_layout(path):
+        return path.read_text(encoding="utf-8") if path.exists() else None
+    directory = path.parent
+    preamble = directory / SPEC_PREAMBLE_FILENAME
+    lines = _read_piece(preamble) if preamble.exists() else []
+    for entry in _load_spec_order(directory):
+        lines.extend(_read_piece(directory / REQUIREMENTS_DIRNAME / f"{entry['id']}.md"))
+    return "\n".join(lines) + "\n"
+
+
+def canonical_spec_files(path: Path) -> List[Path]:
+    """The files that make up one canonical spec, in either layout (empty if it has none)."""
+
+    directory = path.parent
+    if not uses_directory_layout(path):
+        return [path] if path.exists() else []
+    requirements_dir = directory / REQUIREMENTS_DIRNAME
+    files = [directory / SPEC_ORDER_FILENAME, directory / SPEC_PREAMBLE_FILENAME]
+    files.extend(requirements_dir / f"{entry['id']}.md" for entry in _load_spec_order(directory))
+    return [file for file in files if file.exists()]
+
+
+def remove_canonical_spec(path: Path) -> None:
+    """Delete the files that make up one canonical spec, in either layout.
+
+    Anything else in the capability folder (nested capabilities, notes) is left
+    alone; the folder itself is only removed once it is empty.
+    """
+
+    for file in canonical_spec_files(path):
+        file.unlink()
+    _remove_empty_dir(path.parent / REQUIREMENTS_DIRNAME)
+    _remove_empty_dir(path.parent)
+
+
+def _remove_empty_dir(directory: Path) -> None:
+    try:
+        directory.rmdir()
+    except OSError:
+        pass
+
+
+def canonical_spec_sha256(path: Path) -> Optional[str]:
+    if not uses_directory_layout(path):
+        return file_sha256(path) if path.exists() else None
+    text = read_canonical_spec(path)
+    assert text is not None
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _write_if_changed(path: Path, text: str, touched: List[Path]) -> None:
+    if path.exists() and path.read_text(encoding="utf-8") == text:
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding="utf-8")
+    touched.append(path)
+
+
+def write_canonical_spec(
+    path: Path,
+    text: str,
+    capability: str,
+    index: Optional[SpecIndex] = None,
+    *,
+    layout: Optional[str] = None,
+) -> List[Path]:
+    """Write ``text`` as the canonical spec and return the files that changed.
+
+    In the directory layout only requirement files whose block changed are
+    rewritten. Blocks keep their file across edits (matched by title), new ones
+    are named after their ``Requirement-ID:`` line or index entry.
+    """
+
+    layout = layout or ("directory" if uses_directory_layout(path) else "file")
+    touched: List[Path] = []
+    if layout == "file":
+        _write_if_changed(path, text, touched)
+        return touched
+
+    directory = path.parent
+    requirements_dir = directory / REQUIREMENTS_DIRNAME
+    previous = _load_spec_order(directory) if uses_directory_layout(path) else []
+    by_title: Dict[str, List[str]] = {}
+    for entry in previous:
+        by_title.setdefault(entry["title"], []).append(entry["id"])
+
+    lines = text.splitlines()
+    document = SpecDocument.parse(text)
+    spans = document.requirement_spans()
+    preamble = lines[: spans[0][1]] if spans else lines
+    used: set[str] = set()
+    order: List[Dict[str, str]] = []
+    for title, start, end in spans:
+        block = lines[start:end]
+        reused = by_title.get(title)
+        requirement_id = reused.pop(0) if reused else _block_identifier(block, capability, title, index)
+        base, suffix = requirement_id, 2
+        while requirement_id in used:
+            requirement_id = f"{base}-{suffix}"
+            suffix += 1
+        used.add(requirement_id)
+        order.append({"id": requirement_id, "title": title})
+        _write_if_changed(requirements_dir / f"{requirement_id}.md", "\n".join(block) + "\n", touched)
+
+    for entry in previous:
+        if entry["id"] not in used:
+            stale = requirements_dir / f"{entry['id']}.md"
+            if stale.exists():
+                stale.unlink()
+                touched.append(stale)
+
+    preamble_path = directory / SPEC_PREAMBLE_FILENAME
+    if preamble:
+        _write_if_changed(preamble_path, "\n".join(preamble) + "\n", touched)
+    elif preamble_path.exists():
+        preamble_path.unlink()
+        touched.append(preamble_path)
+    if order != previous or not uses_directory_layout(path):
+        _write_json(directory / SPEC_ORDER_FILENAME, {"version": 1, "requirements": order})
+        touched.append(directory / SPEC_ORDER_FILENAME)
+    return touched
+
+
+def _block_identifier(block: List[str], capability: str, title: str, index: Optional[SpecIndex]) -> str:
+    for line in block[1:]:
+        stripped = line.strip()
+        if stripped.lower().startswith("requirement-id:") and stripped.split(":", 1)[1].strip():
+            return slugify_identifier(stripped.split(":", 1)[1])
+    if index is not None:
+        indexed = index.find(capability, title)
+        if indexed:
+            return slugify_identifier(indexed)
+    return f"{slugify_identifier(capability)}.{slugify_identifier(title)}"
+
+
+def set_canonical_layout(path: Path, capability: str, layout: str, index: Optional[SpecIndex] = None) -> bool:
+    """Convert a canonical spec between the file and directory layouts; return ``True`` if it changed."""
+
+    if layout not in {"file", "directory"}:
+        raise StateError(f"Unknown spec layout '{layout}'")
+    current = "directory" if uses_directory_layout(path) else "file"
+    if current == layout:
+        return False
+    text = read_canonical_spec(path)
+    if text is None:
+        raise StateError(f"Canonical spec missing for capability '{capability}'")
+    directory = path.parent
+    if layout == "directory":
+        write_canonical_spec(path, text, capability, index, layout="directory")
+        path.unlink()
+        return True
+    path.write_text(text, encoding="utf-8")
+    for name in (SPEC_ORDER_FILENAME, SPEC_PREAMBLE_FILENAME):
+        (directory / name).unlink(missing_ok=True)
+    requirements_dir = directory / REQUIREMENTS_DIRNAME
+    for piece in requirements_dir.glob("*.md"):
+        piece.unlink()
+    if requirements_dir.exists() and not any(requirements_dir.iterdir()):
+        requirements_dir.rmdir()
+    return True
+
+
 def archive_change(flow_dir: Path, project: str, change_id: str) -> Path:
     src = change_dir(flow_dir, project, change_id)
     if not src.exists():
@@ -338,17 +1018,416 @@ def slugify_identifier(value: str) -> str:
     return token or "item"
 
 
-def load_spec_index(flow_dir: Path, project: str) -> Dict[str, Dict[str, str]]:
+class SpecIndex(dict):
+    """Requirement index (``id -> meta``) with secondary lookups.
+
+    ``(capability, title) -> ids`` and ``capability -> ids`` are maintained on
+    every mutation, so identity resolution does not scan the whole index. Use
+    :meth:`rename_capability` and :meth:`retitle` instead of editing the meta
+    dicts in place.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__()
+        self._by_title: Dict[Tuple[Optional[str], Optional[str]], List[str]] = {}
+        self._by_capability: Dict[Optional[str], Dict[str, None]] = {}
+        # Entries as loaded from disk; saving replays only what changed since.
+        self._baseline: Optional[Dict[str, Dict]] = None
+        self.update(*args, **kwargs)
+
+    def mark_loaded(self) -> None:
+        self._baseline = {requirement_id: dict(meta) for requirement_id, meta in self.items()}
+
+    def changes(self) -> Optional[Dict[str, Optional[Dict]]]:
+        """Entries set (meta) or removed (``None``) since loading; ``None`` if never loaded."""
+
+        if self._baseline is None:
+            return None
+        changed: Dict[str, Optional[Dict]] = {}
+        for requirement_id in self._baseline.keys() | self.keys():
+            meta = self.get(requirement_id)
+            if meta != self._baseline.get(requirement_id):
+                changed[requirement_id] = meta
+        return changed
+
+    def _link(self, requirement_id: str, meta: Dict) -> None:
+        capability = meta.get("capability")
+        self._by_capability.setdefault(capability, {})[requirement_id] = None
+        self._by_title.setdefault((capability, meta.get("title")), []).append(requirement_id)
+
+    def _unlink(self, requirement_id: str, meta: Dict) -> None:
+        capability = meta.get("capability")
+        ids = self._by_capability.get(capability, {})
+        ids.pop(requirement_id, None)
+        if not ids:
+            self._by_capability.pop(capability, None)
+        key = (capability, meta.get("title"))
+        titled = self._by_title.get(key, [])
+        if requirement_id in titled:
+            titled.remove(requirement_id)
+        if not titled:
+            self._by_title.pop(key, None)
+
+    def __setitem__(self, requirement_id: str, meta: Dict) -> None:
+        if requirement_id in self:
+            self._unlink(requirement_id, self[requirement_id])
+        super().__setitem__(requirement_id, meta)
+        self._link(requirement_id, meta)
+
+    def __delitem__(self, requirement_id: str) -> None:
+        meta = self[requirement_id]
+        super().__delitem__(requirement_id)
+        self._unlink(requirement_id, meta)
+
+    def pop(self, requirement_id: str, *default):
+        if requirement_id not in self:
+            if default:
+                return default[0]
+            raise KeyError(requirement_id)
+        meta = super().pop(requirement_id)
+        self._unlink(requirement_id, meta)
+        return meta
+
+    def popitem(self):
+        requirement_id, meta = super().popitem()
+        self._unlink(requirement_id, meta)
+        return requirement_id, meta
+
+    def setdefault(self, requirement_id: str, default=None):
+        if requirement_id not in self:
+            self[requirement_id] = default
+        return self[requirement_id]
+
+    def update(self, *args, **kwargs) -> None:
+        for requirement_id, meta in dict(*args, **kwargs).items():
+            self[requirement_id] = meta
+
+    def clear(self) -> None:
+        super().clear()
+        self._by_title.clear()
+        self._by_capability.clear()
+
+    def find(self, capability: str, title: str) -> Optional[str]:
+        ids = self._by_title.get((capability, title))
+        return ids[0] if ids else None
+
+    def ids_for(self, capability: str) -> List[str]:
+        return list(self._by_capability.get(capability, {}))
+
+    def capabilities(self) -> List[str]:
+        return sorted(cap for cap in self._by_capability if cap is not None)
+
+    def rename_capability(self, old: str, new: str) -> int:
+        moved = self.ids_for(old)
+        for requirement_id in moved:
+            self[requirement_id] = {**self[requirement_id], "capability": new}
+        return len(moved)
+
+    def retitle(self, capability: str, old: str, new: str) -> Optional[str]:
+        requirement_id = self.find(capability, old)
+        if requirement_id is not None:
+            self[requirement_id] = {**self[requirement_id], "title": new}
+        return requirement_id
+
+
+def load_spec_index(flow_dir: Path, project: str) -> SpecIndex:
     path = spec_index_path(flow_dir, project)
     if not path.exists():
-        return {}
+        return SpecIndex()
     data = _load_json(path, {})
     if not isinstance(data, dict):
         raise StateError("spec_index.json must contain an object")
-    return data
+    index = SpecIndex(data)
+    index.mark_loaded()
+    return index
+
+
+def record_requirement_spans(flow_dir: Path, project: str, capability: str, path: Path) -> int:
+    """Store the byte span of each requirement block of ``capability`` in its sidecar file.
+
+    The sidecar (``state/spans/<capability>.json``) carries the spec's size,
+    mtime and sha256 so :func:`read_indexed_requirement` can tell whether it
+    still describes the file on disk; ``spec_index.json`` keeps identity only.
+    """
+
+    sidecar = requirement_spans_path(flow_dir, project, capability)
+    if uses_directory_layout(path) or not path.exists():
+        sidecar.unlink(missing_ok=True)
+        return 0
+    stat = path.stat()
+    spans: Dict[str, List[int]] = {}
+    for span in requirement_spans(path):
+        spans.setdefault(span.title, [span.offset, span.length])
+    payload = {
+        "version": REQUIREMENT_SPANS_VERSION,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "sha256": file_sha256(path),
+        "spans": spans,
+    }
+    try:
+        unchanged = _load_json(sidecar, None) == payload
+    except StateError:
+        unchanged = False
+    if not unchanged:
+        _write_json(sidecar, payload)
+    return len(spans)
+
+
+def _load_requirement_spans(flow_dir: Path, project: str, capability: str, path: Path) -> Dict[str, List[int]]:
+    """Spans from the capability's sidecar, or nothing when it is missing or stale."""
+
+    try:
+        data = _load_json(requirement_spans_path(flow_dir, project, capability), None)
+    except StateError:
+        return {}
+    if not isinstance(data, dict) or data.get("version") != REQUIREMENT_SPANS_VERSION:
+        return {}
+    stat = path.stat()
+    if stat.st_size != data.get("size"):
+        return {}
+    if stat.st_mtime_ns != data.get("mtime_ns") and file_sha256(path) != data.get("sha256"):
+        return {}
+    return data.get("spans") or {}
+
+
+def read_indexed_requirement(flow_dir: Path, project: str, index: SpecIndex, requirement_id: str) -> str:
+    """Return one requirement block, seeking straight to its recorded span when possible."""
+
+    meta = index.get(requirement_id)
+    if meta is None:
+        raise StateError(f"Requirement '{requirement_id}' not found in spec index")
+    path = canonical_spec_path(flow_dir, project, meta.get("capability", ""))
+    title = meta.get("title")
+    if uses_directory_layout(path):
+        piece = path.parent / REQUIREMENTS_DIRNAME / f"{requirement_id}.md"
+        if piece.exists():
+            text = piece.read_text(encoding="utf-8")
+            if requirement_title(text.split("\n", 1)[0]) == title:
+                return text
+        document = SpecDocument.parse(read_canonical_spec(path) or "")
+        if title in document:
+            return document.block_text(title) + "\n"
+        raise StateError(f"Requirement '{title}' not found in {path.parent}")
+    if not path.exists():
+        raise StateError(f"Canonical spec missing for capability '{meta.get('capability')}'")
+
+    span = _load_requirement_spans(flow_dir, project, meta.get("capability", ""), path).get(title)
+    if span:
+        text = read_requirement_span(path, RequirementSpan(title, span[0], span[1], 0))
+        header = text.split("\n", 1)[0]
+        if header.startswith(REQUIREMENT_HEADER) and requirement_title(header) == title:
+            return text
+
+    for candidate in requirement_spans(path):
+        if candidate.title == title:
+            return read_requirement_span(path, candidate)
+    raise StateError(f"Requirement '{title}' not found in {path}")
 
 
 def save_spec_index(flow_dir: Path, project: str, data: Dict[str, Dict[str, str]]) -> None:
+    """Write the index; a loaded :class:`SpecIndex` only replays its own edits.
+
+    The file is re-read under the state lock and this index's changes since it
+    was loaded are applied on top, so concurrent merges into different
+    capabilities do not drop each other's entries.
+    """
+
     path = spec_index_path(flow_dir, project)
     path.parent.mkdir(parents=True, exist_ok=True)
-    path.write_text(json.dumps(data, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+    with state_lock(flow_dir, project):
+        changes = data.changes() if isinstance(data, SpecIndex) else None
+        if changes is not None:
+            merged = _load_json(path, {}) if path.exists() else {}
+            for requirement_id, meta in changes.items():
+                if meta is None:
+                    merged.pop(requirement_id, None)
+                else:
+                    merged[requirement_id] = meta
+        else:
+            merged = dict(data)
+        _replace_json(path, merged)
+    if isinstance(data, SpecIndex):
+        data.mark_loaded()
+
+
+def canonical_capabilities(flow_dir: Path, project: str) -> List[str]:
+    """List capabilities with a canonical spec, in either storage layout."""
+
+    root = project_dir(flow_dir, project) / "specs"
+    if not root.exists():
+        return []
+    found = {path.parent.relative_to(root).as_posix() for path in root.rglob("spec.md")}
+    found.update(path.parent.relative_to(root).as_posix() for path in root.rglob(SPEC_ORDER_FILENAME))
+    return sorted(found)
+
+
+def store_object(root: Path, text: str) -> str:
+    """Store ``text`` zlib-compressed under its sha256 in ``root``; return the digest."""
+
+    data = text.encode("utf-8")
+    digest = hashlib.sha256(data).hexdigest()
+    path = root / digest[:2] / digest[2:]
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.tmp")
+        tmp.write_bytes(zlib.compress(data))
+        tmp.replace(path)
+    return digest
+
+
+def load_object(root: Path, digest: str) -> str:
+    path = root / digest[:2] / digest[2:]
+    if not path.exists():
+        raise StateError(f"Spec object {digest[:12]} missing from {root}")
+    return zlib.decompress(path.read_bytes()).decode("utf-8")
+
+
+class SpecHistory:
+    """Version chain of every canonical spec, backed by a content-addressed object store.
+
+    ``spec_history.json`` lists, per capability, the object digest, change ID and
+    timestamp of each version; identical texts share one object. The first merge
+    into an existing spec also records the text it replaced as a baseline.
+    """
+
+    def __init__(self, path: Path, objects: Path) -> None:
+        self.path = path
+        self.objects = objects
+        data = _load_json(path, {})
+        if not isinstance(data, dict) or data.get("version") != SPEC_HISTORY_VERSION:
+            data = {}
+        self._capabilities: Dict[str, List[Dict[str, Optional[str]]]] = data.get("capabilities") or {}
+        self._pending: List[Tuple[str, Dict[str, Optional[str]]]] = []
+
+    @classmethod
+    def load(cls, flow_dir: Path, project: str) -> "SpecHistory":
+        return cls(spec_history_path(flow_dir, project), objects_dir(flow_dir, project))
+
+    def versions(self, capability: str) -> List[Dict[str, Optional[str]]]:
+        return list(self._capabilities.get(capability, []))
+
+    def record(
+        self,
+        capability: str,
+        before: Optional[str],
+        after: str,
+        change_id: Optional[str],
+        timestamp: str,
+    ) -> bool:
+        """Append ``after`` to the chain unless it matches the latest version."""
+
+        chain = self._capabilities.setdefault(capability, [])
+        if not chain and before is not None:
+            baseline = {"object": store_object(self.objects, before), "change_id": None, "recorded_at": timestamp}
+            chain.append(baseline)
+            self._pending.append((capability, baseline))
+        digest = store_object(self.objects, after)
+        if chain and chain[-1]["object"] == digest:
+            return False
+        entry = {"object": digest, "change_id": change_id, "recorded_at": timestamp}
+        chain.append(entry)
+        self._pending.append((capability, entry))
+        return True
+
+    def resolve(self, capability: str, ref: str) -> Dict[str, Optional[str]]:
+        """Return the version written by change ``ref``, or the latest one at date/time ``ref``."""
+
+        chain = self._capabilities.get(capability, [])
+        for entry in reversed(chain):
+            if entry.get("change_id") == ref:
+                return entry
+        try:
+            moment = datetime.fromisoformat(ref)
+        except ValueError:
+            raise StateError(f"No version of '{capability}' for change or date '{ref}'") from None
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=timezone.utc)
+        if len(ref) == 10:  # a bare date includes the whole day
+            moment = moment.replace(hour=23, minute=59, second=59, microsecond=999999)
+        for entry in reversed(chain):
+            if datetime.fromisoformat(str(entry["recorded_at"])) <= moment:
+                return entry
+        raise StateError(f"'{capability}' has no recorded version at {ref}")
+
+    def text(self, entry: Dict[str, Optional[str]]) -> str:
+        return load_object(self.objects, str(entry["object"]))
+
+    def save(self) -> None:
+        """Append recorded versions to the file as it is now, under the state lock."""
+
+        if not self._pending:
+            return
+        with file_lock(self.path.parent / LOCKS_DIRNAME / f"{STATE_LOCK_NAME}.lock"):
+            fresh = type(self)(self.path, self.objects)._capabilities
+            for capability, entry in self._pending:
+                chain = fresh.setdefault(capability, [])
+                if entry["change_id"] is None and chain:
+                    continue
+                if chain and chain[-1]["object"] == entry["object"]:
+                    continue
+                chain.append(entry)
+            _replace_json(self.path, {"version": SPEC_HISTORY_VERSION, "capabilities": fresh})
+        self._capabilities = fresh
+        self._pending = []
+
+
+class RequirementHistory:
+    """Per-requirement lineage: every change that added, modified, renamed or removed it.
+
+    Stored in ``requirement_history.json`` keyed by requirement ID, so blaming a
+    requirement is a dictionary lookup rather than a scan of archived changes.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        data = _load_json(path, {})
+        if not isinstance(data, dict) or data.get("version") != REQUIREMENT_HISTORY_VERSION:
+            data = {}
+        self._requirements: Dict[str, List[Dict[str, str]]] = data.get("requirements") or {}
+        self._pending: List[Tuple[str, Dict[str, str]]] = []
+
+    @classmethod
+    def load(cls, flow_dir: Path, project: str) -> "RequirementHistory":
+        return cls(requirement_history_path(flow_dir, project))
+
+    def lineage(self, requirement_id: str) -> List[Dict[str, str]]:
+        return list(self._requirements.get(requirement_id, []))
+
+    def record(
+        self,
+        requirement_id: str,
+        operation: str,
+        title: str,
+        capability: str,
+        change_id: str,
+        timestamp: str,
+    ) -> None:
+        events = self._requirements.setdefault(requirement_id, [])
+        event = {
+            "operation": operation,
+            "title": title,
+            "capability": capability,
+            "change_id": change_id,
+            "recorded_at": timestamp,
+        }
+        if events and {**events[-1], "recorded_at": timestamp} == event:
+            return
+        events.append(event)
+        self._pending.append((requirement_id, event))
+
+    def save(self) -> None:
+        """Append recorded events to the file as it is now, under the state lock."""
+
+        if not self._pending:
+            return
+        with file_lock(self.path.parent / LOCKS_DIRNAME / f"{STATE_LOCK_NAME}.lock"):
+            fresh = type(self)(self.path)._requirements
+            for requirement_id, event in self._pending:
+                events = fresh.setdefault(requirement_id, [])
+                if events and {**events[-1], "recorded_at": event["recorded_at"]} == event:
+                    continue
+                events.append(event)
+            _replace_json(self.path, {"version": REQUIREMENT_HISTORY_VERSION, "requirements": fresh})
+        self._requirements = fresh
+        self._pending = []
@@ -0,0 +1,222 @@
+"""Traceability from requirement IDs and scenario tags to project source files.
+
+Tests reference a requirement by its ID (``expenses.capture.totals``) or a
+scenario by tag (``expenses.capture.totals#basic``, the scenario name
+slugified). The project tree is scanned in one pass with a single pattern that
+matches every dotted or tagged token; tokens are then resolved with set
+lookups, so the cost does not grow with the number of requirements. Per-file
+tokens are cached in ``state/trace_cache.json`` by stat and content hash, and
+only tokens whose first segment is a known ID prefix are kept.
+Single-word requirement IDs are only matched through scenario tags, since a
+bare word cannot be told apart from prose.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+from dataclasses import dataclass, field
+from fnmatch import fnmatch
+from pathlib import Path
+from stat import S_ISREG
+from typing import Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+from .state import (
+    SpecDocument,
+    canonical_capabilities,
+    canonical_spec_path,
+    load_spec_index,
+    read_canonical_spec,
+    slugify_identifier,
+    trace_cache_path,
+)
+
+TRACE_CACHE_VERSION = 1
+SCENARIO_HEADER = "#### Scenario:"
+SKIP_DIRS = {"node_modules", "__pycache__", "venv", "dist", "build", "target"}
+MAX_FILE_BYTES = 4 * 1024 * 1024
+
+_CANDIDATE_RE = re.compile(rb"(?<![\w.#-])[a-z0-9_-]++(?:[.#][a-z0-9_-]++)++(?![A-Z])")
+_SEGMENT_RE = re.compile(r"[.#]")
+
+
+@dataclass
+class TracedRequirement:
+    requirement_id: str
+    capability: str
+    title: str
+    scenarios: Dict[str, List[str]] = field(default_factory=dict)
+    files: List[str] = field(default_factory=list)
+
+    @property
+    def covered(self) -> bool:
+        return bool(self.files) or any(self.scenarios.values())
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "requirement_id": self.requirement_id,
+            "capability": self.capability,
+            "title": self.title,
+            "covered": self.covered,
+            "files": self.files,
+            "scenarios": self.scenarios,
+        }
+
+
+def scenario_tag(requirement_id: str, scenario: str) -> str:
+    return f"{requirement_id}#{slugify_identifier(scenario)}"
+
+
+def _prefix(token: str) -> str:
+    return _SEGMENT_RE.split(token, 1)[0]
+
+
+def iter_source_files(root: Path, include: Sequence[str] = (), skip: Sequence[Path] = ()) -> Iterator[Tuple[str, Path]]:
+    """Yield ``(relative posix path, path)`` for files under ``root``, skipping hidden and build directories."""
+
+    skipped = {path.resolve() for path in skip}
+    for current, dirs, files in os.walk(root):
+        base = Path(current)
+        dirs[:] = sorted(
+            name
+            for name in dirs
+            if not name.startswith(".") and name not in SKIP_DIRS and (base / name).resolve() not in skipped
+        )
+        for name in sorted(files):
+            path = base / name
+            rel = path.relative_to(root).as_posix()
+            if include and not any(fnmatch(rel, pattern) for pattern in include):
+                continue
+            yield rel, path
+
+
+class TraceCache:
+    """Known-prefix tokens per source file, reused while the file's hash is unchanged."""
+
+    def __init__(self, path: Path, root: Path, prefixes: Set[str], data: Optional[Dict] = None) -> None:
+        self.path = path
+        self.root = root
+        self.prefixes = prefixes
+        data = data or {}
+        usable = data.get("root") == str(root) and prefixes <= set(data.get("prefixes", []))
+        self.files: Dict[str, Dict] = data.get("files", {}) if usable else {}
+        self.dirty = not usable
+
+    @classmethod
+    def load(cls, flow_dir: Path, project: str, root: Path, prefixes: Set[str]) -> "TraceCache":
+        path = trace_cache_path(flow_dir, project)
+        data: Optional[Dict] = None
+        if path.exists():
+            try:
+                raw = json.loads(path.read_text(encoding="utf-8"))
+            except json.JSONDecodeError:
+                raw = None
+            if isinstance(raw, dict) and raw.get("version") == TRACE_CACHE_VERSION:
+                data = raw
+        return cls(path, root, prefixes, data)
+
+    def save(self) -> None:
+        if not self.dirty:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        payload = {
+            "version": TRACE_CACHE_VERSION,
+            "root": str(self.root),
+            "prefixes": sorted(self.prefixes),
+            "files": self.files,
+        }
+        self.path.write_text(json.dumps(payload, sort_keys=True) + "\n", encoding="utf-8")
+        self.dirty = False
+
+    def _scan(self, data: bytes) -> List[str]:
+        if b"\0" in data[:8192]:
+            return []
+        found = {token.decode("ascii") for token in _CANDIDATE_RE.findall(data)}
+        return sorted(token for token in found if _prefix(token) in self.prefixes)
+
+    def refresh(self, files: Sequence[Tuple[str, Path]]) -> int:
+        """Bring the cache in line with ``files``; return how many were rescanned.
+
+        Anything that is not a readable regular file (dangling symlinks,
+        sockets, files removed mid-walk) is left out of the cache.
+        """
+
+        seen = set()
+        rescanned = 0
+        for key, path in files:
+            try:
+                stat = path.stat()
+                if not S_ISREG(stat.st_mode):
+                    continue
+                entry = self.files.get(key)
+                if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+                    seen.add(key)
+                    continue
+                data = b"" if stat.st_size > MAX_FILE_BYTES else path.read_bytes()
+            except OSError:
+                continue
+            seen.add(key)
+            digest = hashlib.sha256(data).hexdigest()
+            if not (entry and entry["sha256"] == digest):
+                entry = {"sha256": digest, "tokens": self._scan(data)}
+                rescanned += 1
+            self.files[key] = {**entry, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+            self.dirty = True
+        for key in [key for key in self.files if key not in seen]:
+            del self.files[key]
+            self.dirty = True
+        return rescanned
+
+    def occurrences(self) -> Dict[str, List[str]]:
+        """Token -> files mentioning it."""
+
+        found: Dict[str, List[str]] = {}
+        for key, entry in sorted(self.files.items()):
+            for token in entry["tokens"]:
+                found.setdefault(token, []).append(key)
+        return found
+
+
+def traced_requirements(flow_dir: Path, project: str) -> List[TracedRequirement]:
+    """Every indexed canonical requirement with its scenario names, in spec order."""
+
+    spec_index = load_spec_index(flow_dir, project)
+    requirements: List[TracedRequirement] = []
+    for capability in canonical_capabilities(flow_dir, project):
+        document = SpecDocument.parse(read_canonical_spec(canonical_spec_path(flow_dir, project, capability)) or "")
+        for title in document.titles():
+            requirement_id = spec_index.find(capability, title)
+            if not requirement_id:
+                continue
+            scenarios = {
+                line[len(SCENARIO_HEADER) :].strip(): []
+                for line in document.block_text(title).splitlines()
+                if line.startswith(SCENARIO_HEADER)
+            }
+            requirements.append(TracedRequirement(requirement_id, capability, title, scenarios))
+    return requirements
+
+
+def trace_project(
+    flow_dir: Path,
+    project: str,
+    source: Path,
+    *,
+    include: Sequence[str] = (),
+) -> Tuple[List[TracedRequirement], int, int]:
+    """Link requirements to source files; return ``(requirements, files scanned, files rescanned)``."""
+
+    requirements = traced_requirements(flow_dir, project)
+    prefixes = {_prefix(item.requirement_id) for item in requirements}
+    cache = TraceCache.load(flow_dir, project, source, prefixes)
+    files = list(iter_source_files(source, include, skip=[flow_dir]))
+    rescanned = cache.refresh(files)
+    cache.save()
+
+    occurrences = cache.occurrences()
+    for item in requirements:
+        item.files = occurrences.get(item.requirement_id, [])
+        for scenario in item.scenarios:
+            item.scenarios[scenario] = occurrences.get(scenario_tag(item.requirement_id, scenario), [])
+    return requirements, len(cache.files), rescanned
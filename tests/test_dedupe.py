@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from flowm_cli.dedupe import DedupeIndex, Fingerprint, LSHIndex, load_lsh_index
+from flowm_cli.state import canonical_spec_path
+
+SCENARIO = "#### Scenario: Basic\n- **WHEN** an expense is saved\n- **THEN** it is listed\n"
+BODY = "Every expense SHALL record its amount, currency, merchant, date and category for monthly reporting."
+
+
+def _seed(tmp_path: Path) -> Path:
+    flow_dir = tmp_path / ".flow-maestro"
+    specs = {
+        "expenses": f"### Requirement: Record Expenses\nRequirement-ID: expenses.record\n{BODY}\n\n{SCENARIO}",
+        "reporting": (
+            f"### Requirement: Expense Fields\n{BODY}\n\n{SCENARIO}\n"
+            "### Requirement: Monthly Export\nEvery expense SHALL record its amount, currency, merchant, date and"
+            f" category for yearly reporting.\n\n{SCENARIO}\n"
+            "### Requirement: Budgets\nBudgets SHALL alert owners when spending passes the limit.\n"
+        ),
+    }
+    for capability, body in specs.items():
+        path = canonical_spec_path(flow_dir, "demo", capability)
+        path.parent.mkdir(parents=True)
+        path.write_text(f"# {capability.title()} Specification\n\n## Requirements\n\n{body}", encoding="utf-8")
+    return flow_dir
+
+
+def test_dedupe_finds_exact_and_near_duplicates(tmp_path: Path) -> None:
+    lsh = load_lsh_index(_seed(tmp_path), "demo")
+    (group,) = lsh.exact_groups()
+    assert sorted(item.title for item in group) == ["Expense Fields", "Record Expenses"]
+    near = {(a.title, b.title) for a, b, _ in lsh.near_pairs(0.6)}
+    assert near and all("Monthly Export" in pair for pair in near)
+    assert not any("Budgets" in pair for pair in near)
+
+    added = Fingerprint.from_body("payments", "Log Expenses", f"### Requirement: Log Expenses\n{BODY}\n\n{SCENARIO}")
+    assert {match.title for match, score in LSHIndex(lsh.fingerprints).matches(added) if score == 1.0} == {
+        "Expense Fields",
+        "Record Expenses",
+    }
+
+
+def test_dedupe_index_refingerprints_changed_specs_only(tmp_path: Path) -> None:
+    flow_dir = _seed(tmp_path)
+    index = DedupeIndex.load(flow_dir, "demo")
+    assert index.refresh(flow_dir, "demo") == 2
+    index.save()
+
+    reloaded = DedupeIndex.load(flow_dir, "demo")
+    assert reloaded.refresh(flow_dir, "demo") == 0
+    path = canonical_spec_path(flow_dir, "demo", "expenses")
+    path.write_text(path.read_text(encoding="utf-8").replace("monthly", "weekly"), encoding="utf-8")
+    assert reloaded.refresh(flow_dir, "demo") == 1
+    assert len(reloaded.fingerprints()) == 4
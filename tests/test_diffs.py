@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+from difflib import unified_diff
+
+import pytest
+
+from flowm_cli.diffs import apply_block_patch, block_opcodes, block_reverse_patch, spec_diff_lines
+
+
+def _spec(blocks: list[str]) -> str:
+    return "# Demo Specification\n\n## Requirements\n\n" + "".join(blocks)
+
+
+def _block(title: str, body: str) -> str:
+    return f"### Requirement: {title}\n{body}\n\n#### Scenario: Basic\n- **WHEN** used\n- **THEN** works\n\n"
+
+
+def test_block_diff_matches_difflib_for_localized_change() -> None:
+    blocks = [_block(f"Rule {idx}", f"Rule {idx} SHALL hold.") for idx in range(40)]
+    current = _spec(blocks)
+    blocks[17] = _block("Rule 17", "Rule 17 SHALL hold twice.")
+    updated = _spec(blocks) + "### Requirement: Added\nNew rule.\n"
+
+    lines = spec_diff_lines(current, updated, "canonical/demo", "preview/demo")
+    expected = list(
+        unified_diff(
+            current.splitlines(),
+            updated.splitlines(),
+            fromfile="canonical/demo",
+            tofile="preview/demo",
+            lineterm="",
+        )
+    )
+    assert lines == expected
+
+
+def test_block_opcodes_skip_unchanged_requirements() -> None:
+    a = _spec([_block("Keep", "Same."), _block("Drop", "Gone.")]).splitlines()
+    b = _spec([_block("Keep", "Same.")]).splitlines()
+    codes = block_opcodes(a, b)
+    assert codes[0] == ("equal", 0, len(b), 0, len(b))
+    assert codes[1][0] == "delete"
+    assert spec_diff_lines("plain\n", "plain\n", "a", "b") == []
+
+
+def test_block_opcodes_compare_block_contents_not_hashes(monkeypatch) -> None:
+    import builtins
+
+    monkeypatch.setattr(builtins, "hash", lambda value: 0)
+    a = _spec([_block("Keep", "Same."), _block("Edit", "Before.")]).splitlines()
+    b = _spec([_block("Keep", "Same."), _block("Edit", "After.")]).splitlines()
+    assert [code[0] for code in block_opcodes(a, b)] == ["equal", "replace", "equal"]
+
+
+
+def test_block_patches_refuse_duplicate_titles() -> None:
+    before = _spec([_block("Totals", "Totals SHALL add up."), _block("Export", "Export SHALL produce CSV.")])
+    after = _spec([_block("Totals", "Totals SHALL add up twice."), _block("Export", "Export SHALL produce CSV.")])
+    patch = block_reverse_patch(before, after)
+    assert apply_block_patch(after, patch) == before
+
+    repeated = after + _block("Totals", "A second Totals block.")
+    with pytest.raises(ValueError, match="appears more than once"):
+        apply_block_patch(repeated, patch)
+    refused = block_reverse_patch(before, repeated)
+    assert list(refused) == ["refused"]
+    with pytest.raises(ValueError, match="duplicate requirement title"):
+        apply_block_patch(repeated, refused)
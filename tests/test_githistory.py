@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import shutil
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from flowm_cli import githistory
+from flowm_cli.githistory import CatFileBatch, GitBlobCache, requirement_events
+from flowm_cli.state import StateError
+
+pytestmark = pytest.mark.skipif(shutil.which("git") is None, reason="git is not installed")
+
+HEADER = "# Expenses Specification\n\n## Requirements\n\n"
+TOTALS = "### Requirement: Totals\nTotals SHALL sum items.\n\n#### Scenario: Basic\n- **WHEN** an item is added\n- **THEN** {then}\n\n"
+CURRENCY = "### Requirement: Currency\nTotals SHALL use one currency.\n\n"
+
+
+def _commit(repo: Path, path: Path, text: str, message: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding="utf-8")
+    subprocess.run(["git", "add", "-A"], cwd=repo, check=True)
+    subprocess.run(
+        ["git", "-c", "user.name=dev", "-c", "user.email=dev@example.com", "commit", "-q", "-m", message],
+        cwd=repo,
+        check=True,
+    )
+
+
+def test_requirement_events_follow_commits_and_cache_blobs(tmp_path: Path) -> None:
+    subprocess.run(["git", "init", "-q"], cwd=tmp_path, check=True)
+    flow_dir = tmp_path / ".flow-maestro"
+    specs = flow_dir / "projects" / "demo" / "specs"
+    spec = specs / "expenses" / "spec.md"
+    _commit(tmp_path, spec, HEADER + TOTALS.format(then="totals update"), "add totals")
+    _commit(tmp_path, spec, HEADER + TOTALS.format(then="totals update") + CURRENCY, "add currency")
+    _commit(tmp_path, spec, HEADER + TOTALS.format(then="the total is recomputed"), "rework basic, drop currency")
+    (specs / "billing" / "spec.md").parent.mkdir()
+    _commit(tmp_path, specs / "billing" / "spec.md", HEADER + CURRENCY, "billing currency")
+
+    cache = GitBlobCache.load(flow_dir, "demo")
+    events = requirement_events(specs, cache, "expenses")
+    assert [(event.subject, event.title, event.operation, event.scenarios) for event in events] == [
+        ("add totals", "Totals", "ADDED", ["Basic"]),
+        ("add currency", "Currency", "ADDED", []),
+        ("rework basic, drop currency", "Totals", "MODIFIED", ["Basic"]),
+        ("rework basic, drop currency", "Currency", "REMOVED", []),
+    ]
+    assert len(GitBlobCache.load(flow_dir, "demo").blobs) == 3
+
+    everything = requirement_events(specs, GitBlobCache.load(flow_dir, "demo"))
+    assert {event.capability for event in everything} == {"expenses", "billing"}
+
+
+def test_requirement_events_report_missing_specs_and_reap_git_log(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    subprocess.run(["git", "init", "-q"], cwd=tmp_path, check=True)
+    flow_dir = tmp_path / ".flow-maestro"
+    specs = flow_dir / "projects" / "demo" / "specs"
+    with pytest.raises(StateError, match="No canonical specs"):
+        requirement_events(specs, GitBlobCache.load(flow_dir, "demo"))
+
+    _commit(tmp_path, specs / "expenses" / "spec.md", HEADER + CURRENCY, "add currency")
+    started: list[subprocess.Popen] = []
+    popen = subprocess.Popen
+
+    def tracking_popen(*args, **kwargs) -> subprocess.Popen:
+        process = popen(*args, **kwargs)
+        started.append(process)
+        return process
+
+    def failing_read(self, obj: str) -> bytes:
+        raise StateError(f"git cat-file could not read {obj}")
+
+    monkeypatch.setattr(githistory.subprocess, "Popen", tracking_popen)
+    monkeypatch.setattr(CatFileBatch, "read", failing_read)
+    with pytest.raises(StateError, match="could not read"):
+        requirement_events(specs, GitBlobCache.load(flow_dir, "demo"))
+    assert started and all(process.returncode is not None for process in started)
@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+from flowm_cli import refactor as refactor_module
+from flowm_cli.refactor import RefactorError, apply_refactor, load_refactor_map, plan_refactor
+from flowm_cli.references import ReferenceGraph, update_reference_graph
+from flowm_cli.state import (
+    RequirementHistory,
+    SpecHistory,
+    canonical_spec_path,
+    change_dir,
+    load_spec_index,
+    save_spec_index,
+)
+
+
+def _block(title: str) -> str:
+    return f"### Requirement: {title}\n{title} SHALL hold.\n\n#### Scenario: Basic\n- **WHEN** used\n- **THEN** works\n\n"
+
+
+def _seed(tmp_path: Path) -> Path:
+    flow_dir = tmp_path / ".flow-maestro"
+    specs = {
+        "billing": ["Invoice Numbers", "Refunds"],
+        "expenses": ["Capture Totals"],
+        "budgets": ["Monthly Limits"],
+        "budgets/reviews": ["Quarterly Reviews"],
+    }
+    index = {}
+    for capability, titles in specs.items():
+        path = canonical_spec_path(flow_dir, "demo", capability)
+        path.parent.mkdir(parents=True)
+        path.write_text(f"# {capability.title()} Specification\n\n## Requirements\n\n" + "".join(map(_block, titles)))
+        for title in titles:
+            index[f"{capability}.{title.lower().replace(' ', '-')}"] = {"capability": capability, "title": title}
+    save_spec_index(flow_dir, "demo", index)
+    delta = change_dir(flow_dir, "demo", "chg-a") / "specs" / "expenses" / "spec.md"
+    delta.parent.mkdir(parents=True)
+    delta.write_text("## ADDED Requirements\n" + _block("Receipts"))
+    (tmp_path / "map.toml").write_text(
+        '[rename]\nexpenses = "spending"\n\n'
+        '[[merge]]\ninto = "planning"\nfrom = ["budgets"]\n\n'
+        '[[split]]\nfrom = "billing"\n[split.into]\nrefunds = ["Refunds"]\n'
+    )
+    return flow_dir
+
+
+def test_refactor_applies_renames_merges_and_splits(tmp_path: Path) -> None:
+    flow_dir = _seed(tmp_path)
+    update_reference_graph(flow_dir, "demo")
+    plan = plan_refactor(flow_dir, "demo", load_refactor_map(tmp_path / "map.toml"))
+    apply_refactor(flow_dir, "demo", plan)
+
+    assert not canonical_spec_path(flow_dir, "demo", "expenses").exists()
+    assert not canonical_spec_path(flow_dir, "demo", "budgets").exists()
+    assert "Quarterly Reviews" in canonical_spec_path(flow_dir, "demo", "budgets/reviews").read_text()
+    assert "Monthly Limits" in canonical_spec_path(flow_dir, "demo", "planning").read_text()
+    billing = canonical_spec_path(flow_dir, "demo", "billing").read_text()
+    assert "Refunds" not in billing and "Invoice Numbers" in billing
+    assert "Refunds" in canonical_spec_path(flow_dir, "demo", "refunds").read_text()
+    assert (change_dir(flow_dir, "demo", "chg-a") / "specs" / "spending" / "spec.md").exists()
+
+    index = load_spec_index(flow_dir, "demo")
+    assert index.ids_for("spending") == ["expenses.capture-totals"]
+    assert index.find("refunds", "Refunds") == "billing.refunds"
+    assert index.find("planning", "Monthly Limits") == "budgets.monthly-limits"
+    assert index.ids_for("budgets/reviews") == ["budgets/reviews.quarterly-reviews"]
+
+    history = SpecHistory.load(flow_dir, "demo")
+    assert [entry["change_id"] for entry in history.versions("billing")] == [None, "refactor"]
+    assert [entry["change_id"] for entry in history.versions("spending")] == ["refactor"]
+    assert history.versions("planning") and history.versions("refunds")
+    lineage = RequirementHistory.load(flow_dir, "demo")
+    assert [(event["operation"], event["capability"]) for event in lineage.lineage("billing.refunds")] == [
+        ("MOVED", "refunds")
+    ]
+    assert lineage.lineage("billing.invoice-numbers") == []
+    graph = ReferenceGraph.load(flow_dir, "demo")
+    assert set(graph.capabilities) == {"billing", "budgets/reviews", "planning", "refunds", "spending"}
+
+
+def test_refactor_rejects_conflicts_and_rolls_back(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    flow_dir = _seed(tmp_path)
+    clash = tmp_path / "clash.toml"
+    clash.write_text('[rename]\nexpenses = "billing"\n\n[[merge]]\ninto = "billing"\nfrom = ["missing"]\n')
+    with pytest.raises(RefactorError) as excinfo:
+        plan_refactor(flow_dir, "demo", load_refactor_map(clash))
+    assert "capability 'billing' already exists" in str(excinfo.value)
+    assert "'missing' not found" in str(excinfo.value)
+
+    before = {
+        path: path.read_text() for path in (flow_dir / "projects" / "demo").rglob("*") if path.is_file()
+    }
+    plan = plan_refactor(flow_dir, "demo", load_refactor_map(tmp_path / "map.toml"))
+
+    def fail(*_args, **_kwargs) -> None:
+        raise OSError("disk full")
+
+    monkeypatch.setattr(refactor_module, "save_spec_index", fail)
+    with pytest.raises(RefactorError, match="rolled back"):
+        apply_refactor(flow_dir, "demo", plan)
+    after = {
+        path: path.read_text() for path in (flow_dir / "projects" / "demo").rglob("*") if path.is_file()
+    }
+    assert after == before
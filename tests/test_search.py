@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from flowm_cli.search import SearchIndex, iter_documents, search_project
+from flowm_cli.state import canonical_spec_path, change_dir, save_spec_index
+
+
+def _seed(tmp_path: Path) -> Path:
+    flow_dir = tmp_path / ".flow-maestro"
+    canonical = canonical_spec_path(flow_dir, "demo", "expenses")
+    canonical.parent.mkdir(parents=True)
+    canonical.write_text(
+        "# Expenses Specification\n\n## Requirements\n\n"
+        "### Requirement: Capture Totals\nTotals SHALL reflect all receipts.\n\n"
+        "### Requirement: Export\nExports SHALL be CSV files.\n",
+        encoding="utf-8",
+    )
+    save_spec_index(flow_dir, "demo", {"expenses.export": {"capability": "expenses", "title": "Export"}})
+    change = change_dir(flow_dir, "demo", "chg-a")
+    (change / "notes").mkdir(parents=True)
+    (change / "notes" / "research.md").write_text(
+        "# Research\n\n## Exporters\nThe legacy exporter writes CSV with a BOM.\n", encoding="utf-8"
+    )
+    return flow_dir
+
+
+def test_search_ranks_requirement_blocks(tmp_path: Path) -> None:
+    flow_dir = _seed(tmp_path)
+    hits = search_project(flow_dir, "demo", "csv export")
+    assert [hit.title for hit in hits] == ["Export", "Exporters"]
+    assert hits[0].requirement_id == "expenses.export"
+    assert hits[0].snippet == "Exports SHALL be CSV files."
+    assert hits[0].line == 9
+    assert hits[1].change == "chg-a" and hits[1].kind == "change"
+    assert search_project(flow_dir, "demo", "csv", kind="canonical")[0].path == "specs/expenses/spec.md"
+
+
+def test_search_index_refreshes_changed_files_only(tmp_path: Path) -> None:
+    flow_dir = _seed(tmp_path)
+    index = SearchIndex.load(flow_dir, "demo")
+    assert index.refresh(list(iter_documents(flow_dir, "demo"))) == 2
+    index.save()
+
+    index = SearchIndex.load(flow_dir, "demo")
+    assert index.refresh(list(iter_documents(flow_dir, "demo"))) == 0
+    research = change_dir(flow_dir, "demo", "chg-a") / "notes" / "research.md"
+    research.write_text("# Research\n\nNothing about files here.\n", encoding="utf-8")
+    assert index.refresh(list(iter_documents(flow_dir, "demo"))) == 1
+    assert "bom" not in index.postings
+    assert [(path, unit) for path, unit, _ in index.query("csv")] == [("specs/expenses/spec.md", 2)]
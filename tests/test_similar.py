@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+from typer.testing import CliRunner
+
+from flowm_cli import similar as similar_module
+from flowm_cli.similar import SimilarityIndex, SimilarityUnavailable, load_similarity_index, requirement_terms
+from flowm_cli.specs import specs_app
+from flowm_cli.state import canonical_spec_path, change_dir, save_projects, similarity_dir
+
+SPECS = {
+    "expenses": (
+        "### Requirement: Record Expenses\nRequirement-ID: expenses.record\n"
+        "Every expense SHALL record its amount, currency and merchant.\n\n"
+        "### Requirement: Monthly Totals\nTotals SHALL be summed per month and category.\n"
+    ),
+    "billing": "### Requirement: Invoice Numbers\nInvoices SHALL be numbered sequentially without gaps.\n",
+}
+
+
+def _write(flow_dir: Path, capability: str, body: str) -> None:
+    path = canonical_spec_path(flow_dir, "demo", capability)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(f"# {capability.title()} Specification\n\n## Requirements\n\n{body}", encoding="utf-8")
+
+
+def test_similar_ranks_nearest_requirements_and_refreshes_per_capability(tmp_path: Path) -> None:
+    pytest.importorskip("numpy")
+    flow_dir = tmp_path / ".flow-maestro"
+    for capability, body in SPECS.items():
+        _write(flow_dir, capability, body)
+
+    index = load_similarity_index(flow_dir, "demo")
+    matches = index.query(requirement_terms("Log Expenses", "Each expense SHALL record amount and merchant."))
+    assert (matches[0].capability, matches[0].title) == ("expenses", "Record Expenses")
+    assert matches[0].score > matches[-1].score
+    assert index.query(requirement_terms("", "unrelated words entirely")) == []
+    excluded = index.query(requirement_terms("Invoice Numbers", "numbered invoices"), exclude=("billing", "Invoice Numbers"))
+    assert all(match.title != "Invoice Numbers" for match in excluded)
+
+    _write(flow_dir, "billing", "### Requirement: Refunds\nRefunds SHALL reference the original invoice.\n")
+    reloaded = SimilarityIndex.load(flow_dir, "demo")
+    assert reloaded.refresh(flow_dir, "demo") == 1
+    assert reloaded.df[reloaded.terms["sequentially"]] == 0
+    assert reloaded.df[reloaded.terms["shall"]] == 3
+    assert reloaded.query(requirement_terms("", "refund an invoice"))[0].title == "Refunds"
+
+
+def test_without_numpy_similarity_is_unavailable_and_prepare_still_succeeds(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(similar_module, "np", None)
+    flow_dir = tmp_path / ".flow-maestro"
+    for capability, body in SPECS.items():
+        _write(flow_dir, capability, body)
+    with pytest.raises(SimilarityUnavailable, match="flowm-cli\\[similarity\\]"):
+        load_similarity_index(flow_dir, "demo")
+
+    save_projects(flow_dir, {"demo": {}})
+    delta = change_dir(flow_dir, "demo", "chg-log") / "specs" / "expenses" / "spec.md"
+    delta.parent.mkdir(parents=True)
+    delta.write_text(
+        "## ADDED Requirements\n### Requirement: Log Expenses\nEach expense SHALL record amount and merchant.\n\n"
+        "#### Scenario: Log\n- **WHEN** an expense is logged\n- **THEN** it is stored\n",
+        encoding="utf-8",
+    )
+    monkeypatch.chdir(tmp_path)
+    runner = CliRunner()
+    result = runner.invoke(specs_app, ["prepare", "chg-log", "-p", "demo", "--similar", "3"])
+    assert result.exit_code == 0, result.output
+    assert "pip install" in result.output and "Prepared 1 capability" in result.output
+    result = runner.invoke(specs_app, ["prepare", "chg-log", "-p", "demo", "--full"])
+    assert result.exit_code == 0, result.output
+    assert "pip install" not in result.output
+    assert not similarity_dir(flow_dir, "demo").exists()
@@ -4,8 +4,11 @@ from pathlib import Path
 
 import importlib
 
+import pytest
+
 SPEC_MODULE = importlib.import_module("flowm_cli.specs")
 STATE_MODULE = importlib.import_module("flowm_cli.state")
+REFERENCES_MODULE = importlib.import_module("flowm_cli.references")
 
 
 def _seed_change(tmp_path: Path) -> tuple[Path, str, str]:
@@ -75,3 +78,436 @@ def test_prepare_and_merge_roundtrip(tmp_path: Path) -> None:
     assert canonical.exists()
     spec_index_data = STATE_MODULE.load_spec_index(flow_dir, project)
     assert "expenses.capture.totals" in spec_index_data
+
+
+def test_gather_reports_validation_errors_once(tmp_path: Path) -> None:
+    flow_dir, project, change = _seed_change(tmp_path)
+    delta_path = STATE_MODULE.change_dir(flow_dir, project, change) / "specs" / "expenses" / "spec.md"
+    delta_path.write_text(
+        "## ADDED Requirements\n### Requirement: No Scenario\nBody only.\n",
+        encoding="utf-8",
+    )
+    try:
+        SPEC_MODULE._gather_capability_contexts(flow_dir, project, change)
+    except SPEC_MODULE.SpecCommandError as exc:
+        message = str(exc)
+    else:  # pragma: no cover - defensive
+        raise AssertionError("expected validation failure")
+    assert message == "expenses: Requirement 'No Scenario' missing scenario in ADDED"
+
+
+def _prepare(flow_dir: Path, project: str, change: str) -> dict:
+    reused = SPEC_MODULE._reusable_manifest_entries(flow_dir, project, change, write_diffs=True)
+    contexts = SPEC_MODULE._gather_capability_contexts(flow_dir, project, change, skip=set(reused))
+    manifest = SPEC_MODULE._build_manifest(
+        flow_dir,
+        project,
+        change,
+        contexts,
+        STATE_MODULE.load_spec_index(flow_dir, project),
+        write_diffs=True,
+        reused=reused,
+    )
+    SPEC_MODULE._write_manifest(STATE_MODULE.spec_manifest_path(flow_dir, project, change), manifest)
+    SPEC_MODULE._write_plan(flow_dir, project, change, contexts, manifest)
+    return manifest
+
+
+def test_prepare_recomputes_only_changed_capabilities(tmp_path: Path) -> None:
+    flow_dir, project, change = _seed_change(tmp_path)
+    billing = STATE_MODULE.change_dir(flow_dir, project, change) / "specs" / "billing"
+    billing.mkdir()
+    (billing / "spec.md").write_text(
+        "## ADDED Requirements\n### Requirement: Invoice Numbers\nInvoices SHALL be numbered.\n\n"
+        "#### Scenario: Sequence\n- **WHEN** issued\n- **THEN** numbered\n",
+        encoding="utf-8",
+    )
+
+    first = _prepare(flow_dir, project, change)
+    assert first["stats"]["recomputed"] == 2
+
+    second = _prepare(flow_dir, project, change)
+    assert second["stats"]["recomputed"] == 0
+    assert second["capabilities"] == first["capabilities"]
+
+    canonical = STATE_MODULE.canonical_spec_path(flow_dir, project, "expenses")
+    canonical.parent.mkdir(parents=True)
+    canonical.write_text("# Expenses Specification\n\n## Requirements\n", encoding="utf-8")
+    third = _prepare(flow_dir, project, change)
+    assert third["stats"]["recomputed"] == 1
+    assert [entry["capability"] for entry in third["capabilities"]] == ["billing", "expenses"]
+    assert third["capabilities"][1]["would_create"] is False
+
+
+def test_merge_from_plan_checks_preconditions(tmp_path: Path) -> None:
+    flow_dir, project, change = _seed_change(tmp_path)
+    _prepare(flow_dir, project, change)
+    manifest, targets = SPEC_MODULE._load_plan_targets(flow_dir, project, change)
+    assert [target.name for target in targets] == ["expenses"]
+
+    canonical = STATE_MODULE.canonical_spec_path(flow_dir, project, "expenses")
+    canonical.parent.mkdir(parents=True)
+    canonical.write_text("# Expenses Specification\n\n## Requirements\n", encoding="utf-8")
+    with pytest.raises(SPEC_MODULE.SpecCommandError, match="canonical spec changed"):
+        SPEC_MODULE._load_plan_targets(flow_dir, project, change)
+
+    canonical.unlink()
+    spec_index = STATE_MODULE.load_spec_index(flow_dir, project)
+    SPEC_MODULE._write_merge_targets(
+        flow_dir, project, change, targets, manifest, spec_index, dry_run=False
+    )
+    preview = targets[0].preview_path
+    assert canonical.read_text(encoding="utf-8") == preview.read_text(encoding="utf-8")
+    assert "expenses.capture.totals" in STATE_MODULE.load_spec_index(flow_dir, project)
+
+
+def test_parallel_prepare_matches_sequential(tmp_path: Path) -> None:
+    flow_dir, project, change = _seed_change(tmp_path)
+    specs_root = STATE_MODULE.change_dir(flow_dir, project, change) / "specs"
+    for name in ("alpha", "beta", "gamma"):
+        (specs_root / name).mkdir()
+        (specs_root / name / "spec.md").write_text(
+            "## ADDED Requirements\n### Requirement: Shared\nRequirement-ID: shared.rule\nBody.\n\n"
+            "#### Scenario: Works\n- **WHEN** used\n- **THEN** works\n",
+            encoding="utf-8",
+        )
+
+    def build(jobs: int) -> list:
+        contexts = SPEC_MODULE._gather_capability_contexts(flow_dir, project, change, jobs=jobs)
+        manifest = SPEC_MODULE._build_manifest(
+            flow_dir, project, change, contexts, {}, write_diffs=True, jobs=jobs
+        )
+        return manifest["capabilities"]
+
+    sequential = build(1)
+    parallel = build(2)
+    assert parallel == sequential
+    ids = [
+        entry["requirements"][0]["requirement_id"]
+        for entry in parallel
+        if entry["capability"] in {"alpha", "beta", "gamma"}
+    ]
+    assert ids == ["shared.rule", "shared.rule-2", "shared.rule-3"]
+    assert all(entry["diff_path"] == f"specs/{entry['capability']}/merge.diff" for entry in parallel)
+
+    # Workers write their diff and hand back only its path.
+    (ctx,) = SPEC_MODULE._gather_capability_contexts(flow_dir, project, change, skip={"alpha", "beta", "gamma"})
+    written, digest = SPEC_MODULE._diff_job(ctx)
+    assert written == str(specs_root / "expenses" / "merge.diff")
+    assert "+### Requirement: Capture Totals" in Path(written).read_text(encoding="utf-8")
+    assert digest == STATE_MODULE.file_sha256(Path(written))
+
+
+def _write_delta(flow_dir: Path, project: str, change: str, capability: str, text: str) -> None:
+    path = STATE_MODULE.change_dir(flow_dir, project, change) / "specs" / capability / "spec.md"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text, encoding="utf-8")
+
+
+def test_merge_queue_applies_changes_in_order_and_detects_conflicts(tmp_path: Path) -> None:
+    flow_dir, project, first = _seed_change(tmp_path)
+    second = "chg-expenses-followup"
+    _write_delta(
+        flow_dir,
+        project,
+        second,
+        "expenses",
+        "## ADDED Requirements\n### Requirement: Export Totals\nTotals SHALL export to CSV.\n\n"
+        "#### Scenario: Export\n- **WHEN** exported\n- **THEN** CSV is produced\n",
+    )
+
+    contexts, targets = SPEC_MODULE._gather_queue_contexts(flow_dir, project, [first, second], ".queue-a")
+    assert list(targets) == ["expenses"]
+    # A concurrent run stages into its own directory and leaves this one intact.
+    SPEC_MODULE._gather_queue_contexts(flow_dir, project, [first], ".queue-b")
+    assert targets["expenses"].preview_path.exists()
+    SPEC_MODULE._discard_staging(flow_dir, project, ".queue-b")
+    final = targets["expenses"].read_updated()
+    assert final.index("Capture Totals") < final.index("Export Totals")
+    assert contexts[first][0].would_create is True
+    assert contexts[second][0].would_create is False
+    assert contexts[second][0].current_text == contexts[first][0].updated_text
+
+    third = "chg-expenses-rewrite"
+    _write_delta(
+        flow_dir,
+        project,
+        third,
+        "expenses",
+        "## MODIFIED Requirements\n### Requirement: Export Totals\nTotals SHALL export to XLSX.\n\n"
+        "#### Scenario: Export\n- **WHEN** exported\n- **THEN** XLSX is produced\n",
+    )
+    with pytest.raises(SPEC_MODULE.SpecCommandError, match="conflict: expenses 'Export Totals'"):
+        SPEC_MODULE._gather_queue_contexts(flow_dir, project, [first, second, third], ".queue-c")
+
+
+def test_nested_capabilities_prepare_merge_and_queue(tmp_path: Path) -> None:
+    flow_dir, project, first = _seed_change(tmp_path)
+    nested = "billing/invoices"
+    _write_delta(
+        flow_dir,
+        project,
+        first,
+        nested,
+        "## ADDED Requirements\n### Requirement: Invoice Numbers\nInvoices SHALL be numbered.\n\n"
+        "#### Scenario: Sequence\n- **WHEN** issued\n- **THEN** numbered\n",
+    )
+    manifest = _prepare(flow_dir, project, first)
+    assert {entry["capability"] for entry in manifest["capabilities"]} == {"expenses", nested}
+    contexts = SPEC_MODULE._gather_capability_contexts(flow_dir, project, first)
+    spec_index = STATE_MODULE.load_spec_index(flow_dir, project)
+    SPEC_MODULE._perform_merge(flow_dir, project, first, contexts, manifest, spec_index, dry_run=False)
+    canonical = STATE_MODULE.canonical_spec_path(flow_dir, project, nested)
+    assert "Invoice Numbers" in canonical.read_text(encoding="utf-8")
+
+    second = "chg-invoices"
+    _write_delta(
+        flow_dir,
+        project,
+        second,
+        nested,
+        "## ADDED Requirements\n### Requirement: Credit Notes\nCredit notes SHALL reference an invoice.\n\n"
+        "#### Scenario: Reference\n- **WHEN** issued\n- **THEN** linked\n",
+    )
+    contexts, targets = SPEC_MODULE._gather_queue_contexts(flow_dir, project, [second], ".queue-nested")
+    assert "Credit Notes" in targets[nested].read_updated()
+    assert contexts[second][0].current_text == canonical.read_text(encoding="utf-8")
+
+
+def test_touch_index_reports_overlaps_incrementally(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    flow_dir, project, first = _seed_change(tmp_path)
+    _write_delta(
+        flow_dir,
+        project,
+        "chg-other",
+        "expenses",
+        "## REMOVED Requirements\n### Requirement: Capture Totals\n",
+    )
+    touches = SPEC_MODULE._refresh_touch_index(flow_dir, project)
+    owners = touches[("expenses", "Capture Totals")]
+    assert [(owner["change_id"], owner["operation"]) for owner in owners] == [
+        ("chg-expenses", "ADDED"),
+        ("chg-other", "REMOVED"),
+    ]
+    assert owners[0]["requirement_id"] == "expenses.capture.totals"
+
+    def fail_lookup(self, path):  # pragma: no cover - must not run
+        raise AssertionError(f"re-parsed {path}")
+
+    monkeypatch.setattr(STATE_MODULE.DeltaCache, "lookup", fail_lookup)
+    assert SPEC_MODULE._refresh_touch_index(flow_dir, project) == touches
+
+
+def test_rename_then_modify_keeps_requirement_id(tmp_path: Path) -> None:
+    flow_dir, project, first = _seed_change(tmp_path)
+    manifest = _prepare(flow_dir, project, first)
+    contexts = SPEC_MODULE._gather_capability_contexts(flow_dir, project, first)
+    spec_index = STATE_MODULE.load_spec_index(flow_dir, project)
+    SPEC_MODULE._perform_merge(flow_dir, project, first, contexts, manifest, spec_index, dry_run=False)
+
+    second = "chg-rename"
+    _write_delta(
+        flow_dir,
+        project,
+        second,
+        "expenses",
+        "## RENAMED Requirements\n- FROM: `### Requirement: Capture Totals`\n"
+        "- TO: `### Requirement: Running Totals`\n\n"
+        "## MODIFIED Requirements\n### Requirement: Running Totals\n"
+        "Totals SHALL reflect all items as they are added.\n\n"
+        "#### Scenario: Basic\n- **WHEN** an item is added\n- **THEN** totals update\n",
+    )
+    manifest = _prepare(flow_dir, project, second)
+    (requirement,) = manifest["capabilities"][0]["requirements"]
+    assert requirement["requirement_id"] == "expenses.capture.totals"
+
+    contexts = SPEC_MODULE._gather_capability_contexts(flow_dir, project, second)
+    spec_index = STATE_MODULE.load_spec_index(flow_dir, project)
+    SPEC_MODULE._perform_merge(flow_dir, project, second, contexts, manifest, spec_index, dry_run=False)
+    reloaded = STATE_MODULE.load_spec_index(flow_dir, project)
+    assert reloaded.find("expenses", "Running Totals") == "expenses.capture.totals"
+    assert reloaded.find("expenses", "Capture Totals") is None
+    lineage = STATE_MODULE.RequirementHistory.load(flow_dir, project).lineage("expenses.capture.totals")
+    assert [(event["operation"], event["change_id"]) for event in lineage] == [
+        ("ADDED", first),
+        ("RENAMED", second),
+        ("MODIFIED", second),
+    ]
+
+
+def test_reindex_recovers_ids_from_merged_manifests(tmp_path: Path) -> None:
+    flow_dir, project, change = _seed_change(tmp_path)
+    _write_delta(
+        flow_dir,
+        project,
+        change,
+        "billing",
+        "## ADDED Requirements\n### Requirement: Invoice Numbers\nInvoices SHALL be numbered.\n\n"
+        "#### Scenario: Sequence\n- **WHEN** issued\n- **THEN** numbered\n",
+    )
+    manifest = _prepare(flow_dir, project, change)
+    contexts = SPEC_MODULE._gather_capability_contexts(flow_dir, project, change)
+    spec_index = STATE_MODULE.load_spec_index(flow_dir, project)
+    results = SPEC_MODULE._perform_merge(flow_dir, project, change, contexts, manifest, spec_index, dry_run=False)
+    SPEC_MODULE._write_merge_report(
+        STATE_MODULE.spec_merge_report_path(flow_dir, project, change),
+        project,
+        change,
+        results,
+        dry_run=False,
+        finalized=False,
+    )
+    original = STATE_MODULE.load_spec_index(flow_dir, project)
+
+    # Simulate an index entry that drifted from the canonical spec.
+    original["billing.invoice-numbers"]["title"] = "Invoice Numbers (old)"
+    rebuilt = SPEC_MODULE._rebuild_spec_index(flow_dir, project, STATE_MODULE.SpecIndex(), jobs=2)
+    assert sorted(rebuilt) == ["billing.invoice-numbers", "expenses.capture.totals"]
+    assert rebuilt["billing.invoice-numbers"]["change_id"] == change
+    assert SPEC_MODULE._index_drift(original, rebuilt) == [
+        "moved: billing.invoice-numbers billing / Invoice Numbers (old) → billing / Invoice Numbers"
+    ]
+
+
+def test_unmerge_restores_specs_and_refuses_overlaps(tmp_path: Path) -> None:
+    flow_dir, project, first = _seed_change(tmp_path)
+
+    def merge(change: str) -> None:
+        manifest = _prepare(flow_dir, project, change)
+        contexts = SPEC_MODULE._gather_capability_contexts(flow_dir, project, change)
+        spec_index = STATE_MODULE.load_spec_index(flow_dir, project)
+        results = SPEC_MODULE._perform_merge(flow_dir, project, change, contexts, manifest, spec_index, dry_run=False)
+        SPEC_MODULE._write_merge_report(
+            STATE_MODULE.spec_merge_report_path(flow_dir, project, change),
+            project,
+            change,
+            results,
+            dry_run=False,
+            finalized=False,
+        )
+
+    merge(first)
+    canonical = STATE_MODULE.canonical_spec_path(flow_dir, project, "expenses")
+    baseline = canonical.read_text(encoding="utf-8")
+
+    second = "chg-modify"
+    _write_delta(
+        flow_dir,
+        project,
+        second,
+        "expenses",
+        "## MODIFIED Requirements\n### Requirement: Capture Totals\n"
+        "Totals SHALL reflect all items, including refunds.\n\n"
+        "#### Scenario: Basic\n- **WHEN** an item is added\n- **THEN** totals update\n\n"
+        "## ADDED Requirements\n### Requirement: Currency\nTotals SHALL use one currency.\n\n"
+        "#### Scenario: Mixed\n- **WHEN** currencies differ\n- **THEN** conversion applies\n",
+    )
+    merge(second)
+    assert "including refunds" in canonical.read_text(encoding="utf-8")
+
+    with pytest.raises(SPEC_MODULE.SpecCommandError, match="changed later by chg-modify"):
+        SPEC_MODULE._unmerge_change(flow_dir, project, first, dry_run=False)
+
+    SPEC_MODULE._unmerge_change(flow_dir, project, second, dry_run=False)
+    assert canonical.read_text(encoding="utf-8") == baseline
+    spec_index = STATE_MODULE.load_spec_index(flow_dir, project)
+    assert spec_index.find("expenses", "Currency") is None
+    assert spec_index["expenses.capture.totals"]["change_id"] == first
+    with pytest.raises(SPEC_MODULE.SpecCommandError, match="already unmerged"):
+        SPEC_MODULE._unmerge_change(flow_dir, project, second, dry_run=False)
+    nested = STATE_MODULE.canonical_spec_path(flow_dir, project, "expenses/archive")
+    nested.parent.mkdir(parents=True)
+    nested.write_text("# Archive\n\n## Requirements\n", encoding="utf-8")
+    SPEC_MODULE._unmerge_change(flow_dir, project, first, dry_run=False)
+    assert not canonical.exists()
+    assert nested.exists()
+
+
+def test_merge_pipeline_stages_to_disk_and_writes_nothing_on_failure(tmp_path: Path) -> None:
+    flow_dir, project, change = _seed_change(tmp_path)
+    contexts = SPEC_MODULE._gather_capability_contexts(flow_dir, project, change)
+    (ctx,) = contexts
+    assert {"current_text", "updated_text"}.isdisjoint(vars(ctx))
+    assert ctx.staged_path.exists() and "Capture Totals" in ctx.updated_text
+    assert ctx.would_create and ctx.changed and ctx.base_path is None
+
+    _write_delta(
+        flow_dir,
+        project,
+        change,
+        "billing",
+        "## MODIFIED Requirements\n### Requirement: Missing\nIt SHALL fail.\n\n"
+        "#### Scenario: Basic\n- **WHEN** merged\n- **THEN** rejected\n",
+    )
+    with pytest.raises(SPEC_MODULE.SpecCommandError, match="billing"):
+        SPEC_MODULE._gather_capability_contexts(flow_dir, project, change, jobs=2)
+    state_dir = STATE_MODULE.project_state_dir(flow_dir, project)
+    assert not (state_dir / SPEC_MODULE.STAGING_DIRNAME).exists()
+    assert not STATE_MODULE.canonical_spec_path(flow_dir, project, "expenses").exists()
+
+
+def test_merge_rebases_on_concurrent_writes_and_rejects_overlaps(tmp_path: Path) -> None:
+    flow_dir, project, first = _seed_change(tmp_path)
+    manifest = _prepare(flow_dir, project, first)
+    contexts = SPEC_MODULE._gather_capability_contexts(flow_dir, project, first)
+    spec_index = STATE_MODULE.load_spec_index(flow_dir, project)
+    SPEC_MODULE._perform_merge(flow_dir, project, first, contexts, manifest, spec_index, dry_run=False)
+
+    def stage(change: str, delta: str):
+        _write_delta(flow_dir, project, change, "expenses", delta)
+        manifest = _prepare(flow_dir, project, change)
+        contexts = SPEC_MODULE._gather_capability_contexts(flow_dir, project, change)
+        return manifest, contexts, STATE_MODULE.load_spec_index(flow_dir, project)
+
+    scenario = "#### Scenario: Basic\n- **WHEN** used\n- **THEN** works\n"
+    # Both changes read the same canonical spec before either writes.
+    currency = stage("chg-currency", f"## ADDED Requirements\n### Requirement: Currency\nOne currency SHALL apply.\n\n{scenario}")
+    receipts = stage("chg-receipts", f"## ADDED Requirements\n### Requirement: Receipts\nReceipts SHALL attach.\n\n{scenario}")
+    SPEC_MODULE._perform_merge(flow_dir, project, "chg-currency", currency[1], currency[0], currency[2], dry_run=False)
+    SPEC_MODULE._perform_merge(flow_dir, project, "chg-receipts", receipts[1], receipts[0], receipts[2], dry_run=False)
+
+    canonical = STATE_MODULE.canonical_spec_path(flow_dir, project, "expenses").read_text(encoding="utf-8")
+    assert "Requirement: Currency" in canonical and "Requirement: Receipts" in canonical
+    index = STATE_MODULE.load_spec_index(flow_dir, project)
+    assert index.find("expenses", "Currency") and index.find("expenses", "Receipts")
+
+    tighten = stage("chg-tighten", f"## MODIFIED Requirements\n### Requirement: Currency\nEUR SHALL apply.\n\n{scenario}")
+    loosen = stage("chg-loosen", f"## MODIFIED Requirements\n### Requirement: Currency\nAny SHALL apply.\n\n{scenario}")
+    SPEC_MODULE._perform_merge(flow_dir, project, "chg-tighten", tighten[1], tighten[0], tighten[2], dry_run=False)
+    with pytest.raises(SPEC_MODULE.SpecCommandError, match="changed by another merge: Currency"):
+        SPEC_MODULE._perform_merge(flow_dir, project, "chg-loosen", loosen[1], loosen[0], loosen[2], dry_run=False)
+    assert "EUR SHALL apply" in STATE_MODULE.canonical_spec_path(flow_dir, project, "expenses").read_text()
+
+
+def test_reference_graph_updates_on_merge_and_reports_transitive_impact(tmp_path: Path) -> None:
+    flow_dir, project, first = _seed_change(tmp_path)
+    _write_delta(
+        flow_dir,
+        project,
+        first,
+        "billing",
+        "## ADDED Requirements\n### Requirement: Invoice Totals\n"
+        "Invoices SHALL use expenses.capture.totals.\n\n"
+        "#### Scenario: Issue\n- **WHEN** an invoice is issued\n- **THEN** totals are copied\n",
+    )
+    _write_delta(
+        flow_dir,
+        project,
+        "chg-ledger",
+        "ledger",
+        "## ADDED Requirements\n### Requirement: Post Invoices\nThe ledger SHALL post every `billing` invoice.\n\n"
+        "#### Scenario: Post\n- **WHEN** an invoice is issued\n- **THEN** it is posted\n",
+    )
+    for change in (first, "chg-ledger"):
+        manifest = _prepare(flow_dir, project, change)
+        contexts = SPEC_MODULE._gather_capability_contexts(flow_dir, project, change)
+        spec_index = STATE_MODULE.load_spec_index(flow_dir, project)
+        SPEC_MODULE._perform_merge(flow_dir, project, change, contexts, manifest, spec_index, dry_run=False)
+
+    graph = REFERENCES_MODULE.ReferenceGraph.load(flow_dir, project)
+    assert graph.capabilities["ledger"]["references"] == {"Post Invoices": ["billing"]}
+    impact = graph.impact("expenses.capture.totals", STATE_MODULE.load_spec_index(flow_dir, project))
+    assert [(item.capability, item.depth) for item in impact] == [("expenses", 0), ("billing", 1), ("ledger", 2)]
+    assert impact[1].via == "billing/Invoice Totals → expenses.capture.totals"
+    with pytest.raises(STATE_MODULE.StateError, match="Unknown"):
+        graph.impact("missing.requirement", STATE_MODULE.load_spec_index(flow_dir, project))
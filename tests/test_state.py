@@ -2,7 +2,10 @@ from __future__ import annotations
 
 from pathlib import Path
 import importlib.util
+import json
+import mmap
 import sys
+import tracemalloc
 
 import pytest
 
@@ -21,6 +24,23 @@ slugify_identifier = state.slugify_identifier
 load_spec_index = state.load_spec_index
 save_spec_index = state.save_spec_index
 spec_index_path = state.spec_index_path
+SpecDocument = state.SpecDocument
+DeltaCache = state.DeltaCache
+parse_delta_file = state.parse_delta_file
+requirement_spans = state.requirement_spans
+read_requirement_span = state.read_requirement_span
+iter_requirement_spans = state.iter_requirement_spans
+apply_deltas_to_file = state.apply_deltas_to_file
+SpecIndex = state.SpecIndex
+record_requirement_spans = state.record_requirement_spans
+requirement_spans_path = state.requirement_spans_path
+read_indexed_requirement = state.read_indexed_requirement
+canonical_spec_path = state.canonical_spec_path
+read_canonical_spec = state.read_canonical_spec
+write_canonical_spec = state.write_canonical_spec
+set_canonical_layout = state.set_canonical_layout
+remove_canonical_spec = state.remove_canonical_spec
+SpecHistory = state.SpecHistory
 
 
 def test_apply_added_requirement(tmp_path: Path) -> None:
@@ -97,3 +117,294 @@ def test_spec_index_roundtrip(tmp_path: Path) -> None:
     assert path.exists()
     loaded = load_spec_index(flow_dir, project)
     assert loaded == data
+
+
+def test_spec_index_secondary_lookups(tmp_path: Path) -> None:
+    index = SpecIndex(
+        {
+            "exp.totals": {"capability": "expenses", "title": "Totals"},
+            "exp.export": {"capability": "expenses", "title": "Export"},
+        }
+    )
+    assert index.find("expenses", "Totals") == "exp.totals"
+    assert index.ids_for("expenses") == ["exp.totals", "exp.export"]
+
+    index.retitle("expenses", "Totals", "Monthly Totals")
+    assert index.find("expenses", "Totals") is None
+    assert index.find("expenses", "Monthly Totals") == "exp.totals"
+
+    assert index.rename_capability("expenses", "spending") == 2
+    assert index.ids_for("expenses") == []
+    assert index["exp.export"]["capability"] == "spending"
+
+    index.pop("exp.export")
+    index["exp.new"] = {"capability": "spending", "title": "New"}
+    assert index.ids_for("spending") == ["exp.totals", "exp.new"]
+
+    save_spec_index(tmp_path, "demo", index)
+    reloaded = load_spec_index(tmp_path, "demo")
+    assert reloaded.find("spending", "Monthly Totals") == "exp.totals"
+
+
+def test_indexed_requirement_reads_span_and_falls_back(tmp_path: Path) -> None:
+    path = canonical_spec_path(tmp_path, "demo", "expenses")
+    path.parent.mkdir(parents=True)
+    path.write_text(
+        "# Expenses\n\n### Requirement: Totals\nTotals SHALL add up.\n\n"
+        "### Requirement: Export\nExport SHALL produce CSV.\n",
+        encoding="utf-8",
+    )
+    index = SpecIndex({"exp.export": {"capability": "expenses", "title": "Export"}})
+    assert record_requirement_spans(tmp_path, "demo", "expenses", path) == 2
+    assert index["exp.export"] == {"capability": "expenses", "title": "Export"}
+    sidecar = requirement_spans_path(tmp_path, "demo", "expenses")
+    spans = json.loads(sidecar.read_text())["spans"]
+    assert spans["Export"][0] == path.read_text().index("### Requirement: Export")
+    mtime = sidecar.stat().st_mtime_ns
+    record_requirement_spans(tmp_path, "demo", "expenses", path)
+    assert sidecar.stat().st_mtime_ns == mtime
+    assert read_indexed_requirement(tmp_path, "demo", index, "exp.export").startswith("### Requirement: Export\n")
+
+    path.write_text("# Expenses (edited)\n\n" + path.read_text().split("\n", 2)[2], encoding="utf-8")
+    text = read_indexed_requirement(tmp_path, "demo", index, "exp.export")
+    assert text == "### Requirement: Export\nExport SHALL produce CSV.\n"
+
+
+def test_directory_layout_roundtrip_touches_only_changed_blocks(tmp_path: Path) -> None:
+    path = canonical_spec_path(tmp_path, "demo", "expenses")
+    path.parent.mkdir(parents=True)
+    original = (
+        "# Expenses\n\n## Requirements\n\n### Requirement: Totals\nRequirement-ID: exp.totals\n"
+        "Totals SHALL add up.\n\n### Requirement: Export\nExport SHALL produce CSV.\n\n"
+    )
+    path.write_text(original, encoding="utf-8")
+    index = SpecIndex({"exp.export": {"capability": "expenses", "title": "Export"}})
+
+    assert set_canonical_layout(path, "expenses", "directory", index)
+    assert not path.exists()
+    assert sorted(p.name for p in (path.parent / "requirements").iterdir()) == ["exp.export.md", "exp.totals.md"]
+    assert read_canonical_spec(path) == original
+
+    updated = original.replace("CSV", "CSV or JSON") + "### Requirement: Import\nImport SHALL accept CSV.\n"
+    touched = write_canonical_spec(path, updated, "expenses", index)
+    assert sorted(p.name for p in touched) == ["exp.export.md", "expenses.import.md", "order.json"]
+    assert read_canonical_spec(path) == updated
+
+    assert set_canonical_layout(path, "expenses", "file")
+    assert path.read_text(encoding="utf-8") == updated
+    assert not (path.parent / "requirements").exists()
+
+    assert set_canonical_layout(path, "expenses", "directory", index)
+    (path.parent / "requirements" / "draft.md").write_text("notes\n", encoding="utf-8")
+    remove_canonical_spec(path)
+    assert sorted(p.name for p in path.parent.rglob("*")) == ["draft.md", "requirements"]
+
+
+def test_spec_history_dedupes_objects_and_resolves_refs(tmp_path: Path) -> None:
+    history = SpecHistory.load(tmp_path, "demo")
+    assert history.record("expenses", "v0\n", "v1\n", "chg-a", "2026-01-05T10:00:00+00:00")
+    assert not history.record("expenses", "v1\n", "v1\n", "chg-noop", "2026-01-06T10:00:00+00:00")
+    assert history.record("expenses", "v1\n", "v0\n", "chg-b", "2026-02-01T10:00:00+00:00")
+    history.save()
+
+    reloaded = SpecHistory.load(tmp_path, "demo")
+    versions = reloaded.versions("expenses")
+    assert [entry["change_id"] for entry in versions] == [None, "chg-a", "chg-b"]
+    assert versions[0]["object"] == versions[2]["object"]
+    assert len([p for p in (tmp_path / "projects" / "demo" / "state" / "objects").rglob("*") if p.is_file()]) == 2
+    assert reloaded.text(reloaded.resolve("expenses", "chg-a")) == "v1\n"
+    assert reloaded.text(reloaded.resolve("expenses", "2026-01-31")) == "v1\n"
+    with pytest.raises(StateError):
+        reloaded.resolve("expenses", "2025-12-31")
+
+
+def test_history_saves_replace_files_instead_of_truncating(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    history = SpecHistory.load(tmp_path, "demo")
+    history.record("expenses", None, "v1\n", "chg-a", "2026-01-05T10:00:00+00:00")
+    history.save()
+    lineage = state.RequirementHistory.load(tmp_path, "demo")
+    lineage.record("exp.totals", "ADDED", "Totals", "expenses", "chg-a", "2026-01-05T10:00:00+00:00")
+    lineage.save()
+
+    written: list[Path] = []
+    write_text = Path.write_text
+
+    def recording_write_text(self: Path, *args, **kwargs) -> int:
+        written.append(self)
+        return write_text(self, *args, **kwargs)
+
+    monkeypatch.setattr(Path, "write_text", recording_write_text)
+    history.record("expenses", "v1\n", "v2\n", "chg-b", "2026-01-06T10:00:00+00:00")
+    history.save()
+    lineage.record("exp.totals", "MODIFIED", "Totals", "expenses", "chg-b", "2026-01-06T10:00:00+00:00")
+    lineage.save()
+    # Lock-free readers must only ever see a complete file: targets are replaced, never rewritten.
+    assert history.path not in written and lineage.path not in written
+    assert [entry["change_id"] for entry in SpecHistory.load(tmp_path, "demo").versions("expenses")] == ["chg-a", "chg-b"]
+    assert len(state.RequirementHistory.load(tmp_path, "demo").lineage("exp.totals")) == 2
+
+
+def test_concurrent_saves_keep_each_others_entries(tmp_path: Path) -> None:
+    save_spec_index(tmp_path, "demo", {"a.one": {"capability": "a", "title": "One"}})
+    first = load_spec_index(tmp_path, "demo")
+    second = load_spec_index(tmp_path, "demo")
+    first["a.two"] = {"capability": "a", "title": "Two"}
+    second["b.one"] = {"capability": "b", "title": "One"}
+    second.pop("a.one")
+    save_spec_index(tmp_path, "demo", first)
+    save_spec_index(tmp_path, "demo", second)
+    assert sorted(load_spec_index(tmp_path, "demo")) == ["a.two", "b.one"]
+
+    left, right = SpecHistory.load(tmp_path, "demo"), SpecHistory.load(tmp_path, "demo")
+    left.record("a", None, "a1\n", "chg-a", "2026-01-05T10:00:00+00:00")
+    right.record("b", None, "b1\n", "chg-b", "2026-01-05T10:00:01+00:00")
+    left.save()
+    right.save()
+    reloaded = SpecHistory.load(tmp_path, "demo")
+    assert [v["change_id"] for v in reloaded.versions("a") + reloaded.versions("b")] == ["chg-a", "chg-b"]
+
+
+def test_apply_mixed_deltas_single_pass() -> None:
+    initial = (
+        "# Checkout Specification\n\n## Requirements\n\n"
+        "### Requirement: Cart Totals\nTotals SHALL sum all items.\n\n"
+        "### Requirement: Legacy Coupons\nCoupons SHALL stack.\n\n"
+        "### Requirement: Receipts\nReceipts SHALL be emailed.\n"
+    )
+    delta = """## REMOVED Requirements
+### Requirement: Legacy Coupons
+
+## RENAMED Requirements
+- FROM: `### Requirement: Receipts`
+- TO: `### Requirement: Digital Receipts`
+
+## MODIFIED Requirements
+### Requirement: Digital Receipts
+Receipts SHALL be emailed and downloadable.
+
+#### Scenario: Download
+- **WHEN** checkout completes
+- **THEN** a receipt link is shown
+
+## ADDED Requirements
+### Requirement: Gift Cards
+Gift cards SHALL be redeemable.
+
+#### Scenario: Redeem
+- **WHEN** a gift card is applied
+- **THEN** the balance decreases
+"""
+    updated = apply_deltas_to_spec(initial, parse_delta_markdown(delta))
+    document = SpecDocument.parse(updated)
+    assert document.titles() == ["Cart Totals", "Digital Receipts", "Gift Cards"]
+    assert "Coupons SHALL stack." not in updated
+    assert "downloadable" in document.block_text("Digital Receipts")
+    start, end = document.span("Gift Cards")
+    assert updated.splitlines()[start] == "### Requirement: Gift Cards"
+    assert end == len(updated.splitlines())
+
+
+def test_apply_missing_requirement_raises() -> None:
+    delta = "## REMOVED Requirements\n### Requirement: Ghost\n"
+    with pytest.raises(StateError):
+        apply_deltas_to_spec("# Spec\n\n## Requirements\n", parse_delta_markdown(delta))
+
+
+def test_delta_cache_reuses_parses_and_evicts(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    cache_path = tmp_path / "state" / "delta_cache.json"
+    deltas = []
+    for idx in range(3):
+        path = tmp_path / f"delta-{idx}.md"
+        path.write_text(
+            f"## ADDED Requirements\n### Requirement: Item {idx}\nBody.\n",
+            encoding="utf-8",
+        )
+        deltas.append(path)
+
+    cache = DeltaCache(cache_path, max_entries=2)
+    parsed, errors = cache.lookup(deltas[0])
+    assert parsed.requirements["ADDED"][0].title == "Item 0"
+    assert errors and "missing scenario" in errors[0]
+    cache.save()
+
+    calls = []
+    monkeypatch.setattr(state, "parse_delta_file", lambda path: calls.append(path))
+    reloaded = DeltaCache(cache_path, max_entries=2)
+    parsed, _ = reloaded.lookup(deltas[0])
+    assert parsed.requirements["ADDED"][0].title == "Item 0"
+    assert calls == []
+    written = cache_path.stat().st_mtime_ns
+    reloaded.save()
+    assert cache_path.stat().st_mtime_ns == written
+
+    monkeypatch.undo()
+    reloaded.lookup(deltas[1])
+    reloaded.lookup(deltas[2])
+    reloaded.save()
+    assert len(DeltaCache(cache_path, max_entries=2)) == 2
+
+
+def test_streaming_parse_and_byte_spans(tmp_path: Path) -> None:
+    delta_text = """## ADDED Requirements
+### Requirement: Café Receipts
+Receipts SHALL render accents.
+
+#### Scenario: Accents
+- **WHEN** a receipt prints
+- **THEN** accents survive
+
+## RENAMED Requirements
+- FROM: `### Requirement: Old`
+- TO: `### Requirement: New`
+"""
+    delta_path = tmp_path / "delta.md"
+    delta_path.write_text(delta_text, encoding="utf-8")
+    streamed = parse_delta_file(delta_path)
+    assert streamed.to_dict() == parse_delta_markdown(delta_text).to_dict()
+
+    spec_path = tmp_path / "spec.md"
+    spec_text = (
+        "# Café Specification\n\n## Requirements\n\n"
+        "### Requirement: Café Receipts\nReceipts SHALL render accents.\n\n"
+        "### Requirement: Totals\nTotals SHALL add up.\n"
+    )
+    spec_path.write_text(spec_text, encoding="utf-8")
+    spans = requirement_spans(spec_path)
+    assert [span.title for span in spans] == ["Café Receipts", "Totals"]
+    assert read_requirement_span(spec_path, spans[1]) == "### Requirement: Totals\nTotals SHALL add up.\n"
+    first = read_requirement_span(spec_path, spans[0])
+    assert first.startswith("### Requirement: Café Receipts") and first.endswith("\n\n")
+
+
+def test_large_spec_streams_through_mmap_with_bounded_memory(tmp_path: Path) -> None:
+    spec_path = tmp_path / "spec.md"
+    with spec_path.open("w", encoding="utf-8") as fh:
+        fh.write("# Big Specification\n\n## Requirements\n\n")
+        for idx in range(20000):
+            fh.write(f"### Requirement: Item {idx}\nItem {idx} SHALL be stored.\n\n#### Scenario: Store\n- **WHEN** saved\n- **THEN** kept\n\n")
+    size = spec_path.stat().st_size
+    assert size > 2_000_000
+
+    with spec_path.open("rb") as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as view:
+        spans = list(iter_requirement_spans(view))
+    assert len(spans) == 20000
+    assert read_requirement_span(spec_path, spans[-1]).startswith("### Requirement: Item 19999\n")
+
+    deltas = parse_delta_markdown(
+        "## REMOVED Requirements\n### Requirement: Item 3\n\n"
+        "## RENAMED Requirements\n- FROM: `### Requirement: Item 5`\n- TO: `### Requirement: Item Five`\n\n"
+        "## MODIFIED Requirements\n### Requirement: Item 19999\nItem 19999 SHALL be archived.\n\n"
+        "#### Scenario: Archive\n- **WHEN** old\n- **THEN** archived\n\n"
+        "## ADDED Requirements\n### Requirement: Item New\nNew SHALL exist.\n\n#### Scenario: New\n- **WHEN** x\n- **THEN** y\n"
+    )
+    target = tmp_path / "updated.md"
+    tracemalloc.start()
+    try:
+        apply_deltas_to_file(spec_path, target, deltas)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert peak < size // 10
+    expected = apply_deltas_to_spec(spec_path.read_text(encoding="utf-8"), deltas)
+    assert target.read_text(encoding="utf-8") == expected
+
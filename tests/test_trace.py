@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+from flowm_cli.state import canonical_spec_path, save_spec_index
+from flowm_cli.trace import trace_project
+
+
+def _seed(tmp_path: Path) -> tuple[Path, Path]:
+    flow_dir = tmp_path / "repo" / ".flow-maestro"
+    path = canonical_spec_path(flow_dir, "demo", "expenses")
+    path.parent.mkdir(parents=True)
+    path.write_text(
+        "# Expenses Specification\n\n## Requirements\n\n"
+        "### Requirement: Capture Totals\nTotals SHALL reflect all items.\n\n"
+        "#### Scenario: Basic Sum\n- **WHEN** an item is added\n- **THEN** totals update\n\n"
+        "### Requirement: Currency\nTotals SHALL use one currency.\n\n"
+        "#### Scenario: Mixed\n- **WHEN** currencies differ\n- **THEN** conversion applies\n",
+        encoding="utf-8",
+    )
+    save_spec_index(
+        flow_dir,
+        "demo",
+        {
+            "expenses.capture-totals": {"capability": "expenses", "title": "Capture Totals"},
+            "expenses.currency": {"capability": "expenses", "title": "Currency"},
+        },
+    )
+    return flow_dir, flow_dir.parent
+
+
+def test_trace_links_ids_and_scenario_tags_and_reuses_cache(tmp_path: Path) -> None:
+    flow_dir, source = _seed(tmp_path)
+    tests = source / "tests"
+    tests.mkdir()
+    (tests / "test_totals.py").write_text(
+        '"""Covers expenses.capture-totals#basic-sum."""\nimport os.path\n', encoding="utf-8"
+    )
+    (source / "notes.md").write_text("expenses.currencyX and expenses.currency-old are not references\n", encoding="utf-8")
+
+    requirements, scanned, rescanned = trace_project(flow_dir, "demo", source)
+    by_id = {item.requirement_id: item for item in requirements}
+    assert (scanned, rescanned) == (2, 2)
+    assert by_id["expenses.capture-totals"].scenarios == {"Basic Sum": ["tests/test_totals.py"]}
+    assert by_id["expenses.capture-totals"].covered
+    assert not by_id["expenses.currency"].covered
+
+    (source / "notes.md").write_text("See expenses.currency.\n", encoding="utf-8")
+    requirements, _, rescanned = trace_project(flow_dir, "demo", source)
+    assert rescanned == 1
+    assert [item.requirement_id for item in requirements if item.covered] == [
+        "expenses.capture-totals",
+        "expenses.currency",
+    ]
+    _, scanned, _ = trace_project(flow_dir, "demo", source, include=["tests/*"])
+    assert scanned == 1
+
+
+def test_trace_skips_dangling_symlinks(tmp_path: Path) -> None:
+    flow_dir, source = _seed(tmp_path)
+    (source / "notes.md").write_text("See expenses.currency.\n", encoding="utf-8")
+    (source / "stale-link.md").symlink_to(source / "deleted.md")
+
+    requirements, scanned, _ = trace_project(flow_dir, "demo", source)
+    assert scanned == 1
+    assert [item.requirement_id for item in requirements if item.covered] == ["expenses.currency"]